@@ -1,18 +1,101 @@
 import socket
 
+from MusicPlayer.protocol import FLAG_END, encode_frame, recv_frame
+
+
+class MusicClient:
+    def __init__(self, host="localhost", port=12345, window=64):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.window = window
+        self.next_request_id = 1
+        self.replies = {}
+        self.finished = set()
+        self.notifications = []
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, command):
+        request_id = self.next_request_id
+        self.next_request_id = request_id % 0xFFFFFFFF + 1
+        self.replies[request_id] = []
+        self.sock.sendall(encode_frame(request_id, command.encode('utf-8')))
+        return request_id
+
+    def receive(self):
+        frame = recv_frame(self.sock)
+        if frame is None:
+            raise ConnectionError("Server closed the connection.")
+        request_id, flags, payload = frame
+        if request_id not in self.replies:
+            if payload:
+                self.notifications.append(payload.decode('utf-8'))
+            return request_id
+        if payload:
+            self.replies[request_id].append(payload.decode('utf-8'))
+        if flags & FLAG_END:
+            self.finished.add(request_id)
+        return request_id
+
+    def collect(self, request_id):
+        while request_id not in self.finished:
+            self.receive()
+        self.finished.discard(request_id)
+        return ''.join(self.replies.pop(request_id))
+
+    def stream(self, request_id):
+        while True:
+            while self.replies[request_id]:
+                yield self.replies[request_id].pop(0)
+            if request_id in self.finished:
+                break
+            self.receive()
+        self.finished.discard(request_id)
+        del self.replies[request_id]
+
+    def request(self, command):
+        return self.collect(self.send(command))
+
+    def pipeline(self, commands):
+        request_ids = []
+        in_flight = set()
+        for command in commands:
+            while len(in_flight) >= self.window:
+                request_id = self.receive()
+                if request_id in self.finished:
+                    in_flight.discard(request_id)
+            request_id = self.send(command)
+            request_ids.append(request_id)
+            in_flight.add(request_id)
+        return [self.collect(request_id) for request_id in request_ids]
+
+    def pop_notifications(self):
+        notifications, self.notifications = self.notifications, []
+        return notifications
+
+
 def main():
     print("Welcome to the Music Player CLI. Type 'help' to see available commands.")
     host = "localhost"
     port = 12345
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-        client_socket.connect((host, port))
-
+    with MusicClient(host, port) as client:
         while True:
             command = input(">> ")
-            client_socket.sendall(command.encode())
-            response = client_socket.recv(4096).decode()
-            print(response)
+            for part in client.stream(client.send(command)):
+                for notification in client.pop_notifications():
+                    print(notification)
+                print(part, end='')
+            for notification in client.pop_notifications():
+                print(notification)
+            print()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
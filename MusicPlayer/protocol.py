@@ -0,0 +1,48 @@
+import struct
+
+HEADER = struct.Struct('!IIB')
+FLAG_END = 1
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(request_id, payload, flags=0):
+    return HEADER.pack(len(payload), request_id, flags) + payload
+
+
+def _check_length(length):
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit.")
+
+
+def recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_frame(sock):
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    length, request_id, flags = HEADER.unpack(header)
+    _check_length(length)
+    payload = recv_exactly(sock, length) if length else b''
+    if payload is None:
+        return None
+    return request_id, flags, payload
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    length, request_id, flags = HEADER.unpack(header)
+    _check_length(length)
+    payload = await reader.readexactly(length) if length else b''
+    return request_id, flags, payload
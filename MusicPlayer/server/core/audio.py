@@ -0,0 +1,277 @@
+import io
+import os
+import time
+import wave
+
+SILENCE_FRAMES = 441
+
+
+class AudioError(Exception):
+    pass
+
+
+def _silence():
+    data = io.BytesIO()
+    with wave.open(data, 'wb') as silence:
+        silence.setnchannels(1)
+        silence.setsampwidth(2)
+        silence.setframerate(44100)
+        silence.writeframes(b'\0\0' * SILENCE_FRAMES)
+    return data.getvalue()
+
+
+def _import_pygame():
+    os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+    import pygame
+    return pygame
+
+
+class PlaybackClock:
+    def __init__(self):
+        self.started = None
+        self.paused = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.paused = None
+
+    def pause(self):
+        if self.started is not None and self.paused is None:
+            self.paused = time.monotonic()
+
+    def unpause(self):
+        if self.paused is not None:
+            self.started += time.monotonic() - self.paused
+            self.paused = None
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.paused if self.paused is not None else time.monotonic()) - self.started
+
+
+class PygameBackend:
+    name = 'pygame'
+    end_events = True
+
+    def __init__(self):
+        self.pygame = None
+        self.end_event = None
+        self.events = False
+        self.last_position = -1
+
+    def open(self):
+        if self.pygame is not None:
+            return
+        pygame = _import_pygame()
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            raise AudioError(str(e))
+        self.pygame = pygame
+        self.end_event = pygame.USEREVENT + 1
+        self.events = pygame.display.get_init()
+        if self.events:
+            pygame.mixer.music.set_endevent(self.end_event)
+            pygame.event.clear(self.end_event)
+
+    def _call(self, function, *args):
+        try:
+            return function(*args)
+        except self.pygame.error as e:
+            raise AudioError(str(e))
+
+    def load(self, source, namehint=''):
+        self._call(self.pygame.mixer.music.load, source, namehint)
+
+    def queue(self, source, namehint=''):
+        self._call(self.pygame.mixer.music.queue, source, namehint)
+
+    def unqueue(self):
+        self._call(self.pygame.mixer.music.queue, io.BytesIO(_silence()), 'silence.wav')
+
+    def play(self, start=0.0):
+        self._call(self.pygame.mixer.music.play, 0, start)
+
+    def elapsed(self):
+        return max(self.pygame.mixer.music.get_pos(), 0) / 1000
+
+    def pause(self):
+        self._call(self.pygame.mixer.music.pause)
+
+    def unpause(self):
+        self._call(self.pygame.mixer.music.unpause)
+
+    def stop(self):
+        self._call(self.pygame.mixer.music.stop)
+
+    def set_volume(self, level):
+        self._call(self.pygame.mixer.music.set_volume, level)
+
+    def busy(self):
+        return self.pygame.mixer.music.get_busy()
+
+    def pop_end_event(self):
+        if self.events:
+            return bool(self.pygame.event.get(self.end_event))
+        position = self.pygame.mixer.music.get_pos()
+        ended = position < self.last_position
+        self.last_position = position
+        return ended
+
+    def clear_end_events(self):
+        if self.events:
+            self.pygame.event.clear(self.end_event)
+        else:
+            self.last_position = self.pygame.mixer.music.get_pos()
+
+
+class ChannelBackend:
+    name = 'channel'
+    end_events = False
+
+    def __init__(self, index):
+        self.index = index
+        self.pygame = None
+        self.channel = None
+        self.sound = None
+        self.clock = PlaybackClock()
+
+    def open(self):
+        if self.pygame is not None:
+            return
+        pygame = _import_pygame()
+        try:
+            pygame.mixer.init()
+            if pygame.mixer.get_num_channels() <= self.index:
+                pygame.mixer.set_num_channels(self.index + 1)
+            pygame.mixer.set_reserved(self.index + 1)
+            self.channel = pygame.mixer.Channel(self.index)
+        except pygame.error as e:
+            raise AudioError(str(e))
+        self.pygame = pygame
+
+    def _sound(self, source):
+        try:
+            return self.pygame.mixer.Sound(source)
+        except self.pygame.error as e:
+            raise AudioError(str(e))
+
+    def load(self, source, namehint=''):
+        self.sound = self._sound(source)
+
+    def queue(self, source, namehint=''):
+        raise AudioError("Channel zones do not queue tracks.")
+
+    def unqueue(self):
+        pass
+
+    def play(self, start=0.0):
+        sound = self.sound
+        if start > 0:
+            frequency, size, channels = self.pygame.mixer.get_init()
+            frame = channels * abs(size) // 8
+            sound = self._sound_buffer(self.sound.get_raw()[int(start * frequency) * frame:])
+        self.channel.play(sound)
+        self.clock.start()
+
+    def _sound_buffer(self, data):
+        try:
+            return self.pygame.mixer.Sound(buffer=data)
+        except self.pygame.error as e:
+            raise AudioError(str(e))
+
+    def elapsed(self):
+        return self.clock.elapsed()
+
+    def pause(self):
+        self.channel.pause()
+        self.clock.pause()
+
+    def unpause(self):
+        self.channel.unpause()
+        self.clock.unpause()
+
+    def stop(self):
+        self.channel.stop()
+
+    def set_volume(self, level):
+        self.channel.set_volume(level)
+
+    def busy(self):
+        return self.channel.get_busy()
+
+    def pop_end_event(self):
+        return False
+
+    def clear_end_events(self):
+        pass
+
+
+class NullBackend:
+    name = 'null'
+    end_events = False
+
+    def __init__(self):
+        self.loaded = False
+        self.playing = False
+        self.clock = PlaybackClock()
+
+    def open(self):
+        pass
+
+    def load(self, source, namehint=''):
+        self.loaded = True
+
+    def queue(self, source, namehint=''):
+        raise AudioError("The null backend does not queue tracks.")
+
+    def unqueue(self):
+        pass
+
+    def play(self, start=0.0):
+        self.playing = self.loaded
+        self.clock.start()
+
+    def elapsed(self):
+        return self.clock.elapsed()
+
+    def pause(self):
+        self.clock.pause()
+
+    def unpause(self):
+        self.clock.unpause()
+
+    def stop(self):
+        self.playing = False
+
+    def set_volume(self, level):
+        pass
+
+    def busy(self):
+        return self.playing
+
+    def pop_end_event(self):
+        return False
+
+    def clear_end_events(self):
+        pass
+
+
+AUDIO_BACKENDS = {
+    PygameBackend.name: PygameBackend,
+    NullBackend.name: NullBackend,
+}
+
+
+def create_backend(name):
+    try:
+        return AUDIO_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown audio backend '{name}'. Choose one of: {', '.join(AUDIO_BACKENDS)}.")
+
+
+def create_zone_backend(name, channel):
+    if channel is None or name != PygameBackend.name:
+        return create_backend(name)
+    return ChannelBackend(channel)
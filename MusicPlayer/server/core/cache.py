@@ -0,0 +1,281 @@
+import sys
+import threading
+from collections import OrderedDict
+
+from MusicPlayer.server.core.config import track_cache_budget
+from MusicPlayer.server.core.database import LISTING_CHUNK_SIZE
+
+TRACK_OVERHEAD = sys.getsizeof((None, None)) + 8
+
+
+def _rows_size(rows):
+    return sum(TRACK_OVERHEAD + sys.getsizeof(title) + sys.getsizeof(path) for title, path in rows)
+
+
+def _tracks_size(tracks):
+    return sys.getsizeof(tracks) + _rows_size(tracks)
+
+
+class SharedGeneration:
+    def __init__(self, counters, slot):
+        self.counters = counters
+        self.slot = slot
+        self.seen = self.others()
+
+    def others(self):
+        return sum(self.counters) - self.counters[self.slot]
+
+    def changed(self):
+        others = self.others()
+        if others == self.seen:
+            return False
+        self.seen = others
+        return True
+
+    def bump(self):
+        self.counters[self.slot] += 1
+
+
+class CachedDatabaseManager:
+    def __init__(self, db_manager, memory_budget=track_cache_budget, shared=None):
+        self.db_manager = db_manager
+        self.memory_budget = memory_budget
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.playlists = None
+        self.playlist_ids = {}
+        self.tracks = OrderedDict()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        db_manager.add_commit_listener(self._committed)
+
+    def __getattr__(self, name):
+        return getattr(self.db_manager, name)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'playlists_cached': len(self.tracks),
+                'memory_used': self.memory_used,
+                'memory_budget': self.memory_budget,
+            }
+
+    def _sync(self):
+        if self.shared is not None and self.shared.changed():
+            self.generation += 1
+            self.playlists = None
+            self.playlist_ids = {}
+            self.tracks.clear()
+            self.memory_used = 0
+
+    def _load_playlists(self):
+        with self.lock:
+            self._sync()
+            if self.playlists is not None:
+                self.hits += 1
+                return self.playlists
+            self.misses += 1
+            generation = self.generation
+
+        playlists = tuple(self.db_manager.get_playlists())
+        with self.lock:
+            if generation == self.generation:
+                self.playlists = playlists
+                self.playlist_ids = {name: playlist_id for playlist_id, name in playlists}
+        return playlists
+
+    def _playlist_id(self, playlist_name):
+        self._load_playlists()
+        with self.lock:
+            return self.playlist_ids.get(playlist_name)
+
+    def get_playlists(self):
+        return list(self._load_playlists())
+
+    def select_playlist(self, playlist_id):
+        for cached_id, _ in self._load_playlists():
+            if cached_id == playlist_id:
+                return (cached_id,)
+        return None
+
+    def show_tracks_for_playlist(self, playlist_name):
+        playlist_id = self._playlist_id(playlist_name)
+        return (playlist_id,) if playlist_id is not None else None
+
+    def get_tracks_for_playlist(self, playlist_id):
+        with self.lock:
+            self._sync()
+            tracks = self.tracks.get(playlist_id)
+            if tracks is not None:
+                self.tracks.move_to_end(playlist_id)
+                self.hits += 1
+                return tracks[0]
+            self.misses += 1
+            generation = self.generation
+
+        tracks = tuple(self.db_manager.get_tracks_for_playlist(playlist_id))
+        self._store(playlist_id, generation, tracks)
+        return tracks
+
+    def _store(self, playlist_id, generation, tracks):
+        size = _tracks_size(tracks)
+        with self.lock:
+            if generation == self.generation and size <= self.memory_budget and playlist_id not in self.tracks:
+                self.tracks[playlist_id] = (tracks, size)
+                self.memory_used += size
+                while self.memory_used > self.memory_budget:
+                    _, (_, evicted_size) = self.tracks.popitem(last=False)
+                    self.memory_used -= evicted_size
+
+    def _cached_tracks(self, playlist_id):
+        with self.lock:
+            self._sync()
+            entry = self.tracks.get(playlist_id)
+            if entry is None:
+                self.misses += 1
+                return None, self.generation
+            self.tracks.move_to_end(playlist_id)
+            self.hits += 1
+            return entry[0], self.generation
+
+    def _stream_and_store(self, playlist_id, generation, limit, chunk_size):
+        collected = []
+        size = 0
+        shown = 0
+        for rows in self.db_manager.iter_tracks_for_playlist(playlist_id, 0, None, chunk_size):
+            if limit is None or shown < limit:
+                rows_shown = rows if limit is None else rows[:limit - shown]
+                shown += len(rows_shown)
+                yield rows_shown
+            if collected is not None:
+                size += _rows_size(rows)
+                if size > self.memory_budget:
+                    collected = None
+                else:
+                    collected.extend(rows)
+            if collected is None and limit is not None and shown >= limit:
+                return
+        if collected is not None:
+            self._store(playlist_id, generation, tuple(collected))
+
+    def iter_tracks_for_playlist(self, playlist_id, offset=0, limit=None, chunk_size=LISTING_CHUNK_SIZE):
+        tracks, generation = self._cached_tracks(playlist_id)
+        if tracks is None:
+            if offset:
+                yield from self.db_manager.iter_tracks_for_playlist(playlist_id, offset, limit, chunk_size)
+            else:
+                yield from self._stream_and_store(playlist_id, generation, limit, chunk_size)
+            return
+        end = len(tracks) if limit is None else min(len(tracks), offset + limit)
+        for start in range(offset, end, chunk_size):
+            yield tracks[start:min(start + chunk_size, end)]
+
+    def count_tracks(self, playlist_id):
+        with self.lock:
+            self._sync()
+            entry = self.tracks.get(playlist_id)
+        if entry is not None:
+            return len(entry[0])
+        return self.db_manager.count_tracks(playlist_id)
+
+    def get_track_path(self, playlist_name, track_title):
+        with self.lock:
+            self._sync()
+            playlist_id = self.playlist_ids.get(playlist_name)
+            entry = self.tracks.get(playlist_id) if playlist_id is not None else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.tracks.move_to_end(playlist_id)
+                self.hits += 1
+        if entry is None:
+            return self.db_manager.get_track_path(playlist_name, track_title)
+        for title, path in entry[0]:
+            if title == track_title:
+                return path
+        return None
+
+    def invalidate(self, playlist_name=None, playlists=False):
+        with self.lock:
+            playlist_ids = []
+            if playlist_name is not None:
+                playlist_id = self.playlist_ids.get(playlist_name)
+                playlist_ids = [playlist_id] if playlist_id is not None else None
+            self._drop(playlist_ids, playlists)
+
+    def invalidate_playlist_id(self, playlist_id):
+        with self.lock:
+            self._drop([playlist_id], False)
+
+    def _drop(self, playlist_ids, playlists):
+        self.generation += 1
+        if self.shared is not None:
+            self.shared.bump()
+        if playlists or playlist_ids is None:
+            self.playlists = None
+            self.playlist_ids = {}
+        if playlist_ids is None:
+            playlist_ids = list(self.tracks)
+        for playlist_id in playlist_ids:
+            entry = self.tracks.pop(playlist_id, None)
+            if entry is not None:
+                self.memory_used -= entry[1]
+
+    def _committed(self, playlist_names):
+        if not playlist_names:
+            return
+        with self.lock:
+            playlist_ids = [self.playlist_ids.get(name) for name in playlist_names]
+            self._drop(None if None in playlist_ids else playlist_ids, False)
+
+    def create_playlist(self, playlist_name, client_socket):
+        try:
+            return self.db_manager.create_playlist(playlist_name, client_socket)
+        finally:
+            self.invalidate(playlists=True)
+
+    def add_track_to_playlist(self, playlist_name, track_title, track_path, client_socket, value=0):
+        try:
+            return self.db_manager.add_track_to_playlist(playlist_name, track_title, track_path, client_socket, value)
+        finally:
+            self.invalidate(playlist_name)
+
+    def bulk_add_tracks(self, playlist_name, rows, *args, **kwargs):
+        try:
+            return self.db_manager.bulk_add_tracks(playlist_name, rows, *args, **kwargs)
+        finally:
+            self.invalidate(playlist_name)
+
+    def replace_playlist_tracks(self, playlist_id, tracks):
+        try:
+            return self.db_manager.replace_playlist_tracks(playlist_id, tracks)
+        finally:
+            self.invalidate_playlist_id(playlist_id)
+
+    def remove_track_from_playlist(self, playlist_name, track_title, client_socket, value=0):
+        try:
+            return self.db_manager.remove_track_from_playlist(playlist_name, track_title, client_socket, value)
+        finally:
+            self.invalidate(playlist_name)
+
+    def shuffle_playlist(self, playlist_name, client_socket, seed=None):
+        try:
+            return self.db_manager.shuffle_playlist(playlist_name, client_socket, seed)
+        finally:
+            self.invalidate(playlist_name)
+
+    def move_track(self, playlist_name, track_title, new_index, client_socket):
+        try:
+            return self.db_manager.move_track(playlist_name, track_title, new_index, client_socket)
+        finally:
+            self.invalidate(playlist_name)
+
+    def remove_playlist_by_name(self, playlist_name, client_socket):
+        try:
+            return self.db_manager.remove_playlist_by_name(playlist_name, client_socket)
+        finally:
+            self.invalidate(playlist_name, playlists=True)
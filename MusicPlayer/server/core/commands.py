@@ -1,24 +1,263 @@
+import math
+import re
 from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+
+from MusicPlayer.server.core.config import memento_history_depth, search_page_size
+from MusicPlayer.server.core.playback import REPEAT_MODES
+
+TOKEN = re.compile(r'''"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)'|([^\s"']\S*)|(\S)''')
+ESCAPE = re.compile(r'''\\(["'\\])''')
+QUOTES = ('"', "'")
+SYNC_FLAG = '--sync'
+REQUIRED = object()
+
+
+class CommandError(Exception):
+    def __init__(self, code, message, usage=None, command=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.usage = usage
+        self.command = command
+
+    def reply(self):
+        if self.usage:
+            return f"Error ({self.code}): {self.message} Usage: {self.usage}"
+        return f"Error ({self.code}): {self.message}"
+
+
+def scan(line):
+    if '"' not in line and "'" not in line:
+        return [(word, False) for word in line.split()]
+    tokens = []
+    for double, single, word, stray in TOKEN.findall(line):
+        if word:
+            tokens.append((word, False))
+        elif stray:
+            raise CommandError('syntax_error', f"Unterminated quote {stray}.")
+        else:
+            text = double or single
+            tokens.append((ESCAPE.sub(r'\1', text) if '\\' in text else text, True))
+    return tokens
+
+
+def tokenize(line):
+    return [token for token, _ in scan(line)]
+
+
+class Argument:
+    def __init__(self, name, default=REQUIRED, rest=False):
+        self.name = name
+        self.default = default
+        self.rest = rest
+
+    @property
+    def required(self):
+        return self.default is REQUIRED
+
+    def convert(self, token):
+        return token
+
+    def usage(self):
+        text = f"{self.name}..." if self.rest else self.name
+        return f"<{text}>" if self.required else f"[{text}]"
+
+
+class Text(Argument):
+    pass
+
+
+class Integer(Argument):
+    def __init__(self, name, default=REQUIRED, minimum=None):
+        super().__init__(name, default)
+        self.minimum = minimum
+
+    def convert(self, token):
+        try:
+            value = int(token)
+        except ValueError:
+            raise ValueError(f"{self.name} must be a whole number, got '{token}'.")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"{self.name} must be at least {self.minimum}, got {value}.")
+        return value
+
+
+class Number(Argument):
+    def __init__(self, name, default=REQUIRED, minimum=None, maximum=None):
+        super().__init__(name, default)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def convert(self, token):
+        try:
+            value = float(token)
+        except ValueError:
+            value = math.nan
+        if not math.isfinite(value):
+            raise ValueError(f"{self.name} must be a number, got '{token}'.")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"{self.name} must be at least {self.minimum:g}, got {token}.")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"{self.name} must be at most {self.maximum:g}, got {token}.")
+        return value
+
+
+class Position(Argument):
+    def convert(self, token):
+        try:
+            return parse_position(token)
+        except ValueError:
+            raise ValueError(f"{self.name} must be seconds or m:ss, got '{token}'.")
+
+
+class Choice(Argument):
+    def __init__(self, name, choices, default=REQUIRED):
+        super().__init__(name, default)
+        self.choices = tuple(choices)
+
+    def convert(self, token):
+        if token not in self.choices:
+            raise ValueError(f"{self.name} must be one of {', '.join(self.choices)}, got '{token}'.")
+        return token
+
+    def usage(self):
+        text = '|'.join(self.choices)
+        return f"<{text}>" if self.required else f"[{text}]"
+
+
+class Flag(Argument):
+    def __init__(self, name):
+        super().__init__(name, False)
+
+    def usage(self):
+        return f"[{self.name}]"
+
+
+class Option(Argument):
+    def __init__(self, name, value):
+        super().__init__(name, value.default)
+        self.value = value
+
+    def convert(self, token):
+        return self.value.convert(token)
+
+    def usage(self):
+        return f"[{self.name}=N]"
+
+
+class CommandSignature:
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = tuple(arguments)
+        self.positional = tuple(argument for argument in self.arguments if not isinstance(argument, (Flag, Option)))
+        self.flags = {argument.name: argument for argument in self.arguments if isinstance(argument, Flag)}
+        self.options = {argument.name: argument for argument in self.arguments if isinstance(argument, Option)}
+        self.keywords = bool(self.flags or self.options)
+        self.required = sum(1 for argument in self.positional if argument.required)
+        self.usage = ' '.join([name] + [argument.usage() for argument in self.arguments])
+
+    def error(self, code, message):
+        return CommandError(code, message, self.usage, self.name)
+
+    def parse(self, tokens):
+        keywords = {}
+        if self.keywords:
+            positional = []
+            for token in tokens:
+                key, separator, value = token.partition('=')
+                if len(positional) < self.required:
+                    positional.append(token)
+                elif token in self.flags:
+                    keywords[token] = True
+                elif separator and key in self.options:
+                    keywords[key] = self._convert(self.options[key], value)
+                else:
+                    positional.append(token)
+        else:
+            positional = tokens
+
+        if len(positional) < self.required:
+            missing = [argument.name for argument in self.positional if argument.required][len(positional):]
+            raise self.error('missing_argument', f"Missing {', '.join(missing)}.")
+
+        values = []
+        index = 0
+        for argument in self.arguments:
+            if argument.name in self.flags or argument.name in self.options:
+                values.append(keywords.get(argument.name, argument.default))
+            elif argument.rest and index < len(positional):
+                values.append(self._convert(argument, ' '.join(positional[index:])))
+                index = len(positional)
+            elif index < len(positional):
+                values.append(self._convert(argument, positional[index]))
+                index += 1
+            else:
+                values.append(argument.default)
+        if index < len(positional):
+            raise self.error('unexpected_argument', f"Unexpected argument '{positional[index]}'.")
+        return values
+
+    def _convert(self, argument, token):
+        try:
+            return argument.convert(token)
+        except ValueError as e:
+            raise self.error('invalid_argument', str(e))
+
+
+class CommandRegistry:
+    def __init__(self, commands):
+        self.commands = dict(commands)
+        self.dispatch = {name: (command, CommandSignature(name, command.arguments))
+                         for name, command in self.commands.items()}
+
+    def __contains__(self, name):
+        return name in self.dispatch
+
+    def parse(self, line):
+        tokens = scan(line)
+        durable = (SYNC_FLAG, False) in tokens
+        tokens = [token for token, quoted in tokens if quoted or token != SYNC_FLAG]
+        if not tokens:
+            raise CommandError('syntax_error', "Empty command. Send 'help' for the list of commands.")
+        name = tokens[0]
+        entry = self.dispatch.get(name)
+        if entry is None:
+            name = name.lower()
+            entry = self.dispatch.get(name)
+            if entry is None:
+                raise CommandError('unknown_command', f"unsupported command {line}. Send 'help' for the list of commands.")
+        command, signature = entry
+        return name, command, signature.parse(tokens[1:]), durable
+
+    def usage(self, name):
+        return self.dispatch[name][1].usage
 
 
 class Command(ABC):
+    arguments = ()
+
     @abstractmethod
     def execute(self, *args):
         pass
-    def accept(self, *args): pass
+    def accept(self, visitor):
+        visitor.visit_command(self)
 
 class SaveMementoCommand(Command):
     def execute(self, music_player, client_socket, *args):
         memento = music_player.create_playlist_memento()
-        music_player.memento_stack.append(memento)
+        if memento is None:
+            client_socket.sendall('No playlist selected. Create or select a playlist.'.encode('utf-8'))
+            return
         client_socket.sendall(f'Memento saved for playlist: {music_player.current_playlist_id}'.encode('utf-8'))
 
     def accept(self, visitor):
         visitor.visit_save_memento(self)
 class RestoreMementoCommand(Command):
     def execute(self, music_player, client_socket, *args):
-        if music_player.memento_stack:
-            memento = music_player.memento_stack.pop()
+        if music_player.memento_history:
+            memento = music_player.memento_history.pop()
             music_player.restore_playlist_from_memento(memento)
             client_socket.sendall(f'Playlist restored from memento: {music_player.current_playlist_id}'.encode('utf-8'))
         else:
@@ -26,6 +265,21 @@ class RestoreMementoCommand(Command):
 
     def accept(self, visitor):
         visitor.visit_restore_memento(self)
+class HelpCommand(Command):
+    arguments = (Text('command', default=None),)
+
+    def __init__(self, send_help):
+        self.send_help = send_help
+        self.registry = None
+
+    def execute(self, music_player, client_socket, command):
+        if command is None:
+            self.send_help(client_socket)
+        elif self.registry is not None and command.lower() in self.registry:
+            client_socket.sendall(f"Usage: {self.registry.usage(command.lower())}".encode('utf-8'))
+        else:
+            client_socket.sendall(CommandError('unknown_command', f"unsupported command {command}.").reply().encode('utf-8'))
+
 class PlayCommand(Command):
     def execute(self, music_player, client_socket, *args):
         music_player.play(client_socket)
@@ -35,89 +289,273 @@ class PauseCommand(Command):
         music_player.pause(client_socket)
 
 class AddPlaylistCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if args:
-            playlist_name = ' '.join(args)
-            music_player.add_playlist(playlist_name, client_socket)
+    arguments = (Text('playlist_name', rest=True),)
+
+    def execute(self, music_player, client_socket, playlist_name):
+        music_player.add_playlist(playlist_name, client_socket)
 
 class AddTrackToPlaylistCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if len(args) == 3:
-            playlist_name, track_title, track_path = args
+    arguments = (Text('playlist_name'), Text('track_title'), Text('track_path'))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title, track_path):
+        music_player.add_track_to_playlist(playlist_name, track_title, track_path, client_socket)
 
-            music_player.add_track_to_playlist(playlist_name, track_title, track_path, client_socket)
+class ImportTracksCommand(Command):
+    arguments = (Text('playlist_name'), Text('source', rest=True))
+
+    def execute(self, music_player, client_socket, playlist_name, source):
+        music_player.import_tracks(playlist_name, source, client_socket)
 
 class RemoveTrackFromPlaylistCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if len(args) == 2:
-            playlist_name, track_title = args
-            music_player.remove_track_from_playlist(playlist_name, track_title, client_socket)
+    arguments = (Text('playlist_name'), Text('track_title'))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title):
+        music_player.remove_track_from_playlist(playlist_name, track_title, client_socket)
 
 class ShufflePlaylistCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if args:
-            playlist_name = args[0]
-            music_player.shuffle_playlist(playlist_name, client_socket)
+    arguments = (Text('playlist_name'), Integer('seed', default=None))
+
+    def execute(self, music_player, client_socket, playlist_name, seed):
+        music_player.shuffle_playlist(playlist_name, client_socket, seed)
+
+class MoveTrackCommand(Command):
+    arguments = (Text('playlist_name'), Text('track_title'), Integer('position', minimum=1))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title, new_index):
+        music_player.move_track(playlist_name, track_title, new_index, client_socket)
 
 class ShowPlaylistsCommand(Command):
     def execute(self, music_player, client_socket, *args):
         music_player.show_playlists(client_socket)
 
+PAGING = (Integer('offset', default=0, minimum=0), Integer('limit', default=None, minimum=1), Flag('total'))
+
+def parse_position(text):
+    parts = text.split(':')
+    if len(parts) > 3 or not all(part.isdigit() for part in parts[:-1]):
+        raise ValueError(f"invalid position '{text}'")
+    last = float(parts[-1])
+    if not math.isfinite(last) or last < 0 or len(parts) > 1 and last >= 60:
+        raise ValueError(f"invalid position '{text}'")
+    seconds = 0.0
+    for index, part in enumerate(parts[:-1]):
+        value = int(part)
+        if index and value >= 60:
+            raise ValueError(f"invalid position '{text}'")
+        seconds = seconds * 60 + value
+    return seconds * 60 + last if len(parts) > 1 else last
+
 class ShowTracksForPlaylistCommand(Command):
+    arguments = (Text('playlist_name'),) + PAGING
+
+    def execute(self, music_player, client_socket, playlist_name, offset, limit, total):
+        music_player.show_tracks_for_playlist(playlist_name, client_socket, offset, limit, total)
+
+class SearchCommand(Command):
+    arguments = (Text('terms', rest=True), Option('offset', Integer('offset', default=0, minimum=0)),
+                 Option('limit', Integer('limit', default=search_page_size, minimum=1)))
+
+    def execute(self, music_player, client_socket, terms, offset, limit):
+        music_player.search(terms, client_socket, offset, limit)
+
+class RescanLibraryCommand(Command):
+    def execute(self, music_player, client_socket, *args):
+        music_player.rescan_library(client_socket)
+
+class ScanStatusCommand(Command):
+    def execute(self, music_player, client_socket, *args):
+        music_player.show_scan_status(client_socket)
+
+class TrackInfoCommand(Command):
+    arguments = (Text('playlist_name'), Text('track_title'))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title):
+        music_player.show_track_info(playlist_name, track_title, client_socket)
+
+class ShowDuplicatesCommand(Command):
     def execute(self, music_player, client_socket, *args):
-        if args:
-            playlist_name = args[0]
-            music_player.show_tracks_for_playlist(playlist_name, client_socket)
+        music_player.show_duplicates(client_socket)
+
+class CacheStatsCommand(Command):
+    def execute(self, music_player, client_socket, *args):
+        music_player.show_cache_stats(client_socket)
+
+class StatsCommand(Command):
+    def execute(self, music_player, client_socket, *args):
+        music_player.show_stats(client_socket)
 
 class StopCommand(Command):
     def execute(self, music_player, client_socket, *args):
         music_player.stop(client_socket)
 
 class ShowTracksWithOrderCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if args:
-            playlist_name = args[0]
-            music_player.show_tracks_with_order(playlist_name, client_socket)
+    arguments = (Text('playlist_name'),) + PAGING
+
+    def execute(self, music_player, client_socket, playlist_name, offset, limit, total):
+        music_player.show_tracks_with_order(playlist_name, client_socket, offset, limit, total)
 
 class SelectPlaylistCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if args:
-            playlist_id = int(args[0])
-            music_player.select_playlist(playlist_id, client_socket)
+    arguments = (Integer('playlist_id'),)
+
+    def execute(self, music_player, client_socket, playlist_id):
+        music_player.select_playlist(playlist_id, client_socket)
 
 class PlayTrackCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if len(args) == 2:
-            playlist_name, track_title = args
-            music_player.play_track(playlist_name, track_title, client_socket)
+    arguments = (Text('playlist_name'), Text('track_title'))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title):
+        music_player.play_track(playlist_name, track_title, client_socket)
 
 class PlayPlaylistLoopCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        music_player.play_playlist_loop(client_socket)
+    arguments = (Choice('mode', ('all', 'shuffle'), default='all'),)
+
+    def execute(self, music_player, client_socket, repeat):
+        music_player.play_playlist_loop(client_socket, repeat)
 
 class PlayTrackLoopCommand(Command):
+    arguments = (Text('playlist_name'), Text('track_title'))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title):
+        music_player.play_track_loop(playlist_name, track_title, client_socket)
+
+class SetRepeatCommand(Command):
+    arguments = (Choice('mode', REPEAT_MODES),)
+
+    def execute(self, music_player, client_socket, repeat):
+        music_player.set_repeat(repeat, client_socket)
+
+class ResumeCommand(Command):
     def execute(self, music_player, client_socket, *args):
-        if len(args) == 2:
-            playlist_name, track_title = args
-            music_player.play_track_loop(playlist_name, track_title, client_socket)
+        music_player.resume(client_socket)
 
-class RemovePlaylistCommand(Command):
+class EnqueueCommand(Command):
+    arguments = (Text('playlist_name'), Text('track_title'))
+
+    def execute(self, music_player, client_socket, playlist_name, track_title):
+        music_player.enqueue(playlist_name, track_title, client_socket)
+
+class NextTrackCommand(Command):
+    arguments = (Integer('count', default=1, minimum=1),)
+
+    def execute(self, music_player, client_socket, count):
+        music_player.next_track(client_socket, count)
+
+class PreviousTrackCommand(Command):
+    def execute(self, music_player, client_socket, *args):
+        music_player.previous_track(client_socket)
+
+class SeekCommand(Command):
+    arguments = (Position('position'),)
+
+    def execute(self, music_player, client_socket, seconds):
+        music_player.seek(seconds, client_socket)
+
+class ShowQueueCommand(Command):
     def execute(self, music_player, client_socket, *args):
-        if args:
-            playlist_name = args[0]
-            music_player.remove_playlist(playlist_name, client_socket)
+        music_player.show_queue(client_socket)
+
+class CreateZoneCommand(Command):
+    arguments = (Text('zone_name'),)
+
+    def execute(self, music_player, client_socket, zone_name):
+        music_player.create_zone(zone_name, client_socket)
+
+class RemoveZoneCommand(Command):
+    arguments = (Text('zone_name'),)
+
+    def execute(self, music_player, client_socket, zone_name):
+        music_player.remove_zone(zone_name, client_socket)
+
+class SelectZoneCommand(Command):
+    arguments = (Text('zone_name'),)
+
+    def execute(self, music_player, client_socket, zone_name):
+        music_player.select_zone(zone_name, client_socket)
+
+class ShowZonesCommand(Command):
+    def execute(self, music_player, client_socket, *args):
+        music_player.show_zones(client_socket)
+
+class RemovePlaylistCommand(Command):
+    arguments = (Text('playlist_name'),)
+
+    def execute(self, music_player, client_socket, playlist_name):
+        music_player.remove_playlist(playlist_name, client_socket)
 
 class UnpauseCommand(Command):
     def execute(self, music_player, client_socket, *args):
         music_player.unpause(client_socket)
 
 class SetEqualizerCommand(Command):
-    def execute(self, music_player, client_socket, *args):
-        if args:
-            level = float(args[0])
-            music_player.set_equalizer(level, client_socket)
+    arguments = (Number('level', minimum=0.0, maximum=1.0),)
+
+    def execute(self, music_player, client_socket, level):
+        music_player.set_equalizer(level, client_socket)
 
 class PlaylistMemento:
-    def __init__(self, playlist_id, tracks):
+    def __init__(self, playlist_id, track_refs):
         self.playlist_id = playlist_id
-        self.tracks = tracks
\ No newline at end of file
+        self.track_refs = track_refs
+
+class MementoHistory:
+    def __init__(self, depth=memento_history_depth):
+        self.mementos = deque(maxlen=depth)
+        self.rows = []
+        self.row_refs = {}
+        self.compacted_size = 0
+
+    def __len__(self):
+        return len(self.mementos)
+
+    def _intern(self, track):
+        ref = self.row_refs.get(track)
+        if ref is None:
+            ref = len(self.rows)
+            self.rows.append(track)
+            self.row_refs[track] = ref
+        return ref
+
+    def save(self, playlist_id, tracks):
+        track_refs = array('l', (self._intern(tuple(track)) for track in tracks))
+        for previous in reversed(self.mementos):
+            if previous.playlist_id == playlist_id:
+                if previous.track_refs == track_refs:
+                    track_refs = previous.track_refs
+                break
+
+        evicting = len(self.mementos) == self.mementos.maxlen
+        memento = PlaylistMemento(playlist_id, track_refs)
+        self.mementos.append(memento)
+        if evicting and len(self.rows) > 2 * self.compacted_size:
+            self._compact()
+        return memento
+
+    def pop(self):
+        return self.mementos.pop() if self.mementos else None
+
+    def tracks(self, memento):
+        rows = self.rows
+        return [rows[ref] for ref in memento.track_refs]
+
+    def _compact(self):
+        rows = []
+        row_refs = {}
+        remapped = {}
+        for memento in self.mementos:
+            old_refs = memento.track_refs
+            track_refs = remapped.get(id(old_refs), (None, None))[1]
+            if track_refs is None:
+                track_refs = array('l')
+                for ref in old_refs:
+                    track = self.rows[ref]
+                    new_ref = row_refs.get(track)
+                    if new_ref is None:
+                        new_ref = len(rows)
+                        rows.append(track)
+                        row_refs[track] = new_ref
+                    track_refs.append(new_ref)
+                remapped[id(old_refs)] = (old_refs, track_refs)
+            memento.track_refs = track_refs
+        self.rows = rows
+        self.row_refs = row_refs
+        self.compacted_size = len(rows)
\ No newline at end of file
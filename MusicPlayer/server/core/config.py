@@ -1,4 +1,28 @@
 log_file_path = 'log_file.txt'
+log_max_bytes = 5 * 1024 * 1024
+log_backup_count = 3
+
+listen_backlog = 128
+executor_workers = 16
+write_buffer_limit = 256 * 1024
+write_behind = False
+server_workers = 1
+
+track_cache_budget = 64 * 1024 * 1024
+memento_history_depth = 20
+iterator_window = 64
+search_page_size = 20
+metadata_workers = 4
+metadata_batch_size = 256
+prefetch_budget = 256 * 1024 * 1024
+prefetch_depth = 3
+audio_backend = 'pygame'
+max_zones = 8
+play_state_interval = 15.0
+
+metrics_enabled = True
+metrics_host = '127.0.0.1'
+metrics_port = 0
 
 
 
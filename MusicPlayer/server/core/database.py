@@ -1,4 +1,376 @@
+import atexit
+import itertools
+import json
+import queue
+import random
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT = 5.0
+IMPORT_CHUNK_SIZE = 1000
+LISTING_CHUNK_SIZE = 500
+POSITION_GAP = 1024
+WRITE_BEHIND_INTERVAL = 0.005
+WRITE_BEHIND_BATCH = 256
+WRITE_BEHIND_CLOSE_TIMEOUT = 10.0
+WRITE_BEHIND_WAIT_POLL = 1.0
+SEARCH_TERM = re.compile(r'\w+')
+
+SCHEMA_MIGRATIONS = (
+    (
+        """
+        CREATE TABLE IF NOT EXISTS playlists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            playlist_id INTEGER,
+            title TEXT NOT NULL,
+            path TEXT NOT NULL,
+            position INTEGER,
+            UNIQUE (playlist_id, title),
+            FOREIGN KEY (playlist_id) REFERENCES playlists (id)
+        )
+        """,
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_tracks_playlist_position ON tracks (playlist_id, position, title, path)",
+        "CREATE INDEX IF NOT EXISTS idx_tracks_title ON tracks (title)",
+    ),
+    (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5 (
+            title, path,
+            content='tracks', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS tracks_fts_insert AFTER INSERT ON tracks BEGIN
+            INSERT INTO tracks_fts (rowid, title, path) VALUES (new.id, new.title, new.path);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS tracks_fts_delete AFTER DELETE ON tracks BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path) VALUES ('delete', old.id, old.title, old.path);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS tracks_fts_update AFTER UPDATE OF title, path ON tracks BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path) VALUES ('delete', old.id, old.title, old.path);
+            INSERT INTO tracks_fts (rowid, title, path) VALUES (new.id, new.title, new.path);
+        END
+        """,
+        "INSERT INTO tracks_fts (tracks_fts) VALUES ('rebuild')",
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS media_files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            duration REAL,
+            artist TEXT,
+            album TEXT,
+            bitrate INTEGER,
+            content_hash TEXT
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_media_files_hash ON media_files (content_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_tracks_path ON tracks (path)",
+        """
+        CREATE VIEW IF NOT EXISTS track_search AS
+        SELECT tracks.id, tracks.title, tracks.path, media_files.artist, media_files.album
+        FROM tracks LEFT JOIN media_files ON media_files.path = tracks.path
+        """,
+        "DROP TRIGGER IF EXISTS tracks_fts_insert",
+        "DROP TRIGGER IF EXISTS tracks_fts_delete",
+        "DROP TRIGGER IF EXISTS tracks_fts_update",
+        "DROP TABLE IF EXISTS tracks_fts",
+        """
+        CREATE VIRTUAL TABLE tracks_fts USING fts5 (
+            title, path, artist, album,
+            content='track_search', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER tracks_fts_insert AFTER INSERT ON tracks BEGIN
+            INSERT INTO tracks_fts (rowid, title, path, artist, album)
+            SELECT new.id, new.title, new.path, artist, album FROM (SELECT NULL)
+            LEFT JOIN media_files ON media_files.path = new.path;
+        END
+        """,
+        """
+        CREATE TRIGGER tracks_fts_delete AFTER DELETE ON tracks BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path, artist, album)
+            SELECT 'delete', old.id, old.title, old.path, artist, album FROM (SELECT NULL)
+            LEFT JOIN media_files ON media_files.path = old.path;
+        END
+        """,
+        """
+        CREATE TRIGGER tracks_fts_update AFTER UPDATE OF title, path ON tracks BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path, artist, album)
+            SELECT 'delete', old.id, old.title, old.path, artist, album FROM (SELECT NULL)
+            LEFT JOIN media_files ON media_files.path = old.path;
+            INSERT INTO tracks_fts (rowid, title, path, artist, album)
+            SELECT new.id, new.title, new.path, artist, album FROM (SELECT NULL)
+            LEFT JOIN media_files ON media_files.path = new.path;
+        END
+        """,
+        """
+        CREATE TRIGGER media_files_fts_insert AFTER INSERT ON media_files BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path, artist, album)
+            SELECT 'delete', id, title, path, NULL, NULL FROM tracks WHERE path = new.path;
+            INSERT INTO tracks_fts (rowid, title, path, artist, album)
+            SELECT id, title, path, new.artist, new.album FROM tracks WHERE path = new.path;
+        END
+        """,
+        """
+        CREATE TRIGGER media_files_fts_update AFTER UPDATE OF artist, album ON media_files BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path, artist, album)
+            SELECT 'delete', id, title, path, old.artist, old.album FROM tracks WHERE path = old.path;
+            INSERT INTO tracks_fts (rowid, title, path, artist, album)
+            SELECT id, title, path, new.artist, new.album FROM tracks WHERE path = new.path;
+        END
+        """,
+        """
+        CREATE TRIGGER media_files_fts_delete AFTER DELETE ON media_files BEGIN
+            INSERT INTO tracks_fts (tracks_fts, rowid, title, path, artist, album)
+            SELECT 'delete', id, title, path, old.artist, old.album FROM tracks WHERE path = old.path;
+            INSERT INTO tracks_fts (rowid, title, path, artist, album)
+            SELECT id, title, path, NULL, NULL FROM tracks WHERE path = old.path;
+        END
+        """,
+        "INSERT INTO tracks_fts (tracks_fts) VALUES ('rebuild')",
+    ),
+    (
+        f"""
+        UPDATE tracks
+        SET position = ordering.rank * {POSITION_GAP}
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY playlist_id ORDER BY position, id) AS rank
+            FROM tracks
+            WHERE playlist_id IN (
+                SELECT playlist_id FROM tracks GROUP BY playlist_id
+                HAVING COUNT(DISTINCT position) < COUNT(*)
+            )
+        ) AS ordering
+        WHERE tracks.id = ordering.id
+        """,
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS play_state (
+            zone TEXT PRIMARY KEY,
+            source TEXT,
+            queued TEXT,
+            queue TEXT NOT NULL DEFAULT '[]',
+            elapsed REAL NOT NULL DEFAULT 0,
+            repeat TEXT NOT NULL DEFAULT 'off',
+            volume REAL NOT NULL DEFAULT 1.0
+        ) WITHOUT ROWID
+        """,
+    ),
+    (
+        f"""
+        UPDATE tracks
+        SET position = ordering.rank * {POSITION_GAP}
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY playlist_id ORDER BY position, id) AS rank
+            FROM tracks
+            WHERE playlist_id IN (
+                SELECT playlist_id FROM tracks GROUP BY playlist_id
+                HAVING MAX(position) - MIN(position) < (COUNT(*) - 1) * {POSITION_GAP}
+            )
+        ) AS ordering
+        WHERE tracks.id = ordering.id
+        """,
+    ),
+)
+
+
+def search_expression(query):
+    return ' '.join(f'"{term}"*' for term in SEARCH_TERM.findall(query))
+
+
+class PendingWrite:
+    def __init__(self, operation, args, key, durable):
+        self.operation = operation
+        self.args = args
+        self.key = key
+        self.durable = durable
+        self.done = threading.Event()
+        self.committed = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class WriteSession:
+    def __init__(self):
+        self.uncommitted = None
+
+
+class WriteBehindWriter(threading.Thread):
+    def __init__(self, db_manager, interval=WRITE_BEHIND_INTERVAL, batch_size=WRITE_BEHIND_BATCH):
+        super().__init__(name='db-writer', daemon=True)
+        self.db_manager = db_manager
+        self.interval = interval
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.writes = 0
+        self.commits = 0
+        self.lost = 0
+
+    def submit(self, operation, args, key=None, durable=False):
+        write = PendingWrite(operation, args, key, durable)
+        with self.lock:
+            if self.closed:
+                raise sqlite3.OperationalError("The database writer is closed.")
+            self.queue.put(write)
+        while not write.done.wait(WRITE_BEHIND_WAIT_POLL):
+            if not self.is_alive():
+                raise sqlite3.OperationalError("The database writer has stopped.")
+        write.wait()
+        return write
+
+    def flush(self):
+        self.submit(None, (), durable=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'writes': self.writes,
+                'commits': self.commits,
+                'lost': self.lost,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        self.join(WRITE_BEHIND_CLOSE_TIMEOUT)
+
+    def run(self):
+        connection = self.db_manager.connect()
+        pending = []
+        deadline = None
+        while True:
+            try:
+                write = self.queue.get(timeout=max(deadline - time.monotonic(), 0) if pending else None)
+            except queue.Empty:
+                pending = self._commit(connection, pending)
+                continue
+            if write is None:
+                self._commit(connection, pending)
+                self.db_manager.close()
+                return
+            try:
+                applied = write.operation is None or self._apply(connection, write)
+            except sqlite3.Error as e:
+                pending = self._abort(connection, pending + [write], e)
+                continue
+            if applied:
+                if not pending:
+                    deadline = time.monotonic() + self.interval
+                pending.append(write)
+            if write.durable or len(pending) >= self.batch_size:
+                pending = self._commit(connection, pending)
+
+    def _apply(self, connection, write):
+        try:
+            if not connection.in_transaction:
+                connection.execute("BEGIN IMMEDIATE")
+            connection.execute("SAVEPOINT write_behind")
+        except sqlite3.Error as e:
+            write.finish(error=e)
+            return False
+        try:
+            result = write.operation(connection.cursor(), *write.args)
+        except Exception as e:
+            write.error = e
+            connection.execute("ROLLBACK TO write_behind")
+            connection.execute("RELEASE write_behind")
+            write.finish(error=e)
+            return False
+        connection.execute("RELEASE write_behind")
+        if not write.durable:
+            write.finish(result)
+        else:
+            write.result = result
+        return True
+
+    def _commit(self, connection, pending):
+        error = None
+        if connection.in_transaction:
+            try:
+                connection.commit()
+            except sqlite3.Error as e:
+                self._rollback(connection)
+                error = e
+        writes = [write for write in pending if write.operation is not None]
+        with self.lock:
+            self.writes += len(writes)
+            self.commits += 1 if writes else 0
+            if error is not None:
+                self.lost += sum(1 for write in writes if not write.durable)
+        if error is not None:
+            print(f"Write-behind commit of {len(writes)} writes failed: {error}")
+        keys = {write.key for write in writes if write.key is not None}
+        for listener in self.db_manager.commit_listeners:
+            listener(keys)
+        for write in pending:
+            write.committed.set()
+            if write.durable:
+                write.finish(write.result, error)
+        return []
+
+    def _rollback(self, connection):
+        try:
+            connection.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _abort(self, connection, pending, error):
+        self._rollback(connection)
+        writes = [write for write in pending if write.operation is not None]
+        with self.lock:
+            self.lost += sum(1 for write in writes if write.done.is_set() and write.error is None and not write.durable)
+        print(f"Write-behind transaction of {len(writes)} writes was rolled back: {error}")
+        for write in pending:
+            write.committed.set()
+            if not write.done.is_set():
+                write.finish(error=write.error or error)
+        return []
 
 
 class DatabaseFacade:
@@ -11,24 +383,90 @@ class DatabaseFacade:
     def add_track_to_playlist(self, playlist_name, track_title, track_path, client_socket, value=0):
         self.db_manager.add_track_to_playlist(playlist_name, track_title, track_path, client_socket, value)
 
+    def replace_playlist_tracks(self, playlist_id, tracks):
+        self.db_manager.replace_playlist_tracks(playlist_id, tracks)
+
     def remove_track_from_playlist(self, playlist_name, track_title, client_socket, value=0):
         self.db_manager.remove_track_from_playlist(playlist_name, track_title, client_socket, value)
 
-    def shuffle_playlist(self, playlist_name, client_socket):
-        self.db_manager.shuffle_playlist(playlist_name, client_socket)
+    def shuffle_playlist(self, playlist_name, client_socket, seed=None):
+        return self.db_manager.shuffle_playlist(playlist_name, client_socket, seed)
+
+    def move_track(self, playlist_name, track_title, new_index, client_socket):
+        return self.db_manager.move_track(playlist_name, track_title, new_index, client_socket)
+
+    def bulk_add_tracks(self, playlist_name, rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+        return self.db_manager.bulk_add_tracks(playlist_name, rows, chunk_size, progress)
 
     def get_playlists(self):
         return self.db_manager.get_playlists()
 
+    def get_track_path(self, playlist_name, track_title):
+        return self.db_manager.get_track_path(playlist_name, track_title)
+
     def get_tracks_for_playlist(self, playlist_id):
         return self.db_manager.get_tracks_for_playlist(playlist_id)
 
-    def show_tracks_with_order(self, playlist_name, client_socket):
-        self.db_manager.show_tracks_with_order(playlist_name, client_socket)
+    def iter_tracks_for_playlist(self, playlist_id, offset=0, limit=None):
+        return self.db_manager.iter_tracks_for_playlist(playlist_id, offset, limit)
+
+    def search_tracks(self, query, offset=0, limit=None):
+        return self.db_manager.search_tracks(query, offset, limit)
+
+    def count_tracks(self, playlist_id):
+        return self.db_manager.count_tracks(playlist_id)
+
+    def get_track_window(self, playlist_id, after=None, limit=1, offset=0):
+        return self.db_manager.get_track_window(playlist_id, after, limit, offset)
+
+    def get_track_before(self, playlist_id, before):
+        return self.db_manager.get_track_before(playlist_id, before)
+
+    def get_track_positions(self, playlist_id, after=None, limit=1):
+        return self.db_manager.get_track_positions(playlist_id, after, limit)
+
+    def get_media_stats(self, paths):
+        return self.db_manager.get_media_stats(paths)
+
+    def store_media_files(self, rows):
+        self.db_manager.store_media_files(rows)
+
+    def iter_library_paths(self, chunk_size=LISTING_CHUNK_SIZE):
+        return self.db_manager.iter_library_paths(chunk_size)
+
+    def get_track_metadata(self, playlist_name, track_title):
+        return self.db_manager.get_track_metadata(playlist_name, track_title)
+
+    def find_duplicates(self, limit=None):
+        return self.db_manager.find_duplicates(limit)
+
+    def save_play_state(self, zone, source, queued, queue, elapsed, repeat, volume):
+        self.db_manager.save_play_state(zone, source, queued, queue, elapsed, repeat, volume)
+
+    def load_play_state(self, zone):
+        return self.db_manager.load_play_state(zone)
+
+    def show_tracks_with_order(self, playlist_name, client_socket, offset=0, limit=None):
+        self.db_manager.show_tracks_with_order(playlist_name, client_socket, offset, limit)
 
     def show_tracks_for_playlist(self,playlist_name):
         return self.db_manager.show_tracks_for_playlist(playlist_name)
 
+    def write_session(self, session, durable=False):
+        return self.db_manager.write_session(session, durable)
+
+    def flush(self):
+        self.db_manager.flush()
+
+    def shutdown(self):
+        self.db_manager.shutdown()
+
+    def write_stats(self):
+        return self.db_manager.write_stats()
+
+    def add_commit_listener(self, listener):
+        self.db_manager.add_commit_listener(listener)
+
     def select_playlist(self,playlist_id):
         return self.db_manager.select_playlist(playlist_id)
 
@@ -37,43 +475,109 @@ class DatabaseFacade:
 
 
 class DatabaseManager:
-    def __init__(self, db_name="music_player.db"):
+    def __init__(self, db_name="music_player.db", write_behind=False):
         self.db_name = db_name
-
-        with sqlite3.connect(self.db_name) as connection:
-            cursor = connection.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS playlists (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tracks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    playlist_id INTEGER,
-                    title TEXT NOT NULL,
-                    path TEXT NOT NULL,
-                    position INTEGER,
-                    UNIQUE (playlist_id, title),
-                    FOREIGN KEY (playlist_id) REFERENCES playlists (id)
-                )
-            """)
+        self._local = threading.local()
+        self.commit_listeners = []
+        self.writer = None
+
+        self.migrate()
+        if write_behind:
+            self.writer = WriteBehindWriter(self)
+            self.writer.start()
+            atexit.register(self.shutdown)
+
+    def connect(self):
+        session = getattr(self._local, 'session', None)
+        write = session.uncommitted if session is not None else None
+        if write is not None:
+            session.uncommitted = None
+            if not write.committed.is_set() and not self.writer.closed:
+                self.writer.flush()
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
+            for pragma in CONNECTION_PRAGMAS:
+                connection.execute(pragma)
+            self._local.connection = connection
+        return connection
+
+    def schema_version(self):
+        return self.connect().execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        connection = self.connect()
+        while True:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                version = connection.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(SCHEMA_MIGRATIONS):
+                    connection.rollback()
+                    return version
+                for statement in SCHEMA_MIGRATIONS[version]:
+                    connection.execute(statement)
+                connection.execute(f"PRAGMA user_version = {version + 1}")
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @contextmanager
+    def write_session(self, session, durable=False):
+        previous = getattr(self._local, 'session', None), getattr(self._local, 'durable', False)
+        self._local.session = session
+        self._local.durable = durable or previous[1]
+        try:
+            yield
+        finally:
+            self._local.session, self._local.durable = previous
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def shutdown(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def write_stats(self):
+        return self.writer.stats() if self.writer is not None else None
+
+    def add_commit_listener(self, listener):
+        self.commit_listeners.append(listener)
+
+    def _write(self, operation, key, *args):
+        if self.writer is None or self.writer.closed:
+            with self.connect() as connection:
+                return operation(connection.cursor(), *args)
+        write = self.writer.submit(operation, args, key, getattr(self._local, 'durable', False))
+        if not write.durable:
+            session = getattr(self._local, 'session', None)
+            if session is None:
+                session = self._local.session = WriteSession()
+            session.uncommitted = write
+        return write.result
 
     def select_playlist(self,playlist_id):
-        with sqlite3.connect(self.db_name) as connection:
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT id FROM playlists WHERE id=?", (playlist_id,))
             return cursor.fetchone()
 
     def show_tracks_for_playlist(self, playlist_name):
-        with sqlite3.connect(self.db_name) as connection:
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
             return cursor.fetchone()
 
     def remove_playlist_by_name(self, playlist_name,client_socket):
-        with sqlite3.connect(self.db_name) as connection:
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
             playlist_id = cursor.fetchone()
@@ -87,7 +591,7 @@ class DatabaseManager:
             client_socket.sendall(f"Playlist '{playlist_name}' and its tracks removed.".encode('utf-8'))
 
     def get_track_id_by_title(self, playlist_name, track_title):
-        with sqlite3.connect(self.db_name) as connection:
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("""
                 SELECT id
@@ -98,79 +602,216 @@ class DatabaseManager:
             track_id = cursor.fetchone()
             return track_id[0] if track_id else None
 
-    def create_playlist(self, playlist_name,client_socket):
-        with sqlite3.connect(self.db_name) as connection:
+    def get_track_path(self, playlist_name, track_title):
+        with self.connect() as connection:
             cursor = connection.cursor()
+            cursor.execute("""
+                SELECT path
+                FROM tracks
+                WHERE playlist_id = (SELECT id FROM playlists WHERE name=?)
+                AND title = ?
+            """, (playlist_name, track_title))
+            track = cursor.fetchone()
+            return track[0] if track else None
 
-            try:
-                cursor.execute("INSERT INTO playlists (name) VALUES (?)", (playlist_name,))
-                client_socket.sendall(f"Playlist '{playlist_name}' created.".encode('utf-8'))
-            except sqlite3.IntegrityError:
-                client_socket.sendall(f"Playlist '{playlist_name}' already exists. Ignoring.".encode('utf-8'))
+    def create_playlist(self, playlist_name,client_socket):
+        message, playlist_id = self._write(self._create_playlist, playlist_name, playlist_name)
+        client_socket.sendall(message.encode('utf-8'))
+        return playlist_id
 
-            return cursor.lastrowid
+    def _create_playlist(self, cursor, playlist_name):
+        try:
+            cursor.execute("INSERT INTO playlists (name) VALUES (?)", (playlist_name,))
+            return f"Playlist '{playlist_name}' created.", cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return f"Playlist '{playlist_name}' already exists. Ignoring.", cursor.lastrowid
 
     def add_track_to_playlist(self, playlist_name, track_title, track_path,client_socket,value = 0):
-        with sqlite3.connect(self.db_name) as connection:
-            cursor = connection.cursor()
-            cursor.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (playlist_name,))
+        try:
+            message = self._write(self._add_track, playlist_name, playlist_name, track_title, track_path)
+        except Exception as e:
+            message = f"An error occurred while adding track '{track_title}' to the playlist '{playlist_name}': {e}"
+        if value != 1:
+            client_socket.sendall(message.encode('utf-8'))
 
-            try:
-                cursor.execute("""
-                    INSERT INTO tracks (playlist_id, title, path, position)
-                    VALUES ((SELECT id FROM playlists WHERE name=?), ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM tracks WHERE playlist_id=(SELECT id FROM playlists WHERE name=?)))
-                """, (playlist_name, track_title, track_path, playlist_name))
-                if value != 1:
-                    client_socket.sendall(f"Track '{track_title}' added to the playlist '{playlist_name}'.".encode('utf-8'))
-            except sqlite3.IntegrityError:
-                if value != 1:
-                    client_socket.sendall(f"Track '{track_title}' already exists in the playlist '{playlist_name}'. Ignoring.".encode('utf-8'))
-            except Exception as e:
-                if value != 1:
-                    client_socket.sendall(f"An error occurred while adding track '{track_title}' to the playlist '{playlist_name}': {e}".encode('utf-8'))
+    def _add_track(self, cursor, playlist_name, track_title, track_path):
+        cursor.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (playlist_name,))
 
-    def remove_track_from_playlist(self, playlist_name, track_title,client_socket, value = 0):
-        with sqlite3.connect(self.db_name) as connection:
+        try:
+            cursor.execute("""
+                INSERT INTO tracks (playlist_id, title, path, position)
+                VALUES ((SELECT id FROM playlists WHERE name=?), ?, ?, (SELECT COALESCE(MAX(position), 0) + ? FROM tracks WHERE playlist_id=(SELECT id FROM playlists WHERE name=?)))
+            """, (playlist_name, track_title, track_path, POSITION_GAP, playlist_name))
+            return f"Track '{track_title}' added to the playlist '{playlist_name}'."
+        except sqlite3.IntegrityError:
+            return f"Track '{track_title}' already exists in the playlist '{playlist_name}'. Ignoring."
+
+    def bulk_add_tracks(self, playlist_name, rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is not None:
+            rows = itertools.chain((first,), rows)
+
+        connection = self.connect()
+        with connection:
             cursor = connection.cursor()
+            cursor.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (playlist_name,))
+            created = cursor.rowcount == 1
             cursor.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
-            playlist_id = cursor.fetchone()
+            playlist_id = cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(MAX(position), 0) FROM tracks WHERE playlist_id=?", (playlist_id,))
+            position = cursor.fetchone()[0]
+
+        processed = 0
+        added = 0
+        chunk = []
+        try:
+            for title, path in rows:
+                position += POSITION_GAP
+                chunk.append((playlist_id, title, path, position))
+                if len(chunk) >= chunk_size:
+                    added += self._insert_tracks(connection, chunk)
+                    processed += len(chunk)
+                    chunk = []
+                    if progress:
+                        progress(processed, added)
+        except Exception:
+            if created:
+                with connection:
+                    connection.execute("DELETE FROM tracks WHERE playlist_id=?", (playlist_id,))
+                    connection.execute("DELETE FROM playlists WHERE id=?", (playlist_id,))
+            raise
+
+        if chunk:
+            added += self._insert_tracks(connection, chunk)
+            processed += len(chunk)
+            if progress:
+                progress(processed, added)
+
+        return processed, added
+
+    def replace_playlist_tracks(self, playlist_id, tracks):
+        rows = [(playlist_id, title, path, (index + 1) * POSITION_GAP) for index, (title, path) in enumerate(tracks)]
+        with self.connect() as connection:
+            connection.execute("DELETE FROM tracks WHERE playlist_id=?", (playlist_id,))
+            connection.executemany(
+                "INSERT OR IGNORE INTO tracks (playlist_id, title, path, position) VALUES (?, ?, ?, ?)", rows)
+
+    def _insert_tracks(self, connection, rows):
+        with connection:
+            return connection.executemany(
+                "INSERT OR IGNORE INTO tracks (playlist_id, title, path, position) VALUES (?, ?, ?, ?)", rows).rowcount
 
-            if not playlist_id:
-                if value != 1:
-                    client_socket.sendall(f"Playlist '{playlist_name}' not found.".encode('utf-8'))
-                return
-            if value != 1:
-                client_socket.sendall('Track has been successfully deleted'.encode('utf-8'))
-            cursor.execute("DELETE FROM tracks WHERE playlist_id=? AND title=?", (playlist_id[0], track_title))
+    def remove_track_from_playlist(self, playlist_name, track_title,client_socket, value = 0):
+        message = self._write(self._remove_track, playlist_name, playlist_name, track_title)
+        if value != 1:
+            client_socket.sendall(message.encode('utf-8'))
+
+    def _remove_track(self, cursor, playlist_name, track_title):
+        cursor.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
+        playlist_id = cursor.fetchone()
 
-    def shuffle_playlist(self, playlist_name,client_socket):
-        with sqlite3.connect(self.db_name) as connection:
+        if not playlist_id:
+            return f"Playlist '{playlist_name}' not found."
+        cursor.execute("DELETE FROM tracks WHERE playlist_id=? AND title=?", (playlist_id[0], track_title))
+        return 'Track has been successfully deleted'
+
+    def shuffle_playlist(self, playlist_name,client_socket, seed=None):
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
             playlist_id = cursor.fetchone()
 
             if not playlist_id:
                 client_socket.sendall(f"Playlist '{playlist_name}' not found.".encode('utf-8'))
-                return
-
+                return None
+
+            if seed is None:
+                seed = random.randrange(2 ** 32)
+            cursor.execute("SELECT id FROM tracks WHERE playlist_id=? ORDER BY id", (playlist_id[0],))
+            track_ids = [row[0] for row in cursor.fetchall()]
+            random.Random(seed).shuffle(track_ids)
+            self._write_positions(cursor, track_ids)
+            return seed
+
+    def _write_positions(self, cursor, track_ids):
+        cursor.execute("""
+            UPDATE tracks
+            SET position = (ordering.key + 1) * ?
+            FROM json_each(?) AS ordering
+            WHERE tracks.id = ordering.value
+        """, (POSITION_GAP, json.dumps(track_ids)))
+
+    def _renumber_positions(self, cursor, playlist_id):
+        cursor.execute("""
+            UPDATE tracks
+            SET position = ordering.rank * ?
+            FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY position) AS rank FROM tracks WHERE playlist_id = ?) AS ordering
+            WHERE tracks.id = ordering.id
+        """, (POSITION_GAP, playlist_id))
+
+    def _position_for_index(self, cursor, playlist_id, track_id, new_index):
+        offset = max(new_index - 2, 0)
+        cursor.execute("""
+            SELECT position
+            FROM tracks
+            WHERE playlist_id = ? AND id != ?
+            ORDER BY position
+            LIMIT 2 OFFSET ?
+        """, (playlist_id, track_id, offset))
+        neighbours = [row[0] for row in cursor.fetchall()]
+
+        if new_index <= 1:
+            before, after = None, neighbours[0] if neighbours else None
+        elif neighbours:
+            before = neighbours[0]
+            after = neighbours[1] if len(neighbours) > 1 else None
+        else:
+            cursor.execute("SELECT MAX(position) FROM tracks WHERE playlist_id = ? AND id != ?", (playlist_id, track_id))
+            before, after = cursor.fetchone()[0], None
+
+        if before is None and after is None:
+            return POSITION_GAP
+        if before is None:
+            return after - POSITION_GAP
+        if after is None:
+            return before + POSITION_GAP
+        if after - before > 1:
+            return (before + after) // 2
+        return None
+
+    def move_track(self, playlist_name, track_title, new_index, client_socket):
+        with self.connect() as connection:
+            cursor = connection.cursor()
             cursor.execute("""
-                SELECT id FROM tracks
-                WHERE playlist_id=?
-                ORDER BY RANDOM()
-            """, (playlist_id[0],))
-            shuffled_tracks = cursor.fetchall()
+                SELECT tracks.id, tracks.playlist_id
+                FROM tracks
+                WHERE playlist_id = (SELECT id FROM playlists WHERE name=?)
+                AND title = ?
+            """, (playlist_name, track_title))
+            track = cursor.fetchone()
+
+            if not track:
+                client_socket.sendall(f"Track '{track_title}' not found in the playlist '{playlist_name}'.".encode('utf-8'))
+                return False
 
-            for index, track_id in enumerate(shuffled_tracks):
-                cursor.execute("UPDATE tracks SET position=? WHERE id=?", (index + 1, track_id[0]))
+            track_id, playlist_id = track
+            position = self._position_for_index(cursor, playlist_id, track_id, new_index)
+            if position is None:
+                self._renumber_positions(cursor, playlist_id)
+                position = self._position_for_index(cursor, playlist_id, track_id, new_index)
+
+            cursor.execute("UPDATE tracks SET position=? WHERE id=?", (position, track_id))
+            return True
 
     def get_playlists(self):
-        with sqlite3.connect(self.db_name) as connection:
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("SELECT id, name FROM playlists")
             return cursor.fetchall()
 
     def get_tracks_for_playlist(self, playlist_id):
-        with sqlite3.connect(self.db_name) as connection:
+        with self.connect() as connection:
             cursor = connection.cursor()
             cursor.execute("""
                 SELECT title, path
@@ -180,28 +821,168 @@ class DatabaseManager:
             """, (playlist_id,))
             return cursor.fetchall()
 
-    def show_tracks_with_order(self, playlist_name,client_socket):
-        with sqlite3.connect(self.db_name) as connection:
-            cursor = connection.cursor()
-            cursor.execute("SELECT id FROM playlists WHERE name=?", (playlist_name,))
-            playlist_id = cursor.fetchone()
-
-            if not playlist_id:
-                client_socket.sendall(f"Playlist '{playlist_name}' not found.".encode('utf-8'))
-                return
-
-            cursor.execute("""
-                SELECT title, position
+    def iter_tracks_for_playlist(self, playlist_id, offset=0, limit=None, chunk_size=LISTING_CHUNK_SIZE):
+        cursor = self.connect().execute("""
+            SELECT title, path
+            FROM tracks
+            WHERE playlist_id = ?
+            ORDER BY position
+            LIMIT ? OFFSET ?
+        """, (playlist_id, -1 if limit is None else limit, offset))
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def get_track_window(self, playlist_id, after=None, limit=1, offset=0):
+        if after is None:
+            return self.connect().execute("""
+                SELECT position, title, path
                 FROM tracks
                 WHERE playlist_id = ?
                 ORDER BY position
-            """, (playlist_id[0],))
-            tracks = cursor.fetchall()
-
-            if not tracks:
-                client_socket.sendall(f"No tracks found for the playlist '{playlist_name}'.".encode('utf-8'))
-            else:
-                message = f"Tracks for the playlist '{playlist_name}' with their current order:\n"
-                for track in tracks:
-                    message += f"{track[1]}. {track[0]}\n"
-                client_socket.sendall(message.encode('utf-8'))
\ No newline at end of file
+                LIMIT ? OFFSET ?
+            """, (playlist_id, limit, offset)).fetchall()
+        return self.connect().execute("""
+            SELECT position, title, path
+            FROM tracks
+            WHERE playlist_id = ? AND position > ?
+            ORDER BY position
+            LIMIT ? OFFSET ?
+        """, (playlist_id, after, limit, offset)).fetchall()
+
+    def get_track_before(self, playlist_id, before):
+        return self.connect().execute("""
+            SELECT position, title, path
+            FROM tracks
+            WHERE playlist_id = ? AND position < ?
+            ORDER BY position DESC
+            LIMIT 1
+        """, (playlist_id, before)).fetchone()
+
+    def get_track_positions(self, playlist_id, after=None, limit=1):
+        if after is None:
+            rows = self.connect().execute("""
+                SELECT position
+                FROM tracks
+                WHERE playlist_id = ?
+                ORDER BY position
+                LIMIT ?
+            """, (playlist_id, limit))
+        else:
+            rows = self.connect().execute("""
+                SELECT position
+                FROM tracks
+                WHERE playlist_id = ? AND position > ?
+                ORDER BY position
+                LIMIT ?
+            """, (playlist_id, after, limit))
+        return [position for position, in rows]
+
+    def data_version(self):
+        connection = self.connect()
+        return connection.execute("PRAGMA data_version").fetchone()[0], connection.total_changes
+
+    def count_tracks(self, playlist_id):
+        return self.connect().execute("SELECT COUNT(*) FROM tracks WHERE playlist_id = ?", (playlist_id,)).fetchone()[0]
+
+    def search_tracks(self, query, offset=0, limit=None):
+        expression = search_expression(query)
+        if not expression:
+            return []
+        return self.connect().execute("""
+            SELECT playlists.name, tracks.title, tracks.path
+            FROM tracks_fts
+            JOIN tracks ON tracks.id = tracks_fts.rowid
+            JOIN playlists ON playlists.id = tracks.playlist_id
+            WHERE tracks_fts MATCH ?
+            ORDER BY bm25(tracks_fts, 10.0, 1.0, 5.0, 3.0)
+            LIMIT ? OFFSET ?
+        """, (expression, -1 if limit is None else limit, offset)).fetchall()
+
+    def get_media_stats(self, paths):
+        rows = self.connect().execute("""
+            SELECT path, mtime_ns, size
+            FROM media_files
+            WHERE path IN (SELECT value FROM json_each(?))
+        """, (json.dumps(paths),))
+        return {path: (mtime_ns, size) for path, mtime_ns, size in rows}
+
+    def store_media_files(self, rows):
+        with self.connect() as connection:
+            connection.executemany("""
+                INSERT INTO media_files (path, mtime_ns, size, duration, artist, album, bitrate, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    mtime_ns = excluded.mtime_ns, size = excluded.size, duration = excluded.duration,
+                    artist = excluded.artist, album = excluded.album, bitrate = excluded.bitrate,
+                    content_hash = excluded.content_hash
+            """, rows)
+
+    def iter_library_paths(self, chunk_size=LISTING_CHUNK_SIZE):
+        cursor = self.connect().execute("SELECT DISTINCT path FROM tracks ORDER BY path")
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [path for path, in rows]
+        finally:
+            cursor.close()
+
+    def get_track_metadata(self, playlist_name, track_title):
+        return self.connect().execute("""
+            SELECT tracks.path, duration, artist, album, bitrate, content_hash
+            FROM tracks
+            LEFT JOIN media_files ON media_files.path = tracks.path
+            WHERE tracks.playlist_id = (SELECT id FROM playlists WHERE name=?)
+            AND tracks.title = ?
+        """, (playlist_name, track_title)).fetchone()
+
+    def find_duplicates(self, limit=None):
+        return self.connect().execute("""
+            SELECT content_hash, group_concat(path, char(10))
+            FROM media_files
+            WHERE content_hash IS NOT NULL
+            GROUP BY content_hash
+            HAVING COUNT(*) > 1
+            ORDER BY MIN(path)
+            LIMIT ?
+        """, (-1 if limit is None else limit,)).fetchall()
+
+    def save_play_state(self, zone, source, queued, queue, elapsed, repeat, volume):
+        with self.connect() as connection:
+            connection.execute("""
+                INSERT INTO play_state (zone, source, queued, queue, elapsed, repeat, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (zone) DO UPDATE SET
+                    source = excluded.source, queued = excluded.queued, queue = excluded.queue,
+                    elapsed = excluded.elapsed, repeat = excluded.repeat, volume = excluded.volume
+            """, (zone, source, queued, queue, elapsed, repeat, volume))
+
+    def load_play_state(self, zone):
+        return self.connect().execute("""
+            SELECT source, queued, queue, elapsed, repeat, volume
+            FROM play_state
+            WHERE zone = ?
+        """, (zone,)).fetchone()
+
+    def show_tracks_with_order(self, playlist_name, client_socket, offset=0, limit=None):
+        playlist_id = self.show_tracks_for_playlist(playlist_name)
+        if not playlist_id:
+            client_socket.sendall(f"Playlist '{playlist_name}' not found.".encode('utf-8'))
+            return
+
+        index = offset
+        for rows in self.iter_tracks_for_playlist(playlist_id[0], offset, limit):
+            if index == offset:
+                client_socket.sendall(f"Tracks for the playlist '{playlist_name}' with their current order:\n".encode('utf-8'))
+            client_socket.sendall(''.join(f"{index + number}. {title}\n"
+                                          for number, (title, _) in enumerate(rows, 1)).encode('utf-8'))
+            index += len(rows)
+        if index == offset:
+            client_socket.sendall(f"No tracks found for the playlist '{playlist_name}'.".encode('utf-8'))
@@ -0,0 +1,54 @@
+import csv
+import os
+
+AUDIO_EXTENSIONS = ('.mp3', '.ogg', '.wav', '.flac', '.opus', '.mid', '.midi', '.mod', '.xm')
+
+
+def _title_from_path(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def iter_directory(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield _title_from_path(path), path
+
+
+def iter_m3u(manifest_path):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    title = None
+    with open(manifest_path, encoding='utf-8-sig', errors='replace') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#EXTINF:') and ',' in line:
+                title = line.split(',', 1)[1].strip() or None
+                continue
+            if line.startswith('#'):
+                continue
+            path = line if os.path.isabs(line) or '://' in line else os.path.join(base, line)
+            yield title or _title_from_path(path), path
+            title = None
+
+
+def iter_csv(manifest_path):
+    with open(manifest_path, newline='', encoding='utf-8-sig') as manifest:
+        for row in csv.reader(manifest):
+            if len(row) < 2 or [cell.strip().lower() for cell in row[:2]] == ['title', 'path']:
+                continue
+            yield row[0].strip(), row[1].strip()
+
+
+def iter_track_source(source):
+    if os.path.isdir(source):
+        return iter_directory(source)
+    extension = os.path.splitext(source)[1].lower()
+    if extension in ('.m3u', '.m3u8'):
+        return iter_m3u(source)
+    if extension == '.csv':
+        return iter_csv(source)
+    raise ValueError(f"Unsupported import source '{source}'. Use a directory, an .m3u/.m3u8 or a .csv manifest.")
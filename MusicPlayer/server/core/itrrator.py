@@ -1,15 +1,253 @@
-class PlaylistIterator:
-    def __init__(self, tracks):
-        self.tracks = tracks
-        self.index = 0
+import random
+from array import array
+from bisect import bisect_right
+from collections import deque
+
+from MusicPlayer.server.core.config import iterator_window
+
+SHUFFLE_ROUNDS = 6
+SHUFFLE_TABLE_LIMIT = 65536
+
+
+class TrackIterator:
+    kind = None
+    current = None
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.index < len(self.tracks):
-            current_track = self.tracks[self.index]
-            self.index += 1
-            return current_track
+        entry = self.peek()
+        if entry is None:
+            raise StopIteration
+        self.move_to(entry)
+        return entry[1:]
+
+    def track(self):
+        return self.current[1:] if self.current is not None else None
+
+    def move_to(self, entry):
+        self.current = entry
+
+    def first(self):
+        return self.entry_at(0)
+
+    def peek(self):
+        return self.entry_at(self.current[0] + 1 if self.current is not None else 0)
+
+    def upcoming(self, count):
+        entries = []
+        entry = self.peek()
+        while entry is not None and len(entries) < count:
+            entries.append(entry)
+            entry = self.entry_at(entry[0] + 1)
+        return entries
+
+    def seek(self, index):
+        entry = self.entry_at(index)
+        if entry is None:
+            return None
+        self.move_to(entry)
+        return entry[1:]
+
+    def skip(self, count=1):
+        return self.seek(self.current[0] + count if self.current is not None else count - 1)
+
+    def previous(self):
+        if self.current is None or self.current[0] == 0:
+            return None
+        return self.seek(self.current[0] - 1)
+
+    def state(self):
+        return {'kind': self.kind, 'key': self.current[0] if self.current is not None else None}
+
+    def restore(self, key):
+        if key is not None:
+            self.seek(key)
+
+
+class TrackListIterator(TrackIterator):
+    kind = 'tracks'
+
+    def __init__(self, tracks):
+        self.tracks = list(tracks)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def entry_at(self, index):
+        if 0 <= index < len(self.tracks):
+            return (index,) + tuple(self.tracks[index])
+        return None
+
+    def state(self):
+        return dict(super().state(), tracks=self.tracks)
+
+
+class PlaylistIterator(TrackIterator):
+    kind = 'playlist'
+
+    def __init__(self, db_manager, playlist_id, window=iterator_window):
+        self.db_manager = db_manager
+        self.playlist_id = playlist_id
+        self.window_size = window
+        self.window = deque()
+        self.positions = array('q')
+        self.indexed = False
+        self.version = None
+
+    def __len__(self):
+        return self.db_manager.count_tracks(self.playlist_id)
+
+    def _refresh(self):
+        version = self.db_manager.data_version()
+        if version != self.version:
+            self.window.clear()
+            del self.positions[:]
+            self.indexed = False
+            self.version = version
+
+    def _after(self, count):
+        after = self.current[0] if self.current is not None else None
+        return self.db_manager.get_track_window(self.playlist_id, after, count)
+
+    def _extend_index(self):
+        after = self.positions[-1] if self.positions else None
+        limit = max(self.window_size, len(self.positions))
+        positions = self.db_manager.get_track_positions(self.playlist_id, after, limit)
+        self.positions.extend(positions)
+        self.indexed = len(positions) < limit
+
+    def _position(self, index):
+        self._refresh()
+        while len(self.positions) <= index and not self.indexed:
+            self._extend_index()
+        return self.positions[index] if 0 <= index < len(self.positions) else None
+
+    def _index_after(self, position):
+        self._refresh()
+        while not self.indexed and (not self.positions or self.positions[-1] < position):
+            self._extend_index()
+        return bisect_right(self.positions, position)
+
+    def entry_at(self, index):
+        position = self._position(index)
+        if position is None:
+            return None
+        rows = self.db_manager.get_track_window(self.playlist_id, position - 1)
+        return rows[0] if rows else None
+
+    def peek(self):
+        self._refresh()
+        if not self.window:
+            self.window.extend(self._after(self.window_size))
+        return self.window[0] if self.window else None
+
+    def upcoming(self, count):
+        self.peek()
+        if len(self.window) < count:
+            self.window.extend(self.db_manager.get_track_window(
+                self.playlist_id, self.window[-1][0], count - len(self.window)) if self.window else ())
+        return list(self.window)[:count]
+
+    def move_to(self, entry):
+        if self.window and self.window[0] == entry:
+            self.window.popleft()
         else:
-            raise StopIteration
\ No newline at end of file
+            self.window.clear()
+        self.current = entry
+
+    def skip(self, count=1):
+        index = self._index_after(self.current[0]) if self.current is not None else 0
+        entry = self.entry_at(index + count - 1)
+        if entry is None:
+            return None
+        self.move_to(entry)
+        return entry[1:]
+
+    def previous(self):
+        if self.current is None:
+            return None
+        entry = self.db_manager.get_track_before(self.playlist_id, self.current[0])
+        if entry is None:
+            return None
+        self.move_to(entry)
+        return entry[1:]
+
+    def state(self):
+        return dict(super().state(), playlist_id=self.playlist_id)
+
+    def restore(self, key):
+        if key is not None:
+            rows = self.db_manager.get_track_window(self.playlist_id, key - 1)
+            if rows:
+                self.move_to(rows[0])
+
+
+class ShuffleOrder:
+    def __init__(self, size, seed=None):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        generator = random.Random(seed)
+        self.keys = [generator.getrandbits(32) for _ in range(SHUFFLE_ROUNDS)]
+        self.table = None
+        if size <= SHUFFLE_TABLE_LIMIT:
+            self.table = array('l', range(size))
+            generator.shuffle(self.table)
+
+    def _round(self, value, key):
+        value = (value ^ key) * 0x9E3779B1 & 0xFFFFFFFF
+        return (value ^ value >> 15) & self.mask
+
+    def _permute(self, value):
+        left, right = value >> self.half, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return left << self.half | right
+
+    def __getitem__(self, index):
+        if self.table is not None:
+            return self.table[index]
+        value = self._permute(index)
+        while value >= self.size:
+            value = self._permute(value)
+        return value
+
+
+class ShuffledIterator(TrackIterator):
+    kind = 'shuffle'
+
+    def __init__(self, source, seed=None):
+        self.source = source
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.order = ShuffleOrder(len(source), self.seed)
+
+    def __len__(self):
+        return self.order.size
+
+    def entry_at(self, index):
+        while 0 <= index < self.order.size:
+            entry = self.source.entry_at(self.order[index])
+            if entry is not None:
+                return (index,) + entry[1:]
+            index += 1
+        return None
+
+    def state(self):
+        return dict(super().state(), seed=self.seed, source=self.source.state())
+
+
+def restore_iterator(db_manager, state):
+    kind = state['kind']
+    if kind == ShuffledIterator.kind:
+        source = ShuffledIterator(restore_iterator(db_manager, state['source']), state['seed'])
+    elif kind == PlaylistIterator.kind:
+        source = PlaylistIterator(db_manager, state['playlist_id'])
+    elif kind == TrackListIterator.kind:
+        source = TrackListIterator(state['tracks'])
+    else:
+        raise ValueError(f"Unknown track source '{kind}'.")
+    source.restore(state['key'])
+    return source
@@ -1,10 +1,16 @@
 import logging
+import queue
 from abc import ABC, abstractmethod
 from datetime import datetime
-from MusicPlayer.server.core.config import log_file_path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from MusicPlayer.server.core.config import log_file_path, log_max_bytes, log_backup_count
 
 
 class CommandVisitor(ABC):
+    @abstractmethod
+    def visit_command(self, command):
+        pass
+
     @abstractmethod
     def visit_save_memento(self, command):
         pass
@@ -15,10 +21,28 @@ class CommandVisitor(ABC):
 
 class LoggingVisitor(CommandVisitor):
     def __init__(self):
-        logging.basicConfig(filename=log_file_path, level=logging.INFO)
+        log_queue = queue.SimpleQueue()
+        file_handler = RotatingFileHandler(log_file_path, maxBytes=log_max_bytes, backupCount=log_backup_count,
+                                           encoding='utf-8', delay=True)
+        file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        self.listener = QueueListener(log_queue, file_handler)
+        self.listener.start()
+
+        self.handler = QueueHandler(log_queue)
+        self.logger = logging.getLogger('MusicPlayer.audit')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def close(self):
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+
+    def visit_command(self, command):
+        self.logger.info("%s executed at %s", type(command).__name__, datetime.now())
 
     def visit_save_memento(self, command):
-        logging.info(f"SaveMementoCommand executed at {datetime.now()}")
+        self.logger.info("SaveMementoCommand executed at %s", datetime.now())
 
     def visit_restore_memento(self, command):
-        logging.info(f"RestoreMementoCommand executed at {datetime.now()}")
\ No newline at end of file
+        self.logger.info("RestoreMementoCommand executed at %s", datetime.now())
\ No newline at end of file
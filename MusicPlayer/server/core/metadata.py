@@ -0,0 +1,154 @@
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from MusicPlayer.server.core.config import metadata_workers, metadata_batch_size
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as audio_file:
+        for block in iter(lambda: audio_file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _first_tag(audio, name):
+    values = audio.get(name)
+    return str(values[0]) if values else None
+
+
+def _load_mutagen():
+    try:
+        import mutagen
+    except ImportError:
+        return None
+    return mutagen
+
+
+def read_metadata(path):
+    try:
+        stat = os.stat(path)
+        digest = content_hash(path)
+    except OSError:
+        return None
+
+    duration = artist = album = bitrate = None
+    mutagen = _load_mutagen()
+    if mutagen is not None:
+        try:
+            audio = mutagen.File(path, easy=True)
+        except mutagen.MutagenError:
+            audio = None
+        if audio is not None:
+            duration = getattr(audio.info, 'length', None)
+            bitrate = getattr(audio.info, 'bitrate', None)
+            artist = _first_tag(audio, 'artist')
+            album = _first_tag(audio, 'album')
+
+    if duration is None and path.lower().endswith('.wav'):
+        try:
+            with wave.open(path) as wav:
+                duration = wav.getnframes() / wav.getframerate()
+                bitrate = wav.getframerate() * wav.getnchannels() * wav.getsampwidth() * 8
+        except (wave.Error, EOFError, OSError):
+            pass
+
+    return path, stat.st_mtime_ns, stat.st_size, duration, artist, album, bitrate, digest
+
+
+class MetadataScanner(threading.Thread):
+    def __init__(self, db_manager, workers=metadata_workers, batch_size=metadata_batch_size):
+        super().__init__(name='metadata-scanner', daemon=True)
+        self.db_manager = db_manager
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.scanned = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def submit(self, paths):
+        paths = [path for path in dict.fromkeys(paths) if '://' not in path]
+        if paths:
+            with self.lock:
+                self.pending += len(paths)
+            self.queue.put(paths)
+        return len(paths)
+
+    def rescan(self):
+        queued = 0
+        for paths in self.db_manager.iter_library_paths(self.batch_size):
+            queued += self.submit(paths)
+        return queued
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': self.pending,
+                'scanned': self.scanned,
+                'unchanged': self.unchanged,
+                'failed': self.failed,
+            }
+
+    def close(self):
+        self.queue.put(None)
+        self.join(5)
+        if self.executor is not None:
+            self.executor.shutdown(wait=not self.is_alive(), cancel_futures=True)
+
+    def run(self):
+        while True:
+            paths = self.queue.get()
+            if paths is None:
+                break
+            for start in range(0, len(paths), self.batch_size):
+                batch = paths[start:start + self.batch_size]
+                try:
+                    scanned, unchanged = self._scan(batch)
+                except Exception as e:
+                    print(f"Metadata scan failed: {e}")
+                    scanned, unchanged = 0, 0
+                    if isinstance(e, BrokenProcessPool):
+                        self.executor = None
+                with self.lock:
+                    self.pending -= len(batch)
+                    self.scanned += scanned
+                    self.unchanged += unchanged
+                    self.failed += len(batch) - scanned - unchanged
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def _scan(self, paths):
+        known = self.db_manager.get_media_stats(paths)
+        changed = []
+        unchanged = 0
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                unchanged += 1
+            else:
+                changed.append(path)
+
+        rows = []
+        if changed:
+            chunksize = max(1, len(changed) // (self.workers * 4))
+            rows = [row for row in self._executor().map(read_metadata, changed, chunksize=chunksize) if row]
+            self.db_manager.store_media_files(rows)
+        return len(rows), unchanged
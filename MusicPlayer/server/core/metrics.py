@@ -0,0 +1,185 @@
+import bisect
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.queries = {}
+        self.gauges = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.active_connections = 0
+        self.http_server = None
+
+    def observe_command(self, name, seconds):
+        with self.lock:
+            histogram = self.commands.get(name)
+            if histogram is None:
+                histogram = self.commands[name] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_query(self, name, seconds):
+        with self.lock:
+            histogram = self.queries.get(name)
+            if histogram is None:
+                histogram = self.queries[name] = Histogram()
+            histogram.observe(seconds)
+
+    def add_bytes_in(self, count):
+        with self.lock:
+            self.bytes_in += count
+
+    def add_bytes_out(self, count):
+        with self.lock:
+            self.bytes_out += count
+
+    def connection_opened(self):
+        with self.lock:
+            self.active_connections += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.active_connections -= 1
+
+    def register_gauge(self, name, callback):
+        self.gauges[name] = callback
+
+    def instrument(self, target, exclude=()):
+        if not self.enabled:
+            return target
+        for name in dir(type(target)):
+            if name.startswith('_') or name in exclude:
+                continue
+            method = getattr(target, name)
+            if callable(method):
+                setattr(target, name, self._timed(name, method))
+        return target
+
+    def _timed(self, name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.observe_query(name, time.perf_counter() - started)
+        return timed
+
+    def _snapshot(self):
+        with self.lock:
+            commands = {name: (h.count, h.total, list(h.counts), [h.quantile(q) for q in QUANTILES])
+                        for name, h in self.commands.items()}
+            queries = {name: (h.count, h.total, list(h.counts), [h.quantile(q) for q in QUANTILES])
+                       for name, h in self.queries.items()}
+            counters = {'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                        'active_connections': self.active_connections}
+        gauges = {name: callback() for name, callback in self.gauges.items()}
+        return commands, queries, counters, gauges
+
+    def render_text(self):
+        commands, queries, counters, gauges = self._snapshot()
+        lines = [f"Connections: {counters['active_connections']} active, "
+                 f"{counters['bytes_in']} bytes in, {counters['bytes_out']} bytes out"]
+        lines.extend(f"{name}: {value}" for name, value in sorted(gauges.items()))
+        for title, histograms in (('Commands', commands), ('Database', queries)):
+            if not histograms:
+                continue
+            lines.append(f"{title} (count, p50/p95/p99 ms):")
+            for name, (count, _, _, quantiles) in sorted(histograms.items()):
+                p50, p95, p99 = (value * 1000 for value in quantiles)
+                lines.append(f"  {name}: {count}, {p50:.2f}/{p95:.2f}/{p99:.2f}")
+        return '\n'.join(lines)
+
+    def _render_histograms(self, lines, metric, label, histograms):
+        lines.append(f"# TYPE {metric} histogram")
+        for name, (count, total, counts, _) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{{label}="{name}"}} {total}')
+            lines.append(f'{metric}_count{{{label}="{name}"}} {count}')
+
+    def render_prometheus(self):
+        commands, queries, counters, gauges = self._snapshot()
+        lines = []
+        self._render_histograms(lines, 'musicplayer_command_duration_seconds', 'command', commands)
+        self._render_histograms(lines, 'musicplayer_db_query_duration_seconds', 'method', queries)
+        lines.append("# TYPE musicplayer_received_bytes_total counter")
+        lines.append(f"musicplayer_received_bytes_total {counters['bytes_in']}")
+        lines.append("# TYPE musicplayer_sent_bytes_total counter")
+        lines.append(f"musicplayer_sent_bytes_total {counters['bytes_out']}")
+        lines.append("# TYPE musicplayer_active_connections gauge")
+        lines.append(f"musicplayer_active_connections {counters['active_connections']}")
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE musicplayer_{name} gauge")
+            lines.append(f"musicplayer_{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def serve_http(self, host, port):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Metrics endpoint disabled, cannot listen on {host}:{port}: {e}")
+            return
+        self.http_server.daemon_threads = True
+        threading.Thread(target=self.http_server.serve_forever, name='metrics-http', daemon=True).start()
+
+    def close(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
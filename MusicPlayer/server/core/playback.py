@@ -0,0 +1,405 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from MusicPlayer.server.core.audio import AudioError, PygameBackend
+from MusicPlayer.server.core.config import play_state_interval
+from MusicPlayer.server.core.itrrator import ShuffledIterator, restore_iterator
+
+DEFAULT_ZONE = 'main'
+END_POLL_INTERVAL = 0.05
+REPEAT_MODES = ('off', 'one', 'all', 'shuffle')
+
+
+class PlaybackEngine(threading.Thread):
+    def __init__(self, prefetch=None, output=None, zone=DEFAULT_ZONE, store=None, save_interval=play_state_interval):
+        super().__init__(name='playback-engine' if zone == DEFAULT_ZONE else f'playback-engine-{zone}', daemon=True)
+        self.zone = zone
+        self.output = output if output is not None else PygameBackend()
+        self.prefetch = prefetch
+        self.store = store
+        self.save_interval = save_interval
+        self.saved_at = None
+        self.dirty = False
+        self.opened = False
+        self.commands = queue.Queue()
+        self.source = None
+        self.play_queue = deque()
+        self.queued_entry = None
+        self.offset = 0.0
+        self.upcoming = None
+        self.repeat = 'off'
+        self.queued = False
+        self.playing = False
+        self.paused = False
+        self.closed = False
+        self.volume = 1.0
+        self.client_socket = None
+        self.use_events = False
+
+    def play(self, source, client_socket=None, repeat='off'):
+        self.commands.put(('play', (source, client_socket, repeat)))
+
+    def pause(self):
+        self.commands.put(('pause', ()))
+
+    def unpause(self):
+        self.commands.put(('unpause', ()))
+
+    def stop(self):
+        self.commands.put(('stop', ()))
+
+    def resume(self, client_socket=None):
+        self.commands.put(('resume', (client_socket,)))
+
+    def enqueue(self, title, path):
+        self.commands.put(('enqueue', (title, path)))
+
+    def next(self, count=1):
+        self.commands.put(('next', (count,)))
+
+    def previous(self):
+        self.commands.put(('previous', ()))
+
+    def seek(self, seconds):
+        self.commands.put(('seek', (seconds,)))
+
+    def set_volume(self, level):
+        self.commands.put(('set_volume', (level,)))
+
+    def set_repeat(self, repeat):
+        self.commands.put(('set_repeat', (repeat,)))
+
+    def close(self):
+        self.commands.put(('close', ()))
+
+    def warm(self, tracks):
+        if self.prefetch is not None and not self.playing:
+            self.prefetch.schedule([path for _, path in tracks[:self.prefetch.depth]], self.zone)
+
+    def current_track(self):
+        if self.playing:
+            return self.resume_point()
+        return None
+
+    def resume_point(self):
+        queued, source = self.queued_entry, self.source
+        if queued is not None:
+            return queued[1:]
+        if source is not None:
+            return source.track()
+        return None
+
+    def position(self):
+        if self.playing:
+            return self.offset + self.output.elapsed()
+        return self.offset
+
+    def queued_tracks(self):
+        return [entry[1:] for entry in list(self.play_queue)]
+
+    def run(self):
+        self._restore()
+        while True:
+            try:
+                name, args = self.commands.get(timeout=self._timeout())
+                if name == 'play':
+                    self.client_socket = args[1]
+                elif name == 'resume':
+                    self.client_socket = args[0]
+                self._open()
+                getattr(self, f'_{name}')(*args)
+            except queue.Empty:
+                pass
+            except AudioError as e:
+                self._notify(f"Playback error: {e}")
+            if self.closed:
+                return
+            if self.playing:
+                self._poll_track_end()
+            self._save_state()
+
+    def _notify(self, message):
+        if self.client_socket is not None:
+            try:
+                self.client_socket.sendall(message.encode('utf-8'))
+            except OSError:
+                pass
+
+    def _open(self):
+        if not self.opened:
+            self.output.open()
+            self.opened = True
+            self.use_events = self.output.end_events
+            self.output.set_volume(self.volume)
+
+    def _timeout(self):
+        if self.playing:
+            return END_POLL_INTERVAL
+        if not self.dirty or self.store is None:
+            return None
+        if self.saved_at is None:
+            return 0
+        return max(self.saved_at + self.save_interval - time.monotonic(), 0)
+
+    def _restore(self):
+        if self.store is None:
+            return
+        try:
+            state = self.store.load_play_state(self.zone)
+            if state is None:
+                return
+            source, queued, play_queue, offset, repeat, volume = state
+            self.source = restore_iterator(self.store, json.loads(source)) if source else None
+            self.queued_entry = (None,) + tuple(json.loads(queued)) if queued else None
+            self.play_queue.extend((None,) + tuple(track) for track in json.loads(play_queue))
+        except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+            print(f"Could not restore playback state of zone '{self.zone}': {e}")
+            return
+        self.offset = offset
+        self.repeat = repeat
+        self.volume = volume
+
+    def _save_state(self, force=False):
+        if self.store is None or not (force or self.dirty or self.playing and not self.paused):
+            return
+        now = time.monotonic()
+        if not force and self.saved_at is not None and now - self.saved_at < self.save_interval:
+            return
+        source = json.dumps(self.source.state()) if self.source is not None else None
+        queued = json.dumps(self.queued_entry[1:]) if self.queued_entry is not None else None
+        try:
+            self.store.save_play_state(self.zone, source, queued, json.dumps(self.queued_tracks()),
+                                       self.position(), self.repeat, self.volume)
+        except sqlite3.Error as e:
+            print(f"Could not save playback state of zone '{self.zone}': {e}")
+        self.saved_at = now
+        self.dirty = False
+
+    def _poll_track_end(self):
+        if self.use_events:
+            if not self.output.pop_end_event():
+                return
+            if self.queued and self.output.busy():
+                self._advance(*self.upcoming)
+                self.offset = 0.0
+                self.queued = False
+                self._queue_next()
+                return
+        elif self.paused or self.output.busy():
+            return
+        upcoming = self._plan_next()
+        if upcoming is None:
+            self._stop()
+            self.offset = 0.0
+            return
+        self._start(*upcoming)
+
+    def _current_plan(self):
+        if self.queued_entry is not None:
+            return None, self.queued_entry
+        if self.source is None or self.source.current is None:
+            return None
+        return self.source, self.source.current
+
+    def _plan_next(self):
+        if self.repeat == 'one':
+            return self._current_plan()
+        if self.play_queue:
+            return None, self.play_queue[0]
+        return self._plan_after(self.source)
+
+    def _plan_after(self, source, count=1):
+        if source is None:
+            return None
+        entry = None if count > 1 and source.skip(count - 1) is None else source.peek()
+        if entry is not None:
+            return source, entry
+        if self.repeat == 'all':
+            entry = source.first()
+        elif self.repeat == 'shuffle':
+            source = ShuffledIterator(source.source if isinstance(source, ShuffledIterator) else source)
+            entry = source.first()
+        return (source, entry) if entry is not None else None
+
+    def _advance(self, source, entry):
+        if source is None:
+            if self.play_queue and self.play_queue[0] is entry:
+                self.play_queue.popleft()
+            self.queued_entry = entry
+        else:
+            self.queued_entry = None
+            self.source = source
+            source.move_to(entry)
+        self.dirty = True
+
+    def _start(self, source, entry, offset=0.0):
+        self.queued = False
+        failures = 0
+        limit = None
+        while True:
+            self._advance(source, entry)
+            _, title, path = entry
+            try:
+                self.output.load(*self._source(path))
+                self.offset = self._play_from(offset)
+                break
+            except AudioError as e:
+                self._notify(f"Could not play '{title}': {e}")
+                failures += 1
+                if limit is None:
+                    limit = len(self.play_queue) + (len(self.source) if self.source is not None else 0)
+                upcoming = self._plan_next() if self.repeat != 'one' and failures <= limit else None
+                if upcoming is None:
+                    self.playing = False
+                    self.paused = False
+                    return
+                source, entry = upcoming
+                offset = 0.0
+        self.playing = True
+        self.paused = False
+        self.output.clear_end_events()
+        self._queue_next()
+
+    def _play_from(self, offset):
+        if offset > 0:
+            try:
+                self.output.play(offset)
+                return offset
+            except AudioError:
+                pass
+        self.output.play()
+        return 0.0
+
+    def _source(self, path):
+        if self.prefetch is not None:
+            buffer = self.prefetch.open(path)
+            if buffer is not None:
+                return buffer, os.path.basename(path)
+        return path, ''
+
+    def _queue_next(self):
+        self.upcoming = self._plan_next()
+        stale, self.queued = self.queued, False
+        self._prefetch_ahead()
+        if self.use_events and self.upcoming is not None:
+            _, entry = self.upcoming
+            try:
+                self.output.queue(*self._source(entry[2]))
+                self.queued = True
+            except AudioError:
+                pass
+        if stale and not self.queued:
+            self.output.unqueue()
+
+    def _prefetch_ahead(self):
+        if self.prefetch is None or self.upcoming is None:
+            return
+        source, entry = self.upcoming
+        paths = [entry[2]] + [queued[2] for queued in islice(self.play_queue, self.prefetch.depth + 1)]
+        source = source if source is not None else self.source
+        if source is not None:
+            paths += [ahead[2] for ahead in source.upcoming(self.prefetch.depth)]
+        self.prefetch.schedule(list(dict.fromkeys(paths)), self.zone)
+
+    def _play(self, source, client_socket, repeat):
+        self.client_socket = client_socket
+        self.repeat = repeat
+        if repeat == 'shuffle':
+            source = ShuffledIterator(source)
+        entry = source.current if source.current is not None else source.peek()
+        if entry is None:
+            self._stop()
+            return
+        self._start(source, entry)
+
+    def _resume(self, client_socket):
+        if self.playing:
+            self._unpause()
+            return
+        upcoming = self._current_plan()
+        if upcoming is not None:
+            self._start(*upcoming, self.offset)
+
+    def _enqueue(self, title, path):
+        self.play_queue.append((None, title, path))
+        self.dirty = True
+        if self.playing:
+            self._queue_next()
+
+    def _next(self, count):
+        while count > 1 and self.play_queue:
+            self.play_queue.popleft()
+            self.dirty = True
+            count -= 1
+        upcoming = (None, self.play_queue[0]) if self.play_queue else self._plan_after(self.source, count)
+        if upcoming is None:
+            self._stop()
+            self.offset = 0.0
+            return
+        self._start(*upcoming)
+
+    def _previous(self):
+        source = self.source
+        if source is None or source.current is None:
+            return
+        if self.queued_entry is None:
+            source.previous()
+        self._start(source, source.current)
+
+    def _seek(self, seconds):
+        self.dirty = True
+        if not self.playing:
+            self.offset = seconds
+            return
+        position = self.position()
+        try:
+            self.output.play(seconds)
+            self.offset = seconds
+        except AudioError as e:
+            self._notify(f"Could not seek: {e}")
+            self.offset = self._play_from(position)
+        self.paused = False
+        self.output.clear_end_events()
+        self._queue_next()
+
+    def _pause(self):
+        self.output.pause()
+        self.paused = True
+        self.dirty = True
+
+    def _unpause(self):
+        self.output.unpause()
+        self.paused = False
+
+    def _stop(self):
+        if self.playing:
+            self.offset = self.position()
+        self.dirty = True
+        self.output.stop()
+        self.output.clear_end_events()
+        self.playing = False
+        self.paused = False
+        self.queued = False
+
+    def _set_volume(self, level):
+        self.output.set_volume(level)
+        self.volume = level
+        self.dirty = True
+
+    def _set_repeat(self, repeat):
+        self.repeat = repeat
+        self.dirty = True
+        if self.playing:
+            self._queue_next()
+
+    def _close(self):
+        if self.playing:
+            self._stop()
+        self._save_state(force=True)
+        self.closed = True
@@ -1,68 +1,75 @@
-import threading
 import time
 
-import pygame
+from MusicPlayer.server.core.cache import CachedDatabaseManager
+from MusicPlayer.server.core.commands import MementoHistory
+from MusicPlayer.server.core.config import search_page_size, metadata_batch_size
+from MusicPlayer.server.core.database import DatabaseManager, WriteSession
+from MusicPlayer.server.core.importer import iter_track_source
+from MusicPlayer.server.core.itrrator import PlaylistIterator, TrackListIterator
+from MusicPlayer.server.core.playback import PlaybackEngine, REPEAT_MODES
+from MusicPlayer.server.core.zones import DEFAULT_ZONE, ZoneError
 
-from MusicPlayer.server.core.commands import PlaylistMemento
-from MusicPlayer.server.core.database import DatabaseManager
-from MusicPlayer.server.core.itrrator import PlaylistIterator
+
+def format_position(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
 
 
 class MusicPlayer:
-    def __init__(self):
-        pygame.init()
-        self.playing = False
+    def __init__(self, db_manager=None, engine=None, metrics=None, scanner=None, zones=None):
+        if db_manager is None:
+            db_manager = CachedDatabaseManager(DatabaseManager())
+        if engine is None:
+            engine = PlaybackEngine()
+            engine.start()
+        self.default_engine = engine
+        self.zones = zones
+        self.zone = DEFAULT_ZONE
         self.current_playlist_id = None
-        self.db_manager = DatabaseManager()
-        self.memento_stack = []
-
+        self.db_manager = db_manager
+        self.memento_history = MementoHistory()
+        self.writes = WriteSession()
+        self.metrics = metrics
+        self.scanner = scanner
+
+    @property
+    def engine(self):
+        if self.zones is not None and self.zone != DEFAULT_ZONE:
+            engine = self.zones.get(self.zone)
+            if engine is not None:
+                return engine
+            self.zone = DEFAULT_ZONE
+        return self.default_engine
 
     def create_playlist_memento(self):
         if self.current_playlist_id is not None:
             tracks = self.db_manager.get_tracks_for_playlist(self.current_playlist_id)
-            return PlaylistMemento(self.current_playlist_id, tracks)
+            return self.memento_history.save(self.current_playlist_id, tracks)
         return None
 
     def restore_playlist_from_memento(self, playlist_memento):
-        client_socket = None
         if playlist_memento:
             self.current_playlist_id = playlist_memento.playlist_id
-            self.db_manager.remove_track_from_playlist(self.current_playlist_id, "",client_socket, value = 1)
-            for position, (title, path) in enumerate(playlist_memento.tracks):
-                self.db_manager.add_track_to_playlist(self.current_playlist_id, title, path,client_socket, value = 1)
+            tracks = self.memento_history.tracks(playlist_memento)
+            self.db_manager.replace_playlist_tracks(self.current_playlist_id, tracks)
 
 
 
-    def play_in_thread(self, client_socket):
-        client_socket.sendall(f"Playing........".encode('utf-8'))
+    def play(self, client_socket):
         if not self.current_playlist_id:
             client_socket.sendall("No playlist selected. Create or select a playlist.".encode('utf-8'))
             return
-        tracks = self.db_manager.get_tracks_for_playlist(self.current_playlist_id)
+        source = PlaylistIterator(self.db_manager, self.current_playlist_id)
 
-        if not tracks:
+        if source.peek() is None:
             client_socket.sendall("Current playlist is empty. Add some songs.".encode('utf-8'))
             return
 
-        playlist_iterator = PlaylistIterator(tracks)
-        for track in playlist_iterator:
-            pygame.mixer.music.load(track[1])
-            pygame.mixer.music.play()
-            self.playing = True
-
-            while pygame.mixer.music.get_busy() and self.playing:
-                time.sleep(1)
-
-            if not self.playing:
-                break
-
-    def play(self, client_socket):
-        play_thread = threading.Thread(target=self.play_in_thread, args= (client_socket,))
-        play_thread.start()
+        self.engine.play(source, client_socket=client_socket)
+        client_socket.sendall(f"Playing........".encode('utf-8'))
 
     def pause(self, client_socket):
-        pygame.mixer.music.pause()
-        self.playing = False
+        self.engine.pause()
         client_socket.sendall("Paused".encode('utf-8'))
 
     def add_playlist(self, playlist_name, client_socket):
@@ -75,6 +82,41 @@ class MusicPlayer:
             return
 
         self.db_manager.add_track_to_playlist(playlist_name, track_title, track_path,client_socket)
+        if self.scanner is not None:
+            self.scanner.submit([track_path])
+
+    def _scanned(self, rows):
+        paths = []
+        for title, path in rows:
+            paths.append(path)
+            if len(paths) >= metadata_batch_size:
+                self.scanner.submit(paths)
+                paths = []
+            yield title, path
+        if paths:
+            self.scanner.submit(paths)
+
+    def import_tracks(self, playlist_name, source, client_socket):
+        started = time.perf_counter()
+
+        def report(processed, added):
+            elapsed = time.perf_counter() - started
+            rate = processed / elapsed if elapsed else 0
+            client_socket.sendall(f"Imported {added} of {processed} tracks ({rate:.0f} tracks/s)\n".encode('utf-8'))
+
+        try:
+            rows = iter_track_source(source)
+            if self.scanner is not None:
+                rows = self._scanned(rows)
+            processed, added = self.db_manager.bulk_add_tracks(playlist_name, rows, progress=report)
+        except (OSError, ValueError) as e:
+            client_socket.sendall(f"Import into the playlist '{playlist_name}' failed: {e}".encode('utf-8'))
+            return
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        client_socket.sendall(f"Imported {added} tracks into the playlist '{playlist_name}' in {elapsed:.2f}s "
+                              f"({rate:.0f} tracks/s), {processed - added} skipped.".encode('utf-8'))
 
     def remove_track_from_playlist(self, playlist_name, track_title, client_socket):
         if not self.current_playlist_id:
@@ -84,13 +126,31 @@ class MusicPlayer:
 
         self.db_manager.remove_track_from_playlist(playlist_name, track_title,client_socket)
 
-    def shuffle_playlist(self, playlist_name, client_socket):
+    def shuffle_playlist(self, playlist_name, client_socket, seed=None):
         if not self.current_playlist_id:
             client_socket.sendall("No playlist selected. Create or select a playlist.".encode('utf-8'))
             return
 
-        self.db_manager.shuffle_playlist(playlist_name,client_socket)
-        client_socket.sendall(f"Shuffled the playlist '{playlist_name}'.".encode('utf-8'))
+        seed = self.db_manager.shuffle_playlist(playlist_name,client_socket, seed)
+        if seed is not None:
+            client_socket.sendall(f"Shuffled the playlist '{playlist_name}' (seed {seed}).".encode('utf-8'))
+
+    def move_track(self, playlist_name, track_title, new_index, client_socket):
+        if self.db_manager.move_track(playlist_name, track_title, new_index, client_socket):
+            client_socket.sendall(f"Moved '{track_title}' to position {new_index} in the playlist '{playlist_name}'.".encode('utf-8'))
+
+    def search(self, query, client_socket, offset=0, limit=search_page_size):
+        rows = self.db_manager.search_tracks(query, offset, limit + 1)
+        if not rows:
+            client_socket.sendall(f"No tracks matching '{query}'.".encode('utf-8'))
+            return
+
+        message = f"Tracks matching '{query}': \n" + ''.join(
+            f"{offset + number}. {title} - {path} ({playlist_name}) \n"
+            for number, (playlist_name, title, path) in enumerate(rows[:limit], 1))
+        if len(rows) > limit:
+            message += f"More results available, continue from offset {offset + limit}."
+        client_socket.sendall(message.encode('utf-8'))
 
     def show_playlists(self, client_socket):
         playlists = self.db_manager.get_playlists()
@@ -98,36 +158,113 @@ class MusicPlayer:
         if not playlists:
             client_socket.sendall("No playlists found.".encode('utf-8'))
         else:
-            message = "Available playlists: \n"
-            for playlist in playlists:
-                message += f"{playlist[0]}. {playlist[1]} \n"
+            message = "Available playlists: \n" + ''.join(f"{playlist[0]}. {playlist[1]} \n" for playlist in playlists)
             client_socket.sendall(message.encode('utf-8'))
 
-    def show_tracks_for_playlist(self, playlist_name, client_socket):
+    def show_tracks_for_playlist(self, playlist_name, client_socket, offset=0, limit=None, total=False):
+        self._stream_tracks(playlist_name, client_socket, "Playlist not found.",
+                            f"Tracks for the playlist '{playlist_name}': \n",
+                            lambda index, title, path: f"{title} - {path} \n", offset, limit, total)
+
+    def _stream_tracks(self, playlist_name, client_socket, not_found, header, line, offset, limit, total):
         result = self.db_manager.show_tracks_for_playlist(playlist_name)
 
         if not result:
-            client_socket.sendall("Playlist not found.".encode('utf-8'))
+            client_socket.sendall(not_found.encode('utf-8'))
+            return
+
+        shown = 0
+        more = False
+        fetch = None if limit is None else limit + 1
+        for rows in self.db_manager.iter_tracks_for_playlist(result[0], offset, fetch):
+            if limit is not None and shown + len(rows) > limit:
+                rows = rows[:limit - shown]
+                more = True
+            if not rows:
+                break
+            if not shown:
+                client_socket.sendall(header.encode('utf-8'))
+            client_socket.sendall(''.join(line(offset + shown + number, title, path)
+                                          for number, (title, path) in enumerate(rows, 1)).encode('utf-8'))
+            shown += len(rows)
+
+        if not shown:
+            if offset:
+                client_socket.sendall(f"No tracks at offset {offset} in the playlist '{playlist_name}'.".encode('utf-8'))
+            else:
+                client_socket.sendall(f"No tracks found for the playlist '{playlist_name}'.".encode('utf-8'))
+        elif total:
+            count = self.db_manager.count_tracks(result[0])
+            client_socket.sendall(f"Showing tracks {offset + 1}-{offset + shown} of {count}.".encode('utf-8'))
+        elif more:
+            client_socket.sendall(f"More tracks available, continue from offset {offset + shown}.".encode('utf-8'))
+
+    def rescan_library(self, client_socket):
+        if self.scanner is None:
+            client_socket.sendall("Metadata scanning is disabled.".encode('utf-8'))
             return
+        queued = self.scanner.rescan()
+        client_socket.sendall(f"Queued {queued} files for a metadata scan.".encode('utf-8'))
 
-        tracks = self.db_manager.get_tracks_for_playlist(result[0])
+    def show_scan_status(self, client_socket):
+        if self.scanner is None:
+            client_socket.sendall("Metadata scanning is disabled.".encode('utf-8'))
+            return
+        stats = self.scanner.stats()
+        client_socket.sendall(f"Metadata scan: {stats['pending']} pending, {stats['scanned']} scanned, "
+                              f"{stats['unchanged']} unchanged, {stats['failed']} failed".encode('utf-8'))
 
-        if not tracks:
-            client_socket.sendall(f"No tracks found for the playlist '{playlist_name}'.".encode('utf-8'))
-        else:
-            message = f"Tracks for the playlist '{playlist_name}': \n"
-            for track in tracks:
-                message += f"{track[0]} - {track[1]} \n"
-            client_socket.sendall(message.encode('utf-8'))
+    def show_track_info(self, playlist_name, track_title, client_socket):
+        info = self.db_manager.get_track_metadata(playlist_name, track_title)
+        if info is None:
+            client_socket.sendall(f"Track '{track_title}' not found in the playlist '{playlist_name}'.".encode('utf-8'))
+            return
+
+        path, duration, artist, album, bitrate, digest = info
+        if digest is None:
+            client_socket.sendall(f"{track_title} - {path}: not scanned yet.".encode('utf-8'))
+            return
+        length = f"{int(duration) // 60}:{int(duration) % 60:02d}" if duration is not None else "unknown length"
+        rate = f"{bitrate // 1000} kbps" if bitrate else "unknown bitrate"
+        client_socket.sendall(f"{track_title} - {path}: {length}, {artist or 'unknown artist'}, "
+                              f"{album or 'unknown album'}, {rate}, hash {digest}".encode('utf-8'))
+
+    def show_duplicates(self, client_socket):
+        duplicates = self.db_manager.find_duplicates(search_page_size)
+        if not duplicates:
+            client_socket.sendall("No duplicate files found.".encode('utf-8'))
+            return
+        message = "Duplicate files: \n" + ''.join(f"{digest}: \n  " + paths.replace('\n', '\n  ') + " \n"
+                                                   for digest, paths in duplicates)
+        client_socket.sendall(message.encode('utf-8'))
+
+    def show_cache_stats(self, client_socket):
+        stats = self.db_manager.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / lookups * 100 if lookups else 0
+        client_socket.sendall(f"Cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.1f}% hit rate), "
+                              f"{stats['playlists_cached']} playlists cached, "
+                              f"{stats['memory_used']} of {stats['memory_budget']} bytes used".encode('utf-8'))
+        if self.engine.prefetch is not None:
+            stats = self.engine.prefetch.stats()
+            client_socket.sendall(f"\nPrefetch: {stats['hits']} hits, {stats['misses']} misses, "
+                                  f"{stats['tracks_cached']} tracks cached, "
+                                  f"{stats['memory_used']} of {stats['memory_budget']} bytes used".encode('utf-8'))
+
+    def show_stats(self, client_socket):
+        if self.metrics is None or not self.metrics.enabled:
+            client_socket.sendall("Metrics are disabled.".encode('utf-8'))
+            return
+        client_socket.sendall(self.metrics.render_text().encode('utf-8'))
 
     def stop(self, client_socket):
-        pygame.mixer.music.stop()
-        self.playing = False
-        time.sleep(1)
+        self.engine.stop()
         client_socket.sendall("Music stopped.".encode('utf-8'))
 
-    def show_tracks_with_order(self, playlist_name, client_socket):
-        self.db_manager.show_tracks_with_order(playlist_name,client_socket)
+    def show_tracks_with_order(self, playlist_name, client_socket, offset=0, limit=None, total=False):
+        self._stream_tracks(playlist_name, client_socket, f"Playlist '{playlist_name}' not found.",
+                            f"Tracks for the playlist '{playlist_name}' with their current order:\n",
+                            lambda index, title, path: f"{index}. {title}\n", offset, limit, total)
 
     def select_playlist(self, playlist_id, client_socket):
         result = self.db_manager.select_playlist(playlist_id)
@@ -138,68 +275,187 @@ class MusicPlayer:
             return
 
         self.current_playlist_id = result[0]
+        if self.engine.prefetch is not None:
+            for tracks in self.db_manager.iter_tracks_for_playlist(self.current_playlist_id, 0, self.engine.prefetch.depth):
+                self.engine.warm(tracks)
         message = f"Playlist selected: {self.current_playlist_id}"
         client_socket.sendall(message.encode('utf-8'))
 
-    def play_track_in_thread(self, playlist_name, track_title, client_socket):
+    def play_track(self, playlist_name, track_title, client_socket):
         if not self.current_playlist_id:
             message = "No playlist selected. Create or select a playlist."
             client_socket.sendall(message.encode('utf-8'))
             return
 
-        track_id = self.db_manager.get_track_id_by_title(playlist_name, track_title)
+        track_path = self.db_manager.get_track_path(playlist_name, track_title)
 
-        if not track_id:
+        if not track_path:
             message = f"Track '{track_title}' not found in the playlist '{playlist_name}'."
             client_socket.sendall(message.encode('utf-8'))
             return
 
-        track_path = self.db_manager.get_tracks_for_playlist(self.current_playlist_id)[track_id - 1][1]
-        pygame.mixer.music.load(track_path)
-        pygame.mixer.music.play()
-        self.playing = True
+        self.engine.play(TrackListIterator([(track_title, track_path)]), client_socket=client_socket)
         message = f"Playing: {track_title} from the playlist '{playlist_name}'"
         client_socket.sendall(message.encode('utf-8'))
 
-        while pygame.mixer.music.get_busy():
-            time.sleep(1)
-
-
-    def play_track(self, playlist_name, track_title, client_socket):
-        play_track_thread = threading.Thread(target=self.play_track_in_thread, args=(playlist_name, track_title, client_socket,))
-        play_track_thread.start()
-
-    def play_playlist_loop(self, client_socket):
+    def play_playlist_loop(self, client_socket, repeat='all'):
         if not self.current_playlist_id:
             message = "No playlist selected. Create or select a playlist."
             client_socket.sendall(message.encode('utf-8'))
             return
 
-        while True:
-            self.play(client_socket)
+        if repeat not in ('all', 'shuffle'):
+            client_socket.sendall(f"Unknown loop mode '{repeat}'. Use 'all' or 'shuffle'.".encode('utf-8'))
+            return
+
+        source = PlaylistIterator(self.db_manager, self.current_playlist_id)
+
+        if source.peek() is None:
+            client_socket.sendall("Current playlist is empty. Add some songs.".encode('utf-8'))
+            return
+
+        self.engine.play(source, client_socket=client_socket, repeat=repeat)
+        client_socket.sendall(f"Looping playlist {self.current_playlist_id} ({repeat}). Use 'stop' to end.".encode('utf-8'))
 
     def play_track_loop(self, playlist_name, track_title, client_socket):
         if not self.current_playlist_id:
             client_socket.sendall("No playlist selected. Create or select a playlist.".encode('utf-8'))
             return
 
-        track_id = self.db_manager.get_track_id_by_title(playlist_name, track_title)
+        track_path = self.db_manager.get_track_path(playlist_name, track_title)
 
-        if not track_id:
+        if not track_path:
             client_socket.sendall(f"Track '{track_title}' not found in the playlist '{playlist_name}'.".encode('utf-8'))
             return
 
-        while True:
-            self.play_track(playlist_name, track_title, client_socket)
+        self.engine.play(TrackListIterator([(track_title, track_path)]), client_socket=client_socket, repeat='one')
+        client_socket.sendall(f"Looping: {track_title} from the playlist '{playlist_name}'. Use 'stop' to end.".encode('utf-8'))
+
+    def set_repeat(self, repeat, client_socket):
+        if repeat not in REPEAT_MODES:
+            client_socket.sendall(f"Unknown repeat mode '{repeat}'. Use one of: {', '.join(REPEAT_MODES)}.".encode('utf-8'))
+            return
+
+        self.engine.set_repeat(repeat)
+        client_socket.sendall(f"Repeat mode set to {repeat}.".encode('utf-8'))
 
     def remove_playlist(self, playlist_name, client_socket):
         self.db_manager.remove_playlist_by_name(playlist_name,client_socket)
 
     def unpause(self, client_socket):
-        pygame.mixer.music.unpause()
-        self.playing = True
+        self.engine.unpause()
         client_socket.sendall("Music resumed.".encode('utf-8'))
 
+    def resume(self, client_socket):
+        track = self.engine.resume_point()
+        if track is None:
+            client_socket.sendall("Nothing to resume. Use 'play' to start the current playlist.".encode('utf-8'))
+            return
+
+        self.engine.resume(client_socket)
+        client_socket.sendall(f"Resuming '{track[0]}' at {format_position(self.engine.position())}.".encode('utf-8'))
+
+    def enqueue(self, playlist_name, track_title, client_socket):
+        track_path = self.db_manager.get_track_path(playlist_name, track_title)
+
+        if not track_path:
+            client_socket.sendall(f"Track '{track_title}' not found in the playlist '{playlist_name}'.".encode('utf-8'))
+            return
+
+        self.engine.enqueue(track_title, track_path)
+        client_socket.sendall(f"Queued: {track_title} from the playlist '{playlist_name}'".encode('utf-8'))
+
+    def next_track(self, client_socket, count=1):
+        if count < 1:
+            client_socket.sendall("Skip count must be at least 1.".encode('utf-8'))
+            return
+        if self.engine.resume_point() is None and not self.engine.queued_tracks():
+            client_socket.sendall("Nothing is playing and the queue is empty.".encode('utf-8'))
+            return
+
+        self.engine.next(count)
+        client_socket.sendall("Skipping to the next track.".encode('utf-8'))
+
+    def previous_track(self, client_socket):
+        if self.engine.resume_point() is None:
+            client_socket.sendall("Nothing is playing.".encode('utf-8'))
+            return
+
+        self.engine.previous()
+        client_socket.sendall("Going back to the previous track.".encode('utf-8'))
+
+    def seek(self, seconds, client_socket):
+        if seconds < 0:
+            client_socket.sendall("Position must not be negative.".encode('utf-8'))
+            return
+        if self.engine.resume_point() is None:
+            client_socket.sendall("Nothing is playing.".encode('utf-8'))
+            return
+
+        self.engine.seek(seconds)
+        client_socket.sendall(f"Seeking to {format_position(seconds)}.".encode('utf-8'))
+
+    def show_queue(self, client_socket):
+        engine = self.engine
+        track = engine.resume_point()
+        if track is None:
+            message = "Nothing is playing. \n"
+        elif engine.current_track() is None:
+            message = f"Stopped at '{track[0]}' ({format_position(engine.position())}), use 'resume' to continue. \n"
+        else:
+            state = 'Paused' if engine.paused else 'Now playing'
+            message = f"{state}: '{track[0]}' ({format_position(engine.position())}) \n"
+
+        queued = engine.queued_tracks()
+        if not queued:
+            message += "The queue is empty."
+        else:
+            message += "Up next: \n" + ''.join(f"{index}. {title} \n" for index, (title, _) in enumerate(queued, start=1))
+        client_socket.sendall(message.encode('utf-8'))
+
+    def create_zone(self, zone_name, client_socket):
+        if self.zones is None:
+            client_socket.sendall("Zones are not available.".encode('utf-8'))
+            return
+        try:
+            self.zones.create(zone_name)
+        except ZoneError as e:
+            client_socket.sendall(str(e).encode('utf-8'))
+            return
+        client_socket.sendall(f"Zone '{zone_name}' created.".encode('utf-8'))
+
+    def remove_zone(self, zone_name, client_socket):
+        if self.zones is None:
+            client_socket.sendall("Zones are not available.".encode('utf-8'))
+            return
+        try:
+            self.zones.remove(zone_name)
+        except ZoneError as e:
+            client_socket.sendall(str(e).encode('utf-8'))
+            return
+        client_socket.sendall(f"Zone '{zone_name}' removed.".encode('utf-8'))
+
+    def select_zone(self, zone_name, client_socket):
+        if zone_name != DEFAULT_ZONE and (self.zones is None or self.zones.get(zone_name) is None):
+            client_socket.sendall(f"Zone '{zone_name}' not found.".encode('utf-8'))
+            return
+        self.zone = zone_name
+        client_socket.sendall(f"Zone selected: {zone_name}".encode('utf-8'))
+
+    def show_zones(self, client_socket):
+        zones = self.zones.items() if self.zones is not None else [(DEFAULT_ZONE, self.default_engine)]
+        current = self.engine
+        message = "Zones: \n"
+        for zone_name, engine in zones:
+            track = engine.current_track()
+            if track is None:
+                state = "stopped"
+            else:
+                state = f"{'paused' if engine.paused else 'playing'} '{track[0]}'"
+            marker = '*' if engine is current else ' '
+            message += f"{marker} {zone_name}: {state}, repeat {engine.repeat}, volume {engine.volume} \n"
+        client_socket.sendall(message.encode('utf-8'))
+
     def set_equalizer(self, level, client_socket):
-        pygame.mixer.music.set_volume(level)
+        self.engine.set_volume(level)
         client_socket.sendall(f"Equalizer set to level {level}".encode('utf-8'))
\ No newline at end of file
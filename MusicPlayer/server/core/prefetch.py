@@ -0,0 +1,100 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from MusicPlayer.server.core.config import prefetch_budget, prefetch_depth
+
+
+class PrefetchCache(threading.Thread):
+    def __init__(self, memory_budget=prefetch_budget, depth=prefetch_depth):
+        super().__init__(name='playback-prefetch', daemon=True)
+        self.memory_budget = memory_budget
+        self.depth = depth
+        self.condition = threading.Condition()
+        self.wanted = {}
+        self.buffers = OrderedDict()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.closed = False
+
+    def schedule(self, paths, owner=None):
+        with self.condition:
+            wanted = [path for path in paths if '://' not in path][:self.depth]
+            self.wanted[owner] = wanted
+            for path in wanted:
+                if path in self.buffers:
+                    self.buffers.move_to_end(path)
+            self.condition.notify()
+
+    def forget(self, owner):
+        with self.condition:
+            self.wanted.pop(owner, None)
+
+    def open(self, path):
+        with self.condition:
+            data = self.buffers.get(path)
+            if data is None:
+                self.misses += 1
+                return None
+            self.buffers.move_to_end(path)
+            self.hits += 1
+        return io.BytesIO(data)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'tracks_cached': len(self.buffers),
+                'memory_used': self.memory_used,
+                'memory_budget': self.memory_budget,
+            }
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                path = self._next_wanted()
+                while path is None and not self.closed:
+                    self.condition.wait()
+                    path = self._next_wanted()
+                if self.closed:
+                    return
+            data = self._read(path)
+            with self.condition:
+                for wanted in self.wanted.values():
+                    if path in wanted:
+                        wanted.remove(path)
+                if data is not None and path not in self.buffers:
+                    self._store(path, data)
+
+    def _next_wanted(self):
+        for owner, wanted in list(self.wanted.items()):
+            while wanted:
+                if wanted[0] not in self.buffers:
+                    return wanted[0]
+                wanted.pop(0)
+            del self.wanted[owner]
+        return None
+
+    def _read(self, path):
+        try:
+            if os.path.getsize(path) > self.memory_budget // 2:
+                return None
+            with open(path, 'rb') as audio_file:
+                return audio_file.read()
+        except OSError:
+            return None
+
+    def _store(self, path, data):
+        self.buffers[path] = data
+        self.memory_used += len(data)
+        while self.memory_used > self.memory_budget:
+            _, evicted = self.buffers.popitem(last=False)
+            self.memory_used -= len(evicted)
@@ -1,41 +1,243 @@
+import asyncio
+import multiprocessing
+import signal
 import socket
 import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from MusicPlayer.protocol import FLAG_END, HEADER, encode_frame, read_frame, recv_frame
+from MusicPlayer.server.core.config import listen_backlog, executor_workers, metrics_enabled, metrics_host, \
+    metrics_port, write_buffer_limit, audio_backend, write_behind, server_workers
+from MusicPlayer.server.core.cache import CachedDatabaseManager, SharedGeneration
+from MusicPlayer.server.core.database import DatabaseManager
 from MusicPlayer.server.core.loggingvisitor import LoggingVisitor
+from MusicPlayer.server.core.metadata import MetadataScanner
+from MusicPlayer.server.core.metrics import Metrics
+from MusicPlayer.server.core.prefetch import PrefetchCache
 from MusicPlayer.server.core.player import MusicPlayer
+from MusicPlayer.server.core.sharding import PlaybackClient, PlaybackService, RemoteZoneManager
+from MusicPlayer.server.core.zones import ZoneManager
 from MusicPlayer.server.core.commands import PlayCommand, PauseCommand, AddPlaylistCommand, AddTrackToPlaylistCommand, \
     RemoveTrackFromPlaylistCommand, ShufflePlaylistCommand, ShowPlaylistsCommand, ShowTracksForPlaylistCommand, \
     StopCommand, ShowTracksWithOrderCommand, SelectPlaylistCommand, PlayTrackCommand, PlayPlaylistLoopCommand, \
     PlayTrackLoopCommand, RemovePlaylistCommand, UnpauseCommand, SetEqualizerCommand, SaveMementoCommand, \
-    RestoreMementoCommand
+    RestoreMementoCommand, ImportTracksCommand, MoveTrackCommand, CacheStatsCommand, SearchCommand, \
+    SetRepeatCommand, StatsCommand, RescanLibraryCommand, ScanStatusCommand, TrackInfoCommand, ShowDuplicatesCommand, \
+    CreateZoneCommand, RemoveZoneCommand, SelectZoneCommand, ShowZonesCommand, ResumeCommand, EnqueueCommand, \
+    NextTrackCommand, PreviousTrackCommand, SeekCommand, ShowQueueCommand, HelpCommand, CommandError, CommandRegistry
 
+WORKER_START_TIMEOUT = 30.0
+WORKER_CLOSE_TIMEOUT = 5.0
+
+
+class ClientConnection:
+    def __init__(self, client_socket, metrics):
+        self.client_socket = client_socket
+        self.metrics = metrics
+        self.lock = threading.Lock()
+
+    def send_frame(self, request_id, payload, flags=0):
+        data = encode_frame(request_id, payload, flags)
+        if self.metrics.enabled:
+            self.metrics.add_bytes_out(len(data))
+        with self.lock:
+            self.client_socket.sendall(data)
+
+
+class AsyncClientConnection:
+    def __init__(self, loop, writer, metrics):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.writer = writer
+        self.metrics = metrics
+
+    def send_frame(self, request_id, payload, flags=0):
+        data = encode_frame(request_id, payload, flags)
+        if self.metrics.enabled:
+            self.metrics.add_bytes_out(len(data))
+        if threading.get_ident() == self.loop_thread:
+            self._write(data)
+        else:
+            send = self._send(data)
+            try:
+                future = asyncio.run_coroutine_threadsafe(send, self.loop)
+            except RuntimeError:
+                send.close()
+                raise
+            future.result()
+
+    async def _send(self, data):
+        self._write(data)
+        if not self.writer.is_closing() and self.writer.transport.get_write_buffer_size() > write_buffer_limit:
+            await self.writer.drain()
+
+    def _write(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class ReplyChannel:
+    def __init__(self, connection, request_id):
+        self.connection = connection
+        self.request_id = request_id
+        self.closed = False
+
+    def sendall(self, data):
+        if self.closed:
+            return
+        try:
+            self.connection.send_frame(self.request_id, data)
+        except (OSError, RuntimeError, CancelledError):
+            self.closed = True
+
+    def end(self):
+        self.connection.send_frame(self.request_id, b'', FLAG_END)
 
 
 class MusicServer:
-    def __init__(self, host='127.0.0.1', port=12345):
+    def __init__(self, host='127.0.0.1', port=12345, metrics_enabled=metrics_enabled, metrics_port=metrics_port,
+                 audio_backend=audio_backend, started=None, write_behind=write_behind, workers=server_workers,
+                 playback=None, shared=None, worker=None):
+        self.started = started if started is not None else time.perf_counter()
         self.host = host
         self.port = port
+        self.write_behind = write_behind
+        self.worker_count = workers
+        self.workers = []
+        self.service = None
+        self.counters = None
+        if workers > 1:
+            self.counters = multiprocessing.get_context('spawn').RawArray('Q', workers)
+            shared = SharedGeneration(self.counters, 0)
+            worker = 0
+        self.worker = worker
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if shared is not None:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise ValueError("Running several workers needs SO_REUSEPORT, which this platform does not support.")
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-        self.memento_stack = []
-        self.music_player = MusicPlayer()
+        self.port = self.server_socket.getsockname()[1]
+        self.server_socket.listen(listen_backlog)
+        self.metrics = Metrics(metrics_enabled)
+        database = self.metrics.instrument(DatabaseManager(write_behind=write_behind),
+                                           exclude=('connect', 'close', 'migrate', 'schema_version',
+                                                    'iter_tracks_for_playlist', 'iter_library_paths', 'data_version',
+                                                    'write_session', 'flush', 'shutdown',
+                                                    'write_stats', 'add_commit_listener'))
+        self.db_manager = CachedDatabaseManager(database, shared=shared)
+        if playback is None:
+            self.prefetch = PrefetchCache()
+            self.prefetch.start()
+            self.zones = ZoneManager(self.prefetch, audio_backend, store=self.db_manager)
+        else:
+            self.zones = RemoteZoneManager(playback)
+            self.prefetch = self.zones.prefetch
+        self.engine = self.zones.default
+        self.scanner = MetadataScanner(self.db_manager)
+        self.scanner.start()
+        self.logging_visitor = LoggingVisitor()
+        self.metrics.register_gauge('playback_threads', self.zones.engine_threads)
+        self.metrics.register_gauge('cache_hits', lambda: self.db_manager.stats()['hits'])
+        self.metrics.register_gauge('cache_misses', lambda: self.db_manager.stats()['misses'])
+        self.metrics.register_gauge('zones', lambda: len(self.zones.items()))
+        self.metrics.register_gauge('prefetch_hits', lambda: self.prefetch.stats()['hits'])
+        self.metrics.register_gauge('prefetch_misses', lambda: self.prefetch.stats()['misses'])
+        self.metrics.register_gauge('metadata_scan_pending', lambda: self.scanner.stats()['pending'])
+        if write_behind:
+            self.metrics.register_gauge('write_behind_writes', lambda: self.db_manager.write_stats()['writes'])
+            self.metrics.register_gauge('write_behind_commits', lambda: self.db_manager.write_stats()['commits'])
+            self.metrics.register_gauge('write_behind_lost', lambda: self.db_manager.write_stats()['lost'])
+        if metrics_enabled and metrics_port:
+            self.metrics.serve_http(metrics_host, metrics_port)
+
+    def close(self):
+        for process in self.workers:
+            process.terminate()
+        for process in self.workers:
+            process.join(WORKER_CLOSE_TIMEOUT)
+        self.metrics.close()
+        self.scanner.close()
+        if self.service is not None:
+            self.service.close()
+        self.zones.close()
+        self.db_manager.shutdown()
+        if isinstance(self.prefetch, PrefetchCache):
+            self.prefetch.close()
+        self.logging_visitor.close()
+        self.server_socket.close()
+
+    def start_workers(self, mode):
+        if self.worker_count < 2:
+            return
+        self.service = PlaybackService(self.zones, self.prefetch, self.db_manager)
+        self.service.start()
+        context = multiprocessing.get_context('spawn')
+        ready = context.Semaphore(0)
+        for slot in range(1, self.worker_count):
+            process = context.Process(target=run_worker, name=f'music-worker-{slot}',
+                                      args=(self.service.address, self.service.authkey, self.host, self.port, mode,
+                                            self.metrics.enabled, self.write_behind, self.counters, slot, ready))
+            process.start()
+            self.workers.append(process)
+        for _ in self.workers:
+            if not ready.acquire(timeout=WORKER_START_TIMEOUT):
+                print(f"Not all workers started within {WORKER_START_TIMEOUT:.0f}s.")
+                break
+
+    def create_session(self):
+        return MusicPlayer(self.db_manager, self.engine, self.metrics, self.scanner, self.zones)
 
 
 
     def handle_client(self, client_socket):
+        connection = ClientConnection(client_socket, self.metrics)
+        music_player = self.create_session()
+        self.metrics.connection_opened()
         while True:
             try:
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
+                frame = recv_frame(client_socket)
+                if frame is None:
                     break
-                self.handle_command(data, client_socket)
+                request_id, _, payload = frame
+                if self.metrics.enabled:
+                    self.metrics.add_bytes_in(HEADER.size + len(payload))
+                reply = ReplyChannel(connection, request_id)
+                self.handle_command(payload.decode('utf-8'), reply, music_player)
+                reply.end()
 
             except Exception as e:
                 print(f"Error handling client: {e}")
                 break
 
+        self.metrics.connection_closed()
         client_socket.close()
 
+    async def handle_client_async(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = AsyncClientConnection(loop, writer, self.metrics)
+        music_player = self.create_session()
+        self.metrics.connection_opened()
+        while True:
+            try:
+                request_id, _, payload = await read_frame(reader)
+                if self.metrics.enabled:
+                    self.metrics.add_bytes_in(HEADER.size + len(payload))
+                reply = ReplyChannel(connection, request_id)
+                await loop.run_in_executor(self.executor, self.handle_command, payload.decode('utf-8'), reply, music_player)
+                reply.end()
+                await writer.drain()
+
+            except asyncio.IncompleteReadError:
+                break
+            except Exception as e:
+                print(f"Error handling client: {e}")
+                break
+
+        self.metrics.connection_closed()
+        writer.close()
+
     def send_help(self, client_socket):
         help_message = """
         Available commands:
@@ -43,55 +245,113 @@ class MusicServer:
         - pause: Pause the playback.
         - add_playlist [name]: Create a new playlist.
         - add_track_to_playlist [playlist_name] [track_title] [track_path]: Add a track to a playlist.
+        - import_tracks [playlist_name] [source]: Bulk import tracks from a directory or an M3U/CSV manifest.
         - remove_track_from_playlist [playlist_name] [track_title]: Remove a track from a playlist.
-        - shuffle_playlist [playlist_name]: Shuffle the tracks in a playlist.
+        - shuffle_playlist [playlist_name] [seed]: Shuffle the tracks in a playlist, optionally replaying a seed.
+        - move_track [playlist_name] [track_title] [position]: Move a track to a new position in a playlist.
         - show_playlists: Show all playlists.
-        - show_tracks_for_playlist [playlist_name]: Show tracks for a specific playlist.
-        - stop: Stop the music playback.
-        - show_tracks_with_order [playlist_name]: Show tracks for a playlist with their current order.
+        - show_tracks_for_playlist [playlist_name] [offset] [limit] [total]: Show tracks for a specific playlist, a page at a time.
+        - stop: Stop the music playback, keeping the position for 'resume'.
+        - resume: Continue from where playback stopped, also after a server restart.
+        - enqueue [playlist_name] [track_title]: Queue a track to play before the rest of the current playlist.
+        - next [count]: Skip to the next queued track, or forward through the playlist.
+        - previous: Go back to the previous track of the playlist.
+        - seek [seconds|m:ss]: Jump to a position in the current track.
+        - queue_show: Show the current track, its position and the queued tracks.
+        - show_tracks_with_order [playlist_name] [offset] [limit] [total]: Show tracks for a playlist with their current order.
         - select_playlist [playlist_id]: Select a playlist by ID.
         - play_track [playlist_name] [track_title]: Play a specific track from a playlist.
+        - play_playlist_loop [all|shuffle]: Loop the current playlist, optionally reshuffling every pass.
         - play_track_loop [playlist_name] [track_title]: Loop a specific track from a playlist.
+        - set_repeat [off|one|all|shuffle]: Change the repeat mode of the current playback.
+        - create_zone [zone_name]: Add a playback zone with its own queue, volume and repeat mode.
+        - remove_zone [zone_name]: Stop and remove a playback zone.
+        - select_zone [zone_name]: Send this session's playback commands to a zone ('main' by default).
+        - zones: List zones and what each one is playing.
         - remove_playlist [playlist_name]: Remove a playlist.
         - unpause: Resume the playback.
-        - set_equalizer [level]: Set the equalizer level.
+        - set_equalizer [level]: Set the equalizer level, from 0 to 1.
         - save_memento: save memento
         - restore_memento: restore memento
+        - rescan_library: Re-read tags, durations and hashes for files that changed since the last scan.
+        - scan_status: Show the progress of the background metadata scan.
+        - track_info [playlist_name] [track_title]: Show duration, artist, album, bitrate and content hash of a track.
+        - show_duplicates: List files with identical content.
+        - cache_stats: Show playlist and audio prefetch cache hit/miss counters and memory use.
+        - search [terms] [offset=N] [limit=N]: Search every playlist for tracks with words in the title or path starting with the terms.
+        - stats: Show per-command latency, database timings and connection counters.
+        Quote arguments that contain spaces, e.g. add_track_to_playlist rock "My Song" "/music/My Song.mp3".
+        Send help [command] to see the arguments of one command.
+        Add --sync to a command to reply only once its changes are committed when write-behind is enabled.
         """
         client_socket.sendall(help_message.encode('utf-8'))
 
-    def handle_command(self, command, client_socket):
-        command_parts = command.split(' ')
-        command_name = command_parts[0].lower()
-
-        if command_name == 'help':
-            self.send_help(client_socket)
-        elif command_name in self.commands:
-            args = command_parts[1:]
-            command_instance = self.commands[command_name]
-            command_instance.execute(self.music_player, client_socket, *args)
-            logging_visitor = LoggingVisitor()
-            command_instance.accept(logging_visitor)
-        else:
-            client_socket.sendall(f'unsupported command {command}'.encode('utf-8'))
+    def handle_command(self, command, client_socket, music_player):
+        started = time.perf_counter() if self.metrics.enabled else 0.0
+        command_name = 'unsupported'
+        try:
+            command_name, command_instance, args, durable = self.registry.parse(command)
+            with self.db_manager.write_session(music_player.writes, durable):
+                command_instance.execute(music_player, client_socket, *args)
+            command_instance.accept(self.logging_visitor)
+        except CommandError as e:
+            command_name = e.command or command_name
+            client_socket.sendall(e.reply().encode('utf-8'))
+        except Exception as e:
+            print(f"Command '{command_name}' failed: {e!r}")
+            client_socket.sendall(CommandError('command_failed', f"{command_name} failed: {e}").reply().encode('utf-8'))
+
+        if self.metrics.enabled:
+            self.metrics.observe_command(command_name, time.perf_counter() - started)
 
 
 
+    def report_listening(self, suffix=''):
+        startup = time.perf_counter() - self.started
+        self.metrics.register_gauge('startup_seconds', lambda: startup)
+        if self.worker is not None:
+            suffix += f" (worker {self.worker})"
+        print(f"Server listening on {self.host}:{self.port}{suffix}, ready in {startup * 1000:.0f}ms")
+
     def start(self):
-        print(f"Server listening on {self.host}:{self.port}")
+        self.report_listening()
         while True:
             client_socket, addr = self.server_socket.accept()
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             client_handler = threading.Thread(target=self.handle_client, args=(client_socket,))
             client_handler.start()
 
+    async def serve_async(self):
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='music-worker')
+        server = await asyncio.start_server(self.handle_client_async, sock=self.server_socket)
+        self.report_listening(' (asyncio)')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def start_async(self):
+        asyncio.run(self.serve_async())
+
+    def serve(self, mode):
+        if mode == 'async':
+            self.start_async()
+        else:
+            self.start()
+
     def register_commands(self):
+        help_command = HelpCommand(self.send_help)
         self.commands = {
+            'help': help_command,
             'play': PlayCommand(),
             'pause': PauseCommand(),
             'add_playlist': AddPlaylistCommand(),
             'add_track_to_playlist': AddTrackToPlaylistCommand(),
+            'import_tracks': ImportTracksCommand(),
             'remove_track_from_playlist': RemoveTrackFromPlaylistCommand(),
             'shuffle_playlist': ShufflePlaylistCommand(),
+            'move_track': MoveTrackCommand(),
             'show_playlists': ShowPlaylistsCommand(),
             'show_tracks_for_playlist': ShowTracksForPlaylistCommand(),
             'stop': StopCommand(),
@@ -100,16 +360,68 @@ class MusicServer:
             'play_track': PlayTrackCommand(),
             'play_playlist_loop': PlayPlaylistLoopCommand(),
             'play_track_loop': PlayTrackLoopCommand(),
+            'set_repeat': SetRepeatCommand(),
+            'create_zone': CreateZoneCommand(),
+            'remove_zone': RemoveZoneCommand(),
+            'select_zone': SelectZoneCommand(),
+            'zones': ShowZonesCommand(),
+            'resume': ResumeCommand(),
+            'enqueue': EnqueueCommand(),
+            'next': NextTrackCommand(),
+            'previous': PreviousTrackCommand(),
+            'seek': SeekCommand(),
+            'queue_show': ShowQueueCommand(),
             'remove_playlist': RemovePlaylistCommand(),
             'unpause': UnpauseCommand(),
             'set_equalizer': SetEqualizerCommand(),
             'save_memento': SaveMementoCommand(),
             'restore_memento': RestoreMementoCommand(),
+            'cache_stats': CacheStatsCommand(),
+            'stats': StatsCommand(),
+            'search': SearchCommand(),
+            'rescan_library': RescanLibraryCommand(),
+            'scan_status': ScanStatusCommand(),
+            'track_info': TrackInfoCommand(),
+            'show_duplicates': ShowDuplicatesCommand(),
         }
+        self.registry = CommandRegistry(self.commands)
+        help_command.registry = self.registry
+
+
 
+def _terminate(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise SystemExit(0)
+
+
+def _playback_lost():
+    print("Lost the connection to the playback process, shutting down.")
+    signal.pthread_kill(threading.main_thread().ident, signal.SIGTERM)
+
+
+def run_worker(address, authkey, host, port, mode, metrics_enabled, write_behind, counters, slot, ready):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate)
+    music_server = MusicServer(host, port, metrics_enabled=metrics_enabled, metrics_port=0, write_behind=write_behind,
+                               playback=PlaybackClient(address, authkey, _playback_lost),
+                               shared=SharedGeneration(counters, slot), worker=slot)
+    music_server.register_commands()
+    ready.release()
+    try:
+        music_server.serve(mode)
+    finally:
+        music_server.close()
 
 
-def main():
-    music_server = MusicServer()
+def main(mode='threaded', metrics_enabled=metrics_enabled, metrics_port=metrics_port, audio_backend=audio_backend,
+         started=None, write_behind=write_behind, workers=server_workers):
+    music_server = MusicServer(metrics_enabled=metrics_enabled, metrics_port=metrics_port,
+                               audio_backend=audio_backend, started=started, write_behind=write_behind,
+                               workers=workers)
     music_server.register_commands()
-    music_server.start()
\ No newline at end of file
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        music_server.start_workers(mode)
+        music_server.serve(mode)
+    finally:
+        music_server.close()
\ No newline at end of file
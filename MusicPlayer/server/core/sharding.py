@@ -0,0 +1,243 @@
+import functools
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from MusicPlayer.server.core.config import prefetch_depth
+from MusicPlayer.server.core.itrrator import restore_iterator
+from MusicPlayer.server.core.playback import DEFAULT_ZONE
+from MusicPlayer.server.core.zones import ZoneError
+
+SERVICE_HOST = '127.0.0.1'
+ENGINE_CALLS = frozenset(('play', 'resume', 'pause', 'unpause', 'stop', 'enqueue', 'next', 'previous', 'seek',
+                          'set_volume', 'set_repeat', 'warm', 'current_track', 'resume_point', 'position',
+                          'queued_tracks'))
+ENGINE_ATTRIBUTES = frozenset(('paused', 'repeat', 'volume'))
+ZONE_CALLS = frozenset(('create', 'remove', 'exists', 'names', 'engine_threads', 'prefetch_stats'))
+
+
+class PlaybackUnavailable(Exception):
+    pass
+
+
+class EventStream:
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def send(self, zone, data):
+        with self.lock:
+            self.connection.send((zone, data))
+
+
+class RemoteChannel:
+    def __init__(self, events, zone):
+        self.events = events
+        self.zone = zone
+
+    def sendall(self, data):
+        self.events.send(self.zone, data)
+
+
+class PlaybackService:
+    def __init__(self, zones, prefetch, db_manager, authkey=None):
+        self.zones = zones
+        self.prefetch = prefetch
+        self.db_manager = db_manager
+        self.authkey = authkey if authkey is not None else os.urandom(32)
+        self.listener = Listener((SERVICE_HOST, 0), authkey=self.authkey)
+        self.address = self.listener.address
+        self.lock = threading.Lock()
+        self.streams = {}
+
+    def start(self):
+        threading.Thread(target=self._accept, name='shard-service', daemon=True).start()
+
+    def close(self):
+        self.listener.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(connection,), name='shard-calls', daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            kind, worker = connection.recv()
+            if kind == 'events':
+                with self.lock:
+                    self.streams[worker] = EventStream(connection)
+                connection.send(True)
+                return
+            with self.lock:
+                events = self.streams[worker]
+            while True:
+                target, method, args = connection.recv()
+                try:
+                    reply = ('ok', self._dispatch(events, target, method, args))
+                except ZoneError as e:
+                    reply = ('zone', str(e))
+                except Exception as e:
+                    reply = ('error', f"{method} failed: {e}")
+                connection.send(reply)
+        except (EOFError, OSError, KeyError):
+            connection.close()
+
+    def _dispatch(self, events, target, method, args):
+        if target is None:
+            if method not in ZONE_CALLS:
+                raise ValueError(f"unknown call '{method}'")
+            return getattr(self, f'_{method}')(*args)
+        engine = self.zones.get(target)
+        if engine is None:
+            raise ZoneError(f"Zone '{target}' not found.")
+        if method in ENGINE_ATTRIBUTES:
+            return getattr(engine, method)
+        if method not in ENGINE_CALLS:
+            raise ValueError(f"unknown call '{method}'")
+        if method == 'play':
+            state, repeat = args
+            return engine.play(restore_iterator(self.db_manager, state), RemoteChannel(events, target), repeat)
+        if method == 'resume':
+            return engine.resume(RemoteChannel(events, target))
+        return getattr(engine, method)(*args)
+
+    def _create(self, name):
+        self.zones.create(name)
+
+    def _remove(self, name):
+        self.zones.remove(name)
+
+    def _exists(self, name):
+        return self.zones.get(name) is not None
+
+    def _names(self):
+        return [name for name, _ in self.zones.items()]
+
+    def _engine_threads(self):
+        return self.zones.engine_threads()
+
+    def _prefetch_stats(self):
+        return self.prefetch.stats()
+
+
+class PlaybackClient:
+    def __init__(self, address, authkey, on_lost=None):
+        self.address = address
+        self.authkey = authkey
+        self.on_lost = on_lost
+        self.local = threading.local()
+        self.channels = {}
+        self.closed = False
+        self.events = Client(address, authkey=authkey)
+        self.events.send(('events', os.getpid()))
+        self.events.recv()
+        threading.Thread(target=self._relay, name='shard-events', daemon=True).start()
+
+    def call(self, target, method, *args):
+        connection = getattr(self.local, 'connection', None)
+        try:
+            if connection is None:
+                connection = Client(self.address, authkey=self.authkey)
+                connection.send(('calls', os.getpid()))
+                self.local.connection = connection
+            connection.send((target, method, args))
+            status, value = connection.recv()
+        except (EOFError, OSError) as e:
+            self.local.connection = None
+            raise PlaybackUnavailable(f"The playback process is unavailable: {e}")
+        if status == 'zone':
+            raise ZoneError(value)
+        if status == 'error':
+            raise PlaybackUnavailable(value)
+        return value
+
+    def close(self):
+        self.closed = True
+        self.events.close()
+
+    def _relay(self):
+        while True:
+            try:
+                zone, data = self.events.recv()
+            except (EOFError, OSError):
+                break
+            channel = self.channels.get(zone)
+            if channel is not None:
+                channel.sendall(data)
+        if not self.closed and self.on_lost is not None:
+            self.on_lost()
+
+
+class RemotePrefetch:
+    def __init__(self, client, depth=prefetch_depth):
+        self.client = client
+        self.depth = depth
+
+    def stats(self):
+        return self.client.call(None, 'prefetch_stats')
+
+
+class RemoteEngine:
+    def __init__(self, client, zone, prefetch):
+        self.client = client
+        self.zone = zone
+        self.prefetch = prefetch
+
+    def __getattr__(self, name):
+        if name in ENGINE_ATTRIBUTES:
+            return self.client.call(self.zone, name)
+        if name not in ENGINE_CALLS:
+            raise AttributeError(name)
+        return functools.partial(self.client.call, self.zone, name)
+
+    def play(self, source, client_socket=None, repeat='off'):
+        self.client.channels[self.zone] = client_socket
+        self.client.call(self.zone, 'play', source.state(), repeat)
+
+    def resume(self, client_socket=None):
+        self.client.channels[self.zone] = client_socket
+        self.client.call(self.zone, 'resume')
+
+
+class RemoteZoneManager:
+    def __init__(self, client):
+        self.client = client
+        self.prefetch = RemotePrefetch(client)
+        self.lock = threading.Lock()
+        self.engines = {}
+        self.default = self._engine(DEFAULT_ZONE)
+
+    def _engine(self, name):
+        with self.lock:
+            engine = self.engines.get(name)
+            if engine is None:
+                engine = self.engines[name] = RemoteEngine(self.client, name, self.prefetch)
+            return engine
+
+    def create(self, name):
+        self.client.call(None, 'create', name)
+        return self._engine(name)
+
+    def remove(self, name):
+        self.client.call(None, 'remove', name)
+        with self.lock:
+            self.engines.pop(name, None)
+
+    def get(self, name):
+        return self._engine(name) if self.client.call(None, 'exists', name) else None
+
+    def items(self):
+        return [(name, self._engine(name)) for name in self.client.call(None, 'names')]
+
+    def engine_threads(self):
+        return self.client.call(None, 'engine_threads')
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,71 @@
+import threading
+
+from MusicPlayer.server.core.audio import create_zone_backend
+from MusicPlayer.server.core.config import audio_backend, max_zones
+from MusicPlayer.server.core.playback import DEFAULT_ZONE, PlaybackEngine
+
+ZONE_CLOSE_TIMEOUT = 5.0
+
+
+class ZoneError(Exception):
+    pass
+
+
+class ZoneManager:
+    def __init__(self, prefetch=None, backend=audio_backend, limit=max_zones, store=None):
+        self.prefetch = prefetch
+        self.store = store
+        self.backend = backend
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.zones = {}
+        self.channels = {}
+        self.default = self._start(DEFAULT_ZONE, None)
+
+    def _start(self, name, channel):
+        engine = PlaybackEngine(self.prefetch, create_zone_backend(self.backend, channel), name, self.store)
+        engine.start()
+        self.zones[name] = engine
+        self.channels[name] = channel
+        return engine
+
+    def create(self, name):
+        with self.lock:
+            if name in self.zones:
+                raise ZoneError(f"Zone '{name}' already exists.")
+            if len(self.zones) >= self.limit:
+                raise ZoneError(f"Cannot create more than {self.limit} zones.")
+            used = set(self.channels.values())
+            channel = next(index for index in range(self.limit) if index not in used)
+            return self._start(name, channel)
+
+    def remove(self, name):
+        with self.lock:
+            if name == DEFAULT_ZONE:
+                raise ZoneError(f"The '{DEFAULT_ZONE}' zone cannot be removed.")
+            engine = self.zones.pop(name, None)
+            if engine is None:
+                raise ZoneError(f"Zone '{name}' not found.")
+            del self.channels[name]
+        engine.close()
+        if self.prefetch is not None:
+            self.prefetch.forget(name)
+
+    def get(self, name):
+        with self.lock:
+            return self.zones.get(name)
+
+    def engine_threads(self):
+        with self.lock:
+            return sum(1 for engine in self.zones.values() if engine.is_alive())
+
+    def items(self):
+        with self.lock:
+            return sorted(self.zones.items(), key=lambda item: (item[0] != DEFAULT_ZONE, item[0]))
+
+    def close(self):
+        engines = [engine for _, engine in self.items()]
+        for engine in engines:
+            engine.close()
+        for engine in engines:
+            engine.join(ZONE_CLOSE_TIMEOUT)
@@ -1,4 +1,25 @@
+import time
+
+started = time.perf_counter()
+
+import argparse
+
+from MusicPlayer.server.core.audio import AUDIO_BACKENDS
+from MusicPlayer.server.core.config import metrics_port, audio_backend, write_behind, server_workers
 from MusicPlayer.server.core.server import main
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['threaded', 'async'], default='threaded')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port,
+                        help='serve Prometheus text metrics on this port; 0 (the default) disables the endpoint')
+    parser.add_argument('--no-metrics', action='store_true', help='disable all instrumentation')
+    parser.add_argument('--audio', choices=sorted(AUDIO_BACKENDS), default=audio_backend,
+                        help="audio output, 'null' for headless control-plane nodes")
+    parser.add_argument('--write-behind', action='store_true', default=write_behind,
+                        help='group-commit playlist edits in the background; add --sync to a command to wait for disk')
+    parser.add_argument('--workers', type=int, default=server_workers,
+                        help='processes accepting on the port; playback stays in the first one')
+    args = parser.parse_args()
+    main(args.mode, metrics_enabled=not args.no_metrics, metrics_port=args.metrics_port, audio_backend=args.audio,
+         started=started, write_behind=args.write_behind, workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,72 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import NullSocket, emit_results
+from MusicPlayer.server.core.database import DatabaseManager
+
+SINGLE_INSERTS = 1000
+SEARCHES = 100
+
+
+def generate_rows(count, prefix='track'):
+    return ((f'{prefix} {index}', f'/music/{prefix}_{index}.mp3') for index in range(count))
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def bench_size(db_manager, size):
+    client_socket = NullSocket()
+    playlist = f'bench {size}'
+    results = []
+
+    seconds = timed(db_manager.bulk_add_tracks, playlist, generate_rows(size))
+    results.append({'name': 'bulk_add', 'size': size, 'seconds': seconds, 'ops_per_sec': size / seconds})
+
+    playlist_id = db_manager.show_tracks_for_playlist(playlist)[0]
+    seconds = timed(db_manager.get_tracks_for_playlist, playlist_id)
+    results.append({'name': 'get_tracks', 'size': size, 'seconds': seconds, 'ops_per_sec': size / seconds})
+
+    def search_tracks():
+        for index in range(SEARCHES):
+            db_manager.search_tracks(str(size * index // SEARCHES), 0, 20)
+
+    seconds = timed(search_tracks)
+    results.append({'name': 'search', 'size': size, 'seconds': seconds, 'ops_per_sec': SEARCHES / seconds})
+
+    def insert_tracks():
+        for title, path in generate_rows(SINGLE_INSERTS, prefix='single'):
+            db_manager.add_track_to_playlist(playlist, title, path, client_socket)
+
+    seconds = timed(insert_tracks)
+    results.append({'name': 'insert', 'size': size, 'seconds': seconds, 'ops_per_sec': SINGLE_INSERTS / seconds})
+
+    seconds = timed(db_manager.shuffle_playlist, playlist, client_socket, 1)
+    results.append({'name': 'shuffle', 'size': size, 'seconds': seconds, 'ops_per_sec': 1 / seconds})
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help='comma separated playlist sizes to benchmark')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(size) for size in args.sizes.split(',')):
+            db_manager = DatabaseManager(os.path.join(directory, f'bench_{size}.db'))
+            results.extend(bench_size(db_manager, size))
+            db_manager.close()
+    emit_results('database', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
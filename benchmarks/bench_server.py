@@ -0,0 +1,66 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+from benchmarks.common import emit_results, setup_headless_audio
+from benchmarks.loadgen import run_load
+
+
+def serve(mode, directory, port_pipe, write_behind=False, workers=1):
+    setup_headless_audio()
+    os.chdir(directory)
+    from MusicPlayer.server.core.server import MusicServer
+
+    music_server = MusicServer(port=0, metrics_enabled=False, write_behind=write_behind, workers=workers)
+    music_server.register_commands()
+    music_server.start_workers(mode)
+    port_pipe.send(music_server.port)
+    music_server.serve(mode)
+
+
+def bench_mode(mode, args):
+    with tempfile.TemporaryDirectory() as directory:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        server = multiprocessing.Process(target=serve, args=(mode, directory, sender, args.write_behind, args.workers))
+        server.start()
+        try:
+            port = receiver.recv()
+            results = []
+            for clients in args.clients:
+                result = run_load('127.0.0.1', port, clients, args.duration, args.depth, args.write_ratio,
+                                  playlist=f'load{clients}')
+                result['mode'] = mode
+                result['write_behind'] = args.write_behind
+                result['workers'] = args.workers
+                results.append(result)
+            return results
+        finally:
+            server.terminate()
+            server.join(5)
+            if server.is_alive():
+                server.kill()
+                server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', default='threaded,async')
+    parser.add_argument('--clients', default='1,16,64', help='comma separated client counts')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--depth', type=int, default=1, help='requests each client keeps in flight')
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--write-behind', action='store_true', help='group-commit playlist edits on the server')
+    parser.add_argument('--workers', type=int, default=1, help='server processes accepting on the port')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+    args.clients = [int(clients) for clients in args.clients.split(',')]
+
+    results = []
+    for mode in args.modes.split(','):
+        results.extend(bench_mode(mode, args))
+    emit_results('server', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
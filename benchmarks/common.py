@@ -0,0 +1,68 @@
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from unittest import mock
+
+
+class NullSocket:
+    def sendall(self, data):
+        pass
+
+
+def setup_headless_audio():
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    try:
+        import pygame
+    except ImportError:
+        pygame = mock.MagicMock(name='pygame')
+        pygame.error = type('error', (RuntimeError,), {})
+        pygame.USEREVENT = 32866
+        pygame.event.get.return_value = []
+        pygame.mixer.music.get_busy.return_value = False
+        sys.modules['pygame'] = pygame
+    return pygame
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def emit_results(benchmark, results, output=None):
+    for result in results:
+        params = ', '.join(f"{key}={value}" for key, value in result.items()
+                           if key not in ('name', 'seconds', 'ops_per_sec'))
+        print(f"{result['name']:<24} {params:<32} {result['seconds']:10.4f}s {result['ops_per_sec']:14.1f} ops/s",
+              file=sys.stderr)
+
+    document = {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'results': results,
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as result_file:
+            json.dump(document, result_file, indent=2)
+    else:
+        print(json.dumps(document, indent=2))
+    return document
@@ -0,0 +1,37 @@
+import argparse
+import json
+
+IGNORED_KEYS = ('seconds', 'ops_per_sec', 'requests', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def result_key(result):
+    return tuple(sorted((key, value) for key, value in result.items() if key not in IGNORED_KEYS))
+
+
+def load(path):
+    with open(path, encoding='utf-8') as result_file:
+        document = json.load(result_file)
+    return document, {result_key(result): result for result in document['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args()
+
+    baseline_document, baseline = load(args.baseline)
+    candidate_document, candidate = load(args.candidate)
+    print(f"{baseline_document.get('commit')} -> {candidate_document.get('commit')}")
+    for key, result in candidate.items():
+        label = ', '.join(f"{name}={value}" for name, value in key)
+        before = baseline.get(key)
+        if before is None:
+            print(f"{label:<64} {result['ops_per_sec']:14.1f} ops/s (new)")
+            continue
+        ratio = result['ops_per_sec'] / before['ops_per_sec'] if before['ops_per_sec'] else float('inf')
+        print(f"{label:<64} {before['ops_per_sec']:14.1f} -> {result['ops_per_sec']:14.1f} ops/s ({ratio:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.common import NullSocket, emit_results
+from MusicPlayer.server.core.database import DatabaseManager
+
+
+class UnpooledDatabaseManager(DatabaseManager):
+    def connect(self):
+        return sqlite3.connect(self.db_name)
+
+
+def run_clients(db_manager, clients, duration, tracks):
+    playlist_id = db_manager.create_playlist('bench', NullSocket())
+    for index in range(tracks):
+        db_manager.add_track_to_playlist('bench', f'seed {index}', f'/music/seed_{index}.mp3', NullSocket())
+
+    counts = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(number):
+        client_socket = NullSocket()
+        done = 0
+        while time.perf_counter() < deadline:
+            if done % 10 == 0:
+                db_manager.add_track_to_playlist('bench', f'track {number}-{done}', '/music/track.mp3', client_socket)
+            elif done % 2:
+                db_manager.get_tracks_for_playlist(playlist_id)
+            else:
+                db_manager.get_playlists()
+            done += 1
+        counts[number] = done
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--tracks', type=int, default=200)
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for label, manager_class in (('unpooled', UnpooledDatabaseManager), ('pooled', DatabaseManager)):
+            db_manager = manager_class(os.path.join(directory, f'{label}.db'))
+            started = time.perf_counter()
+            commands_per_second = run_clients(db_manager, args.clients, args.duration, args.tracks)
+            results.append({'name': 'db_connections', 'connections': label, 'clients': args.clients,
+                            'seconds': time.perf_counter() - started, 'ops_per_sec': commands_per_second})
+    emit_results('db_connections', results, args.output)
+
+if __name__ == '__main__':
+    main()
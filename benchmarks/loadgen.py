@@ -0,0 +1,111 @@
+import argparse
+import itertools
+import threading
+import time
+
+from benchmarks.common import emit_results, percentile
+from MusicPlayer.client.client import MusicClient
+
+READ_COMMANDS = ('show_playlists', 'show_tracks_for_playlist {playlist}', 'show_tracks_with_order {playlist}')
+
+
+def command_mix(client_number, playlist, write_ratio):
+    writes = int(write_ratio * 100)
+    for index in itertools.count():
+        if index % 100 < writes:
+            yield f'add_track_to_playlist {playlist} load-{client_number}-{index} /music/load_{index}.mp3'
+        else:
+            yield READ_COMMANDS[index % len(READ_COMMANDS)].format(playlist=playlist)
+
+
+def prepare_playlist(client, playlist):
+    client.request(f'add_playlist {playlist}')
+    for line in client.request('show_playlists').splitlines():
+        playlist_id, _, name = line.strip().partition('. ')
+        if name == playlist:
+            client.request(f'select_playlist {playlist_id}')
+            return playlist_id
+    raise RuntimeError(f"Playlist '{playlist}' was not created.")
+
+
+def run_client(host, port, playlist_id, commands, duration, depth, latencies, failures):
+    with MusicClient(host, port) as client:
+        client.request(f'select_playlist {playlist_id}')
+        sent = {}
+        writes = set()
+        deadline = time.perf_counter() + duration
+        while sent or time.perf_counter() < deadline:
+            while len(sent) < depth and time.perf_counter() < deadline:
+                command = next(commands)
+                request_id = client.send(command)
+                sent[request_id] = time.perf_counter()
+                if command.startswith('add_track_to_playlist'):
+                    writes.add(request_id)
+            if not sent:
+                break
+            request_id = client.receive()
+            if request_id in sent and request_id in client.finished:
+                latencies.append(time.perf_counter() - sent.pop(request_id))
+                reply = client.collect(request_id)
+                if request_id in writes:
+                    writes.discard(request_id)
+                    if 'added' not in reply:
+                        failures.append(reply)
+
+
+def run_load(host, port, clients, duration, depth, write_ratio, playlist='load'):
+    with MusicClient(host, port) as client:
+        playlist_id = prepare_playlist(client, playlist)
+        replies = client.pipeline([f'add_track_to_playlist {playlist} seed-{index} /music/seed_{index}.mp3'
+                                   for index in range(100)])
+        if not all('added' in reply for reply in replies):
+            raise RuntimeError(f"Seeding the playlist '{playlist}' failed.")
+
+    latencies = [[] for _ in range(clients)]
+    failures = []
+    threads = [threading.Thread(target=run_client, args=(host, port, playlist_id,
+                                                         command_mix(number, playlist, write_ratio),
+                                                         duration, depth, latencies[number], failures))
+               for number in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if failures:
+        raise RuntimeError(f"{len(failures)} writes were not applied, e.g. {failures[0]!r}")
+
+    merged = [latency for client_latencies in latencies for latency in client_latencies]
+    return {
+        'name': 'load',
+        'clients': clients,
+        'depth': depth,
+        'write_ratio': write_ratio,
+        'requests': len(merged),
+        'seconds': elapsed,
+        'ops_per_sec': len(merged) / elapsed,
+        'p50_ms': percentile(merged, 0.5) * 1000,
+        'p95_ms': percentile(merged, 0.95) * 1000,
+        'p99_ms': percentile(merged, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--depth', type=int, default=1, help='requests each client keeps in flight')
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    result = run_load(args.host, args.port, args.clients, args.duration, args.depth, args.write_ratio)
+    emit_results('loadgen', [result], args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+
+from MusicPlayer.server.core.server import MusicServer
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.messages = []
+
+    def sendall(self, data):
+        self.messages.append(data.decode('utf-8'))
+
+
+class ServerFixture:
+    def __init__(self, mode='threaded', **options):
+        self.mode = mode
+        self.directory = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        self.server = MusicServer(port=0, metrics_enabled=False, metrics_port=0, audio_backend='null', **options)
+        self.server.register_commands()
+        self.port = self.server.port
+        self.loop = None
+        self.task = None
+        if mode == 'async':
+            self.loop = asyncio.new_event_loop()
+            self.task = self.loop.create_task(self.server.serve_async())
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        if self.task is not None:
+            try:
+                self.loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+            return
+        while True:
+            try:
+                client_socket, _ = self.server.server_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.server.handle_client, args=(client_socket,), daemon=True).start()
+
+    def close(self):
+        if self.task is not None:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        else:
+            try:
+                self.server.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.thread.join(5)
+        self.server.close()
+        os.chdir(self.cwd)
+        self.directory.cleanup()
@@ -0,0 +1,45 @@
+import unittest
+from types import SimpleNamespace
+
+from MusicPlayer.server.core.audio import PygameBackend
+
+
+class FakeMusic:
+    def __init__(self, positions):
+        self.positions = list(positions)
+
+    def get_pos(self):
+        return self.positions.pop(0)
+
+
+class PolledEndTest(unittest.TestCase):
+    def backend(self, *positions):
+        backend = PygameBackend()
+        backend.pygame = SimpleNamespace(mixer=SimpleNamespace(music=FakeMusic(positions)))
+        backend.clear_end_events()
+        return backend
+
+    def ends(self, backend, count):
+        return [backend.pop_end_event() for _ in range(count)]
+
+    def test_queued_track_starting_is_an_end(self):
+        backend = self.backend(0, 200, 450, 30, 80)
+        self.assertEqual(self.ends(backend, 4), [False, False, True, False])
+
+    def test_finishing_is_a_single_end(self):
+        backend = self.backend(0, 300, -1, -1)
+        self.assertEqual(self.ends(backend, 3), [False, True, False])
+
+    def test_paused_position_is_not_an_end(self):
+        backend = self.backend(0, 300, 300, 300)
+        self.assertEqual(self.ends(backend, 3), [False, False, False])
+
+    def test_clear_after_seek_resets_the_position(self):
+        backend = self.backend(0, 400, 10, 60)
+        self.ends(backend, 1)
+        backend.clear_end_events()
+        self.assertEqual(self.ends(backend, 1), [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import threading
+import unittest
+
+from MusicPlayer.server.core.cache import CachedDatabaseManager, SharedGeneration, _tracks_size
+
+
+class FakeDatabase:
+    def __init__(self, tracks, barrier=None):
+        self.tracks = tracks
+        self.barrier = barrier
+        self.loads = 0
+        self.path_lookups = 0
+
+    def add_commit_listener(self, listener):
+        pass
+
+    def get_playlists(self):
+        return [(playlist_id, f'list{playlist_id}') for playlist_id in self.tracks]
+
+    def get_tracks_for_playlist(self, playlist_id):
+        self.loads += 1
+        if self.barrier is not None:
+            self.barrier.wait()
+        return list(self.tracks[playlist_id])
+
+    def get_track_path(self, playlist_name, track_title):
+        self.path_lookups += 1
+        playlist_id = int(playlist_name[len('list'):])
+        return dict(self.tracks[playlist_id]).get(track_title)
+
+    def iter_tracks_for_playlist(self, playlist_id, offset=0, limit=None, chunk_size=2):
+        self.loads += 1
+        tracks = self.tracks[playlist_id][offset:None if limit is None else offset + limit]
+        for start in range(0, len(tracks), chunk_size):
+            yield tracks[start:start + chunk_size]
+
+
+class CachedDatabaseManagerTest(unittest.TestCase):
+    def test_racing_misses_account_memory_once(self):
+        tracks = {1: [('song', '/music/song.mp3')]}
+        cache = CachedDatabaseManager(FakeDatabase(tracks, threading.Barrier(2)))
+        threads = [threading.Thread(target=cache.get_tracks_for_playlist, args=(1,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats()['memory_used'], _tracks_size(tuple(tracks[1])))
+        self.assertEqual(cache.stats()['playlists_cached'], 1)
+
+    def test_eviction_keeps_memory_within_budget(self):
+        tracks = {playlist_id: [(f'song{index}', f'/music/{playlist_id}/{index}.mp3') for index in range(50)]
+                  for playlist_id in range(1, 5)}
+        size = _tracks_size(tuple(tracks[1]))
+        cache = CachedDatabaseManager(FakeDatabase(tracks), memory_budget=size * 2 + size // 2)
+        for playlist_id in tracks:
+            cache.get_tracks_for_playlist(playlist_id)
+        stats = cache.stats()
+        self.assertEqual(stats['playlists_cached'], 2)
+        self.assertLessEqual(stats['memory_used'], stats['memory_budget'])
+
+    def test_listing_warms_the_cache(self):
+        tracks = {1: [(f'song{index}', f'/music/{index}.mp3') for index in range(5)]}
+        database = FakeDatabase(tracks)
+        cache = CachedDatabaseManager(database)
+        for _ in range(2):
+            rows = [row for chunk in cache.iter_tracks_for_playlist(1, chunk_size=2) for row in chunk]
+            self.assertEqual(rows, tracks[1])
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['playlists_cached']), (1, 1, 1))
+        self.assertEqual(database.loads, 1)
+
+    def test_paged_listing_warms_the_cache(self):
+        tracks = {1: [(f'song{index}', f'/music/{index}.mp3') for index in range(5)]}
+        cache = CachedDatabaseManager(FakeDatabase(tracks))
+        rows = [row for chunk in cache.iter_tracks_for_playlist(1, 0, 3, chunk_size=2) for row in chunk]
+        self.assertEqual(rows, tracks[1][:3])
+        self.assertEqual(list(cache.get_tracks_for_playlist(1)), tracks[1])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_listing_over_budget_is_not_cached(self):
+        tracks = {1: [(f'song{index}', f'/music/{index}.mp3') for index in range(50)]}
+        cache = CachedDatabaseManager(FakeDatabase(tracks), memory_budget=_tracks_size(tuple(tracks[1][:10])))
+        rows = [row for chunk in cache.iter_tracks_for_playlist(1, chunk_size=4) for row in chunk]
+        self.assertEqual(rows, tracks[1])
+        self.assertEqual(cache.stats()['playlists_cached'], 0)
+        self.assertEqual(cache.stats()['memory_used'], 0)
+
+    def test_writes_do_not_touch_the_counters(self):
+        database = FakeDatabase({1: [('song', '/music/song.mp3')]})
+        cache = CachedDatabaseManager(database)
+        cache.invalidate('list1')
+        cache.invalidate('list2')
+        cache.get_playlists()
+        cache.invalidate('list1')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (0, 1))
+
+    def test_unknown_playlist_name_drops_everything(self):
+        cache = CachedDatabaseManager(FakeDatabase({1: [('song', '/music/song.mp3')]}))
+        cache.get_playlists()
+        cache.get_tracks_for_playlist(1)
+        cache.invalidate('newlist')
+        self.assertEqual(cache.stats()['playlists_cached'], 0)
+        self.assertIsNone(cache.playlists)
+
+    def test_track_path_uses_the_database_unless_cached(self):
+        database = FakeDatabase({1: [('song', '/music/song.mp3')]})
+        cache = CachedDatabaseManager(database)
+        self.assertEqual(cache.get_track_path('list1', 'song'), '/music/song.mp3')
+        self.assertEqual((database.path_lookups, database.loads), (1, 0))
+        cache.get_playlists()
+        cache.get_tracks_for_playlist(1)
+        self.assertEqual(cache.get_track_path('list1', 'song'), '/music/song.mp3')
+        self.assertIsNone(cache.get_track_path('list1', 'other'))
+        self.assertEqual((database.path_lookups, database.loads), (1, 1))
+
+    def test_invalidation_by_another_process(self):
+        counters = [0, 0]
+        database = FakeDatabase({1: [('song', '/music/song.mp3')]})
+        cache = CachedDatabaseManager(database, shared=SharedGeneration(counters, 0))
+        cache.get_tracks_for_playlist(1)
+        cache.get_tracks_for_playlist(1)
+        self.assertEqual(database.loads, 1)
+        counters[1] += 1
+        cache.get_tracks_for_playlist(1)
+        self.assertEqual(database.loads, 2)
+
+    def test_local_invalidation_is_published(self):
+        counters = [0, 0]
+        cache = CachedDatabaseManager(FakeDatabase({1: []}), shared=SharedGeneration(counters, 1))
+        cache.invalidate_playlist_id(1)
+        self.assertEqual(counters, [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
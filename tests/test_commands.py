@@ -0,0 +1,209 @@
+import unittest
+
+from MusicPlayer.client.client import MusicClient
+from MusicPlayer.server.core.commands import CommandError, CommandRegistry, CommandSignature, Flag, Integer, \
+    MementoHistory, Number, Option, Position, SeekCommand, SetEqualizerCommand, ShowTracksForPlaylistCommand, SearchCommand, \
+    AddTrackToPlaylistCommand, AddPlaylistCommand, MoveTrackCommand, RemoveTrackFromPlaylistCommand, \
+    parse_position, tokenize
+from helpers import ServerFixture
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_plain_words(self):
+        self.assertEqual(tokenize('play_track rock  song '), ['play_track', 'rock', 'song'])
+
+    def test_quoted_arguments(self):
+        self.assertEqual(tokenize('add_track_to_playlist rock "My Song" \'/music/My Song.mp3\''),
+                         ['add_track_to_playlist', 'rock', 'My Song', '/music/My Song.mp3'])
+
+    def test_escaped_quotes_and_backslashes(self):
+        self.assertEqual(tokenize(r'add_playlist "say \"hi\" \\ bye"'), ['add_playlist', r'say "hi" \ bye'])
+
+    def test_other_backslashes_are_kept(self):
+        self.assertEqual(tokenize(r'import_tracks rock "C:\music\new"'), ['import_tracks', 'rock', r'C:\music\new'])
+
+    def test_unterminated_quote(self):
+        with self.assertRaises(CommandError) as raised:
+            tokenize('add_playlist "rock')
+        self.assertEqual(raised.exception.code, 'syntax_error')
+
+
+class ParsePositionTest(unittest.TestCase):
+    def test_valid_positions(self):
+        self.assertEqual(parse_position('42'), 42.0)
+        self.assertEqual(parse_position('1:30'), 90.0)
+        self.assertEqual(parse_position('0:59.5'), 59.5)
+        self.assertEqual(parse_position('1:02:03'), 3723.0)
+
+    def test_invalid_positions(self):
+        for text in ('nan', 'inf', '-5', '1e400', '1:-30', '1:60', '1:60:00', '-1:30', '1:', ':30', 'a:10',
+                     '1.5:30', '1:2:3:4', '0:nan'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                parse_position(text)
+
+
+class ArgumentTest(unittest.TestCase):
+    def test_number_rejects_non_finite_values(self):
+        for token in ('nan', 'inf', '-inf', '1e400', 'loud'):
+            with self.subTest(token=token), self.assertRaises(ValueError):
+                Number('level').convert(token)
+
+    def test_number_bounds(self):
+        level = Number('level', minimum=0.0, maximum=1.0)
+        self.assertEqual(level.convert('0.5'), 0.5)
+        for token in ('-0.1', '1.5', '1e9'):
+            with self.subTest(token=token), self.assertRaises(ValueError):
+                level.convert(token)
+
+    def test_integer_minimum(self):
+        self.assertEqual(Integer('count', minimum=1).convert('3'), 3)
+        with self.assertRaises(ValueError):
+            Integer('count', minimum=1).convert('0')
+        with self.assertRaises(ValueError):
+            Integer('count').convert('1.5')
+
+    def test_position(self):
+        self.assertEqual(Position('position').convert('2:00'), 120.0)
+        with self.assertRaises(ValueError):
+            Position('position').convert('nan')
+
+
+class SignatureTest(unittest.TestCase):
+    def parse(self, command, tokens):
+        return CommandSignature('test', command.arguments).parse(tokens)
+
+    def error(self, command, tokens):
+        with self.assertRaises(CommandError) as raised:
+            self.parse(command, tokens)
+        return raised.exception
+
+    def test_defaults_and_flags(self):
+        command = ShowTracksForPlaylistCommand
+        self.assertEqual(self.parse(command, ['rock']), ['rock', 0, None, False])
+        self.assertEqual(self.parse(command, ['rock', '10', '5', 'total']), ['rock', 10, 5, True])
+        self.assertEqual(self.parse(command, ['rock', 'total']), ['rock', 0, None, True])
+
+    def test_flag_name_as_required_argument(self):
+        command = ShowTracksForPlaylistCommand
+        self.assertEqual(self.parse(command, ['total']), ['total', 0, None, False])
+        self.assertEqual(self.parse(command, ['total', 'total']), ['total', 0, None, True])
+
+    def test_options_and_rest(self):
+        self.assertEqual(self.parse(SearchCommand, ['blue', 'sky', 'limit=5']), ['blue sky', 0, 5])
+        self.assertEqual(self.parse(SearchCommand, ['offset=20']), ['offset=20', 0, 20])
+        self.assertEqual(self.parse(AddPlaylistCommand, ['road', 'trip']), ['road trip'])
+
+    def test_missing_and_unexpected_arguments(self):
+        error = self.error(AddTrackToPlaylistCommand, ['rock', 'song'])
+        self.assertEqual(error.code, 'missing_argument')
+        self.assertIn('track_path', error.message)
+        self.assertEqual(self.error(SeekCommand, ['1:00', '2:00']).code, 'unexpected_argument')
+
+    def test_invalid_values(self):
+        for command, tokens in ((SeekCommand, ['nan']), (SeekCommand, ['1:-30']), (SetEqualizerCommand, ['nan']),
+                                (SetEqualizerCommand, ['1e9']), (ShowTracksForPlaylistCommand, ['rock', '-1'])):
+            with self.subTest(tokens=tokens):
+                error = self.error(command, tokens)
+                self.assertEqual(error.code, 'invalid_argument')
+                self.assertIn('Usage:', error.reply())
+
+    def test_move_track_position_starts_at_one(self):
+        self.assertEqual(self.parse(MoveTrackCommand, ['rock', 'song', '1']), ['rock', 'song', 1])
+        for position in ('0', '-5'):
+            with self.subTest(position=position):
+                self.assertEqual(self.error(MoveTrackCommand, ['rock', 'song', position]).code, 'invalid_argument')
+
+    def test_option_values_are_converted(self):
+        signature = CommandSignature('test', (Option('limit', Integer('limit', default=3, minimum=1)), Flag('all')))
+        self.assertEqual(signature.parse(['limit=7', 'all']), [7, True])
+        with self.assertRaises(CommandError):
+            signature.parse(['limit=0'])
+
+
+class RegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = CommandRegistry({'seek': SeekCommand(), 'add_playlist': AddPlaylistCommand(),
+                                         'add_track_to_playlist': AddTrackToPlaylistCommand(),
+                                         'remove_track_from_playlist': RemoveTrackFromPlaylistCommand()})
+
+    def test_parse(self):
+        name, command, values, durable = self.registry.parse('SEEK 1:30')
+        self.assertEqual((name, values, durable), ('seek', [90.0], False))
+        self.assertIsInstance(command, SeekCommand)
+
+    def test_sync_flag(self):
+        self.assertEqual(self.registry.parse('add_playlist rock --sync')[2:], (['rock'], True))
+        self.assertEqual(self.registry.parse('add_playlist --sync rock')[2:], (['rock'], True))
+
+    def test_quoted_sync_is_an_argument(self):
+        self.assertEqual(self.registry.parse('add_track_to_playlist rock "--sync" /music/sync.mp3')[2:],
+                         (['rock', '--sync', '/music/sync.mp3'], False))
+        self.assertEqual(self.registry.parse("remove_track_from_playlist rock '--sync' --sync")[2:],
+                         (['rock', '--sync'], True))
+
+    def test_unknown_and_empty_commands(self):
+        for line, code in (('dance', 'unknown_command'), ('   ', 'syntax_error')):
+            with self.subTest(line=line), self.assertRaises(CommandError) as raised:
+                self.registry.parse(line)
+            self.assertEqual(raised.exception.code, code)
+
+    def test_usage(self):
+        self.assertEqual(self.registry.usage('seek'), 'seek <position>')
+
+
+class MementoHistoryTest(unittest.TestCase):
+    def tracks(self, count, prefix='song'):
+        return [(f'{prefix}{index}', f'/music/{prefix}{index}.mp3') for index in range(count)]
+
+    def test_history_is_bounded(self):
+        history = MementoHistory(depth=3)
+        for playlist_id in range(1, 6):
+            history.save(playlist_id, self.tracks(2))
+        self.assertEqual(len(history), 3)
+        self.assertEqual([history.pop().playlist_id for _ in range(3)], [5, 4, 3])
+        self.assertIsNone(history.pop())
+
+    def test_snapshots_share_rows(self):
+        history = MementoHistory()
+        tracks = self.tracks(100)
+        first = history.save(1, tracks)
+        second = history.save(1, tracks)
+        third = history.save(1, tracks + [('new', '/music/new.mp3')])
+        self.assertIs(first.track_refs, second.track_refs)
+        self.assertEqual(len(history.rows), 101)
+        self.assertEqual(history.tracks(first), tracks)
+        self.assertEqual(history.tracks(third)[-1], ('new', '/music/new.mp3'))
+
+    def test_evicted_rows_are_compacted(self):
+        history = MementoHistory(depth=2)
+        for generation in range(20):
+            history.save(1, self.tracks(50, prefix=f'gen{generation}-'))
+        self.assertLessEqual(len(history.rows), 4 * 50)
+        self.assertEqual(history.tracks(history.pop()), self.tracks(50, prefix='gen19-'))
+        self.assertEqual(history.tracks(history.pop()), self.tracks(50, prefix='gen18-'))
+
+
+class MementoCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.fixture = ServerFixture()
+        self.client = MusicClient('127.0.0.1', self.fixture.port)
+
+    def tearDown(self):
+        self.client.close()
+        self.fixture.close()
+
+    def test_restore_undoes_edits(self):
+        self.client.pipeline(['add_playlist rock', 'select_playlist 1', 'add_track_to_playlist rock a /music/a.mp3',
+                              'add_track_to_playlist rock b /music/b.mp3'])
+        self.assertIn('Memento saved', self.client.request('save_memento'))
+        self.client.pipeline(['remove_track_from_playlist rock a', 'add_track_to_playlist rock c /music/c.mp3'])
+        self.assertIn('restored', self.client.request('restore_memento'))
+        listing = self.client.request('show_tracks_for_playlist rock')
+        self.assertIn('/music/a.mp3', listing)
+        self.assertIn('/music/b.mp3', listing)
+        self.assertNotIn('/music/c.mp3', listing)
+        self.assertIn('No mementos', self.client.request('restore_memento'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from MusicPlayer.server.core.database import POSITION_GAP, SCHEMA_MIGRATIONS, DatabaseManager
+from MusicPlayer.server.core.importer import iter_csv
+from helpers import RecordingSocket
+
+
+class DatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.directory.name, 'music.db'))
+
+    def tearDown(self):
+        self.db_manager.shutdown()
+        self.db_manager.close()
+        self.directory.cleanup()
+
+    def playlist_names(self):
+        return [name for _, name in self.db_manager.get_playlists()]
+
+
+class BulkImportTest(DatabaseTest):
+    def manifest(self, data):
+        path = os.path.join(self.directory.name, 'tracks.csv')
+        with open(path, 'wb') as manifest:
+            manifest.write(data)
+        return path
+
+    def test_import(self):
+        path = self.manifest(b'title,path\nsong1,/music/1.mp3\nsong2,/music/2.mp3\n')
+        self.assertEqual(self.db_manager.bulk_add_tracks('rock', iter_csv(path)), (2, 2))
+        self.assertEqual(self.playlist_names(), ['rock'])
+
+    def test_missing_source_creates_no_playlist(self):
+        with self.assertRaises(OSError):
+            self.db_manager.bulk_add_tracks('rock', iter_csv(os.path.join(self.directory.name, 'missing.csv')))
+        self.assertEqual(self.playlist_names(), [])
+
+    def test_failed_import_removes_the_playlist_it_created(self):
+        path = self.manifest(b'song1,/music/1.mp3\nsong2,/music/2.mp3\n' + b'x' * 10000 + b'\xff\n')
+        with self.assertRaises(ValueError):
+            self.db_manager.bulk_add_tracks('rock', iter_csv(path), chunk_size=1)
+        self.assertEqual(self.playlist_names(), [])
+        self.assertEqual(self.db_manager.connect().execute("SELECT COUNT(*) FROM tracks").fetchone()[0], 0)
+
+    def test_failed_import_keeps_an_existing_playlist(self):
+        self.db_manager.bulk_add_tracks('rock', [('old', '/music/old.mp3')])
+        path = self.manifest(b'song1,/music/1.mp3\n' + b'x' * 10000 + b'\xff\n')
+        with self.assertRaises(ValueError):
+            self.db_manager.bulk_add_tracks('rock', iter_csv(path), chunk_size=1)
+        self.assertEqual(self.playlist_names(), ['rock'])
+
+
+class MoveTrackTest(DatabaseTest):
+    def setUp(self):
+        super().setUp()
+        self.titles = [f'song{index}' for index in range(8)]
+        self.db_manager.bulk_add_tracks('rock', [(title, f'/music/{title}.mp3') for title in self.titles])
+        self.renumbered = 0
+        renumber = self.db_manager._renumber_positions
+
+        def count_renumber(cursor, playlist_id):
+            self.renumbered += 1
+            renumber(cursor, playlist_id)
+        self.db_manager._renumber_positions = count_renumber
+
+    def order(self):
+        return [title for title, in self.db_manager.connect().execute(
+            "SELECT title FROM tracks ORDER BY position")]
+
+    def positions(self):
+        return [position for position, in self.db_manager.connect().execute(
+            "SELECT position FROM tracks ORDER BY position")]
+
+    def move(self, title, index):
+        self.assertTrue(self.db_manager.move_track('rock', title, index, None))
+        self.titles.remove(title)
+        self.titles.insert(index - 1, title)
+        self.assertEqual(self.order(), self.titles)
+
+    def test_move_into_a_gap_touches_one_row(self):
+        self.move('song7', 2)
+        self.move('song0', 8)
+        self.move('song3', 1)
+        self.assertEqual(self.renumbered, 0)
+        self.assertEqual(self.positions()[1], POSITION_GAP * 3 // 2)
+
+    def test_exhausted_gap_renumbers_the_playlist(self):
+        for _ in range(POSITION_GAP.bit_length()):
+            self.move(self.titles[-1], 2)
+        self.assertEqual(self.renumbered, 1)
+        self.assertEqual(len(set(self.positions())), len(self.titles))
+
+    def test_random_moves_keep_the_order(self):
+        generator = random.Random(6)
+        for _ in range(200):
+            self.move(generator.choice(self.titles), generator.randint(1, len(self.titles) + 2))
+
+    def test_unknown_track(self):
+        socket = RecordingSocket()
+        self.assertFalse(self.db_manager.move_track('rock', 'missing', 1, socket))
+        self.assertIn('not found', socket.messages[0])
+
+
+class ConnectionTest(DatabaseTest):
+    def test_connection_pragmas(self):
+        connection = self.db_manager.connect()
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(connection.execute("PRAGMA synchronous").fetchone()[0], 1)
+        self.assertEqual(connection.execute("PRAGMA temp_store").fetchone()[0], 2)
+
+    def test_connection_is_reused_per_thread(self):
+        self.assertIs(self.db_manager.connect(), self.db_manager.connect())
+        connections = []
+
+        def connect():
+            connections.append(self.db_manager.connect())
+            self.db_manager.close()
+        thread = threading.Thread(target=connect)
+        thread.start()
+        thread.join()
+        self.assertIsNot(connections[0], self.db_manager.connect())
+
+    def test_close_opens_a_new_connection(self):
+        connection = self.db_manager.connect()
+        self.db_manager.close()
+        self.assertIsNot(self.db_manager.connect(), connection)
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'music.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_dense_positions_are_spread_to_the_gap(self):
+        connection = sqlite3.connect(self.path)
+        for statement in SCHEMA_MIGRATIONS[0]:
+            connection.execute(statement)
+        connection.executemany("INSERT INTO playlists (id, name) VALUES (?, ?)", [(1, 'dense'), (2, 'duplicates')])
+        connection.executemany("INSERT INTO tracks (playlist_id, title, path, position) VALUES (?, ?, ?, ?)", [
+            (1, 'first', '/music/1.mp3', 1), (1, 'second', '/music/2.mp3', 2), (1, 'third', '/music/3.mp3', 3),
+            (2, 'b', '/music/b.mp3', 1), (2, 'a', '/music/a.mp3', 1), (2, 'c', '/music/c.mp3', 2),
+        ])
+        connection.commit()
+        connection.close()
+
+        db_manager = DatabaseManager(self.path)
+        try:
+            self.assertEqual(db_manager.schema_version(), len(SCHEMA_MIGRATIONS))
+            rows = db_manager.connect().execute(
+                "SELECT playlist_id, title, position FROM tracks ORDER BY playlist_id, position").fetchall()
+            self.assertEqual(rows, [
+                (1, 'first', POSITION_GAP), (1, 'second', 2 * POSITION_GAP), (1, 'third', 3 * POSITION_GAP),
+                (2, 'b', POSITION_GAP), (2, 'a', 2 * POSITION_GAP), (2, 'c', 3 * POSITION_GAP),
+            ])
+            self.assertEqual(db_manager.search_tracks('second')[0][1], 'second')
+        finally:
+            db_manager.close()
+
+    def test_fresh_database_is_fully_migrated(self):
+        db_manager = DatabaseManager(self.path)
+        try:
+            self.assertEqual(db_manager.schema_version(), len(SCHEMA_MIGRATIONS))
+            indexes = {name for name, in db_manager.connect().execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")}
+            self.assertEqual(indexes, {'idx_tracks_playlist_position', 'idx_tracks_title', 'idx_tracks_path',
+                                       'idx_media_files_hash'})
+            plan = ' '.join(row[-1] for row in db_manager.connect().execute(
+                "EXPLAIN QUERY PLAN SELECT title, path FROM tracks WHERE playlist_id = ? ORDER BY position", (1,)))
+            self.assertIn('idx_tracks_playlist_position', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+        finally:
+            db_manager.close()
+
+    def test_migration_is_idempotent(self):
+        DatabaseManager(self.path).close()
+        db_manager = DatabaseManager(self.path)
+        try:
+            self.assertEqual(db_manager.migrate(), len(SCHEMA_MIGRATIONS))
+        finally:
+            db_manager.close()
+
+    def test_search_index_follows_track_edits(self):
+        db_manager = DatabaseManager(self.path)
+        try:
+            db_manager.bulk_add_tracks('rock', [('Café del Mar', '/music/cafe.mp3'), ('Other', '/music/other.mp3')])
+            self.assertEqual(db_manager.search_tracks('cafe'), [('rock', 'Café del Mar', '/music/cafe.mp3')])
+            db_manager.remove_track_from_playlist('rock', 'Café del Mar', RecordingSocket())
+            self.assertEqual(db_manager.search_tracks('cafe'), [])
+        finally:
+            db_manager.close()
+
+    def test_gapped_playlists_are_left_alone(self):
+        db_manager = DatabaseManager(self.path)
+        db_manager.bulk_add_tracks('rock', [('a', '/music/a.mp3'), ('b', '/music/b.mp3')])
+        db_manager.move_track('rock', 'b', 1, None)
+        positions = db_manager.connect().execute("SELECT position FROM tracks ORDER BY position").fetchall()
+        db_manager.connect().execute(f"PRAGMA user_version = {len(SCHEMA_MIGRATIONS) - 1}")
+        db_manager.migrate()
+        self.assertEqual(db_manager.connect().execute("SELECT position FROM tracks ORDER BY position").fetchall(),
+                         positions)
+        db_manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from MusicPlayer.server.core.database import DatabaseManager
+from MusicPlayer.server.core.itrrator import PlaylistIterator, ShuffledIterator, restore_iterator
+from helpers import RecordingSocket
+
+
+class CountingDatabase:
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self.calls = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.db_manager, name)
+
+        def call(*args):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return method(*args)
+        return call
+
+
+class PlaylistIteratorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.directory.name, 'music.db'))
+        self.db_manager.bulk_add_tracks('rock', [(f'song{index}', f'/music/{index}.mp3') for index in range(500)])
+        self.playlist_id = self.db_manager.get_playlists()[0][0]
+        self.database = CountingDatabase(self.db_manager)
+
+    def tearDown(self):
+        self.db_manager.shutdown()
+        self.directory.cleanup()
+
+    def iterator(self):
+        return PlaylistIterator(self.database, self.playlist_id, window=8)
+
+    def test_seek_and_skip(self):
+        source = self.iterator()
+        self.assertEqual(source.seek(10), ('song10', '/music/10.mp3'))
+        self.assertEqual(source.skip(), ('song11', '/music/11.mp3'))
+        self.assertEqual(source.skip(5), ('song16', '/music/16.mp3'))
+        self.assertEqual(source.previous(), ('song15', '/music/15.mp3'))
+        self.assertEqual(next(source), ('song16', '/music/16.mp3'))
+        self.assertIsNone(source.skip(1000))
+        self.assertEqual(source.track(), ('song16', '/music/16.mp3'))
+
+    def test_skip_from_the_start(self):
+        source = self.iterator()
+        self.assertEqual(source.skip(3), ('song2', '/music/2.mp3'))
+
+    def test_position_index_is_fetched_in_growing_windows(self):
+        source = self.iterator()
+        self.assertEqual(source.seek(499), ('song499', '/music/499.mp3'))
+        self.assertIsNone(source.seek(500))
+        self.assertLessEqual(self.database.calls['get_track_positions'], 8)
+
+    def test_shuffle_visits_every_track_once(self):
+        shuffled = ShuffledIterator(self.iterator(), seed=7)
+        titles = [title for title, _ in shuffled]
+        self.assertEqual(sorted(titles), sorted(f'song{index}' for index in range(500)))
+        self.assertNotEqual(titles[:20], [f'song{index}' for index in range(20)])
+        self.assertLessEqual(self.database.calls['get_track_positions'], 8)
+
+    def test_index_is_rebuilt_after_edits(self):
+        source = self.iterator()
+        source.seek(0)
+        self.db_manager.remove_track_from_playlist('rock', 'song1', RecordingSocket())
+        self.assertEqual(source.skip(), ('song2', '/music/2.mp3'))
+        self.assertEqual(source.seek(1), ('song2', '/music/2.mp3'))
+
+    def test_restore(self):
+        shuffled = ShuffledIterator(self.iterator(), seed=3)
+        for _ in range(5):
+            expected = next(shuffled)
+        restored = restore_iterator(self.database, shuffled.state())
+        self.assertEqual(restored.track(), expected)
+        self.assertEqual(next(restored), next(shuffled))
+
+
+if __name__ == '__main__':
+    unittest.main()
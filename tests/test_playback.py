@@ -0,0 +1,188 @@
+import unittest
+
+from MusicPlayer.server.core.audio import NullBackend
+from MusicPlayer.server.core.itrrator import TrackListIterator
+from MusicPlayer.server.core.playback import PlaybackEngine
+
+TRACKS = [(name, f'/music/{name}.mp3') for name in ('a', 'b', 'c', 'd')]
+
+
+class EventBackend(NullBackend):
+    end_events = True
+
+    def __init__(self):
+        super().__init__()
+        self.queued = None
+        self.ended = False
+
+    def queue(self, source, namehint=''):
+        self.queued = source
+
+    def unqueue(self):
+        self.queued = None
+
+    def load(self, source, namehint=''):
+        super().load(source, namehint)
+        self.queued = None
+
+    def pop_end_event(self):
+        ended, self.ended = self.ended, False
+        return ended
+
+
+class MemoryStore:
+    def __init__(self):
+        self.states = {}
+
+    def save_play_state(self, zone, source, queued, queue, elapsed, repeat, volume):
+        self.states[zone] = (source, queued, queue, elapsed, repeat, volume)
+
+    def load_play_state(self, zone):
+        return self.states.get(zone)
+
+
+class PlaybackEngineTest(unittest.TestCase):
+    def engine(self, output=None, store=None):
+        return PlaybackEngine(output=output if output is not None else NullBackend(), store=store)
+
+    def drain(self, engine):
+        while not engine.commands.empty():
+            name, args = engine.commands.get_nowait()
+            engine._open()
+            getattr(engine, f'_{name}')(*args)
+
+    def finish_track(self, engine):
+        engine.output.playing = False
+        engine._poll_track_end()
+
+    def titles(self, engine, count):
+        titles = [engine.current_track()[0]]
+        for _ in range(count - 1):
+            self.finish_track(engine)
+            track = engine.current_track()
+            titles.append(track[0] if track is not None else None)
+        return titles
+
+    def test_plays_in_order_and_stops_at_the_end(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS))
+        self.drain(engine)
+        self.assertEqual(self.titles(engine, 5), ['a', 'b', 'c', 'd', None])
+        self.assertFalse(engine.playing)
+
+    def test_repeat_all_wraps_around(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS), repeat='all')
+        self.drain(engine)
+        self.assertEqual(self.titles(engine, 6), ['a', 'b', 'c', 'd', 'a', 'b'])
+
+    def test_repeat_one_replays_the_track(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS), repeat='one')
+        self.drain(engine)
+        self.assertEqual(self.titles(engine, 3), ['a', 'a', 'a'])
+        engine.set_repeat('off')
+        self.drain(engine)
+        self.assertEqual(self.titles(engine, 2), ['a', 'b'])
+
+    def test_repeat_shuffle_plays_every_track_each_pass(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS), repeat='shuffle')
+        self.drain(engine)
+        titles = self.titles(engine, 8)
+        self.assertEqual(sorted(titles[:4]), ['a', 'b', 'c', 'd'])
+        self.assertEqual(sorted(titles[4:]), ['a', 'b', 'c', 'd'])
+
+    def test_queued_tracks_play_before_the_source(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS))
+        engine.enqueue('x', '/music/x.mp3')
+        engine.enqueue('y', '/music/y.mp3')
+        self.drain(engine)
+        self.assertEqual(engine.queued_tracks(), [('x', '/music/x.mp3'), ('y', '/music/y.mp3')])
+        self.assertEqual(self.titles(engine, 5), ['a', 'x', 'y', 'b', 'c'])
+
+    def test_next_counts_across_the_queue(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS))
+        engine.enqueue('x', '/music/x.mp3')
+        engine.enqueue('y', '/music/y.mp3')
+        engine.next(2)
+        self.drain(engine)
+        self.assertEqual(engine.current_track()[0], 'y')
+        self.assertEqual(engine.queued_tracks(), [])
+
+        engine.enqueue('z', '/music/z.mp3')
+        engine.next(3)
+        self.drain(engine)
+        self.assertEqual(engine.current_track()[0], 'c')
+
+    def test_next_past_the_end_stops(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS))
+        engine.next(10)
+        self.drain(engine)
+        self.assertFalse(engine.playing)
+
+    def test_previous(self):
+        engine = self.engine()
+        engine.play(TrackListIterator(TRACKS))
+        engine.next(2)
+        engine.previous()
+        self.drain(engine)
+        self.assertEqual(engine.current_track()[0], 'b')
+        engine.previous()
+        engine.previous()
+        self.drain(engine)
+        self.assertEqual(engine.current_track()[0], 'a')
+
+    def test_resume_from_saved_state(self):
+        store = MemoryStore()
+        engine = self.engine(store=store)
+        engine.play(TrackListIterator(TRACKS), repeat='all')
+        engine.next()
+        engine.enqueue('x', '/music/x.mp3')
+        engine.seek(42.0)
+        engine.set_volume(0.5)
+        engine.close()
+        self.drain(engine)
+
+        restored = self.engine(store=store)
+        restored._restore()
+        self.assertEqual(restored.resume_point(), ('b', '/music/b.mp3'))
+        self.assertEqual((restored.repeat, restored.volume), ('all', 0.5))
+        self.assertAlmostEqual(restored.offset, 42.0, places=1)
+        restored.resume()
+        self.drain(restored)
+        self.assertTrue(restored.playing)
+        self.assertEqual(self.titles(restored, 3), ['b', 'x', 'c'])
+
+    def test_plan_changes_requeue_the_gapless_track(self):
+        output = EventBackend()
+        engine = self.engine(output)
+        engine.play(TrackListIterator(TRACKS[:2]))
+        self.drain(engine)
+        self.assertEqual(output.queued, '/music/b.mp3')
+        engine.enqueue('x', '/music/x.mp3')
+        self.drain(engine)
+        self.assertEqual(output.queued, '/music/x.mp3')
+        engine.set_repeat('one')
+        self.drain(engine)
+        self.assertEqual(output.queued, '/music/a.mp3')
+
+    def test_plan_without_a_next_track_unqueues(self):
+        output = EventBackend()
+        engine = self.engine(output)
+        engine.play(TrackListIterator(TRACKS[:1]), repeat='all')
+        self.drain(engine)
+        self.assertEqual(output.queued, '/music/a.mp3')
+        engine.set_repeat('off')
+        self.drain(engine)
+        self.assertIsNone(output.queued)
+        output.ended = True
+        engine._poll_track_end()
+        self.assertFalse(engine.playing)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import unittest
+
+from MusicPlayer.server.core.prefetch import PrefetchCache
+
+
+class PrefetchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for index in range(4):
+            path = os.path.join(self.directory.name, f'{index}.wav')
+            with open(path, 'wb') as audio_file:
+                audio_file.write(bytes([index]) * 1000)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def start(self, cache):
+        cache.start()
+        self.addCleanup(cache.close)
+        return cache
+
+    def wait_for(self, cache, condition):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with cache.condition:
+                if condition():
+                    return
+            time.sleep(0.01)
+        self.fail('prefetch did not finish')
+
+    def test_scheduled_tracks_are_read_ahead(self):
+        cache = self.start(PrefetchCache(memory_budget=10000, depth=2))
+        cache.schedule(self.paths + ['http://example.com/stream.mp3'], 'main')
+        self.wait_for(cache, lambda: len(cache.buffers) == 2)
+        self.assertEqual(cache.open(self.paths[0]).read(), bytes([0]) * 1000)
+        self.assertIsNone(cache.open(self.paths[2]))
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_memory_budget_evicts_the_oldest_track(self):
+        cache = self.start(PrefetchCache(memory_budget=2500, depth=4))
+        cache.schedule(self.paths[:3], 'main')
+        self.wait_for(cache, lambda: not cache.wanted)
+        self.assertEqual(list(cache.buffers), self.paths[1:3])
+        self.assertLessEqual(cache.stats()['memory_used'], 2500)
+
+    def test_drained_owners_are_dropped(self):
+        cache = self.start(PrefetchCache(memory_budget=10000))
+        for index, path in enumerate(self.paths):
+            cache.schedule([path], f'zone{index}')
+        self.wait_for(cache, lambda: len(cache.buffers) == 4)
+        self.wait_for(cache, lambda: not cache.wanted)
+
+    def test_forget(self):
+        cache = PrefetchCache()
+        cache.schedule(self.paths, 'kitchen')
+        cache.schedule(self.paths, 'main')
+        cache.forget('kitchen')
+        cache.forget('garden')
+        self.assertEqual(list(cache.wanted), ['main'])
+
+
+if __name__ == '__main__':
+    unittest.main()
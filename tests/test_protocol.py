@@ -0,0 +1,96 @@
+import asyncio
+import socket
+import unittest
+
+from MusicPlayer.client.client import MusicClient
+from MusicPlayer.protocol import FLAG_END, HEADER, MAX_FRAME_SIZE, ProtocolError, encode_frame, read_frame, \
+    recv_frame
+from helpers import ServerFixture
+
+
+class FrameTest(unittest.TestCase):
+    def setUp(self):
+        self.left, self.right = socket.socketpair()
+
+    def tearDown(self):
+        self.left.close()
+        self.right.close()
+
+    def test_round_trip(self):
+        self.left.sendall(encode_frame(7, 'play ♪'.encode('utf-8')) + encode_frame(8, b'', FLAG_END))
+        self.assertEqual(recv_frame(self.right), (7, 0, 'play ♪'.encode('utf-8')))
+        self.assertEqual(recv_frame(self.right), (8, FLAG_END, b''))
+
+    def test_frame_split_across_reads(self):
+        data = encode_frame(3, b'x' * 100000)
+        for start in range(0, len(data), 4099):
+            self.left.sendall(data[start:start + 4099])
+        self.assertEqual(recv_frame(self.right), (3, 0, b'x' * 100000))
+
+    def test_eof_inside_a_frame(self):
+        self.left.sendall(encode_frame(1, b'truncated')[:-3])
+        self.left.close()
+        self.assertIsNone(recv_frame(self.right))
+
+    def test_oversized_frame(self):
+        self.left.sendall(HEADER.pack(MAX_FRAME_SIZE + 1, 1, 0))
+        with self.assertRaises(ProtocolError):
+            recv_frame(self.right)
+
+    def test_async_read(self):
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(encode_frame(9, b'stop') + encode_frame(10, b'', FLAG_END))
+            reader.feed_eof()
+            frames = [await read_frame(reader), await read_frame(reader)]
+            with self.assertRaises(asyncio.IncompleteReadError):
+                await read_frame(reader)
+            return frames
+        self.assertEqual(asyncio.run(read()), [(9, 0, b'stop'), (10, FLAG_END, b'')])
+
+
+class PipeliningTest(unittest.TestCase):
+    mode = 'threaded'
+
+    def setUp(self):
+        self.fixture = ServerFixture(self.mode)
+        self.client = MusicClient('127.0.0.1', self.fixture.port, window=8)
+
+    def tearDown(self):
+        self.client.close()
+        self.fixture.close()
+
+    def test_pipelined_replies_keep_their_request(self):
+        commands = [f'add_playlist list{index}' for index in range(20)] + ['show_playlists', 'dance']
+        replies = self.client.pipeline(commands)
+        for index in range(20):
+            self.assertIn(f'list{index}', replies[index])
+        self.assertIn('list19', replies[20])
+        self.assertIn('unknown_command', replies[21])
+
+    def test_replies_are_matched_by_request_id(self):
+        first = self.client.send('add_playlist first')
+        second = self.client.send('show_playlists')
+        self.assertIn('first', self.client.collect(second))
+        self.assertIn('first', self.client.collect(first))
+
+    def test_long_listing_streams_in_several_frames(self):
+        with open('tracks.csv', 'w') as manifest:
+            manifest.writelines(f'song{index},/music/{index}.mp3\n' for index in range(1200))
+        self.assertIn('1200', self.client.request('import_tracks big tracks.csv'))
+        parts = list(self.client.stream(self.client.send('show_tracks_for_playlist big')))
+        self.assertGreater(len(parts), 2)
+        self.assertEqual(''.join(parts).count('/music/'), 1200)
+
+    def test_oversized_frame_closes_the_connection(self):
+        self.client.sock.sendall(HEADER.pack(MAX_FRAME_SIZE + 1, 1, 0))
+        with self.assertRaises(ConnectionError):
+            self.client.collect(1)
+
+
+class AsyncPipeliningTest(PipeliningTest):
+    mode = 'async'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import unittest
+
+from MusicPlayer.server.core.metrics import Metrics
+from MusicPlayer.server.core.server import AsyncClientConnection, ReplyChannel
+
+
+class UnusedWriter:
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        raise AssertionError("nothing should be written")
+
+
+class ReplyChannelTest(unittest.TestCase):
+    def test_closed_loop_drops_the_subscriber(self):
+        loop = asyncio.new_event_loop()
+        channel = ReplyChannel(AsyncClientConnection(loop, UnusedWriter(), Metrics(False)), 1)
+        loop.close()
+        errors = []
+
+        def notify():
+            try:
+                channel.sendall(b'Now playing')
+                channel.sendall(b'Track finished')
+            except BaseException as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=notify)
+        thread.start()
+        thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(channel.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
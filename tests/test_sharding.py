@@ -0,0 +1,107 @@
+import os
+import tempfile
+import time
+import unittest
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+from MusicPlayer.client.client import MusicClient
+from MusicPlayer.server.core.database import DatabaseManager
+from MusicPlayer.server.core.itrrator import PlaylistIterator
+from MusicPlayer.server.core.prefetch import PrefetchCache
+from MusicPlayer.server.core.sharding import PlaybackClient, PlaybackService, PlaybackUnavailable, \
+    RemoteZoneManager
+from MusicPlayer.server.core.zones import ZoneError, ZoneManager
+from helpers import RecordingSocket, ServerFixture
+
+
+class PlaybackServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.directory.name, 'music.db'))
+        self.db_manager.bulk_add_tracks('rock', [(f'song{index}', f'/music/{index}.mp3') for index in range(5)])
+        self.prefetch = PrefetchCache()
+        self.zones = ZoneManager(self.prefetch, 'null', limit=2)
+        self.service = PlaybackService(self.zones, self.prefetch, self.db_manager)
+        self.service.start()
+        self.client = PlaybackClient(self.service.address, self.service.authkey)
+        self.remote = RemoteZoneManager(self.client)
+
+    def tearDown(self):
+        self.remote.close()
+        self.service.close()
+        self.zones.close()
+        self.db_manager.close()
+        self.directory.cleanup()
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('condition not reached')
+            time.sleep(0.01)
+
+    def test_zones_are_managed_remotely(self):
+        self.assertEqual(self.remote.create('kitchen').zone, 'kitchen')
+        self.assertEqual([name for name, _ in self.remote.items()], ['main', 'kitchen'])
+        self.assertIsNotNone(self.remote.get('kitchen'))
+        self.assertEqual(self.remote.engine_threads(), 2)
+        self.remote.remove('kitchen')
+        self.assertIsNone(self.remote.get('kitchen'))
+        self.assertIsNone(self.zones.get('kitchen'))
+
+    def test_zone_errors_are_raised_in_the_worker(self):
+        with self.assertRaises(ZoneError):
+            self.remote.remove('main')
+        with self.assertRaises(ZoneError):
+            self.client.call('garden', 'pause')
+        with self.assertRaises(PlaybackUnavailable):
+            self.client.call('main', 'close')
+
+    def test_play_runs_in_the_service_process(self):
+        engine = self.remote.default
+        engine.play(PlaylistIterator(self.db_manager, 1), RecordingSocket(), repeat='all')
+        self.wait_for(lambda: engine.current_track() is not None)
+        self.assertEqual(engine.current_track(), ('song0', '/music/0.mp3'))
+        self.assertEqual(engine.repeat, 'all')
+        engine.next(2)
+        self.wait_for(lambda: engine.current_track() == ('song2', '/music/2.mp3'))
+        self.assertIs(self.zones.default.playing, True)
+
+    def test_notifications_reach_the_worker_channel(self):
+        socket = RecordingSocket()
+        self.client.channels['main'] = socket
+        with self.service.lock:
+            events = self.service.streams[os.getpid()]
+        events.send('main', 'Playback error: gone'.encode('utf-8'))
+        self.wait_for(lambda: socket.messages)
+        self.assertEqual(socket.messages, ['Playback error: gone'])
+
+    def test_wrong_authkey_is_rejected(self):
+        with self.assertRaises(AuthenticationError):
+            Client(self.service.address, authkey=b'wrong')
+        self.assertEqual(self.remote.engine_threads(), 1)
+
+
+class WorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.fixture = ServerFixture(workers=2)
+        self.fixture.server.start_workers('threaded')
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_writes_are_seen_by_every_worker(self):
+        for index in range(12):
+            client = MusicClient('127.0.0.1', self.fixture.port)
+            try:
+                self.assertIn('created', client.request(f'add_playlist list{index}'))
+                listing = client.request('show_playlists')
+                for previous in range(index + 1):
+                    self.assertIn(f'list{previous}', listing)
+            finally:
+                client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from MusicPlayer.server.core.database import DatabaseManager, WriteSession
+from helpers import RecordingSocket
+
+
+def insert_playlist(cursor, name):
+    cursor.execute("INSERT INTO playlists (name) VALUES (?)", (name,))
+    return name
+
+
+def insert_then_fail(cursor, name):
+    cursor.execute("INSERT INTO playlists (name) VALUES (?)", (name,))
+    raise ValueError("rejected")
+
+
+def abort_transaction(cursor, name):
+    cursor.execute("ROLLBACK")
+    raise ValueError("aborted")
+
+
+class WriteBehindTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.directory.name, 'music.db'), write_behind=True)
+        self.writer = self.db_manager.writer
+
+    def tearDown(self):
+        self.db_manager.shutdown()
+        self.directory.cleanup()
+
+    def playlists(self):
+        connection = sqlite3.connect(self.db_manager.db_name)
+        try:
+            return [name for name, in connection.execute("SELECT name FROM playlists ORDER BY id")]
+        finally:
+            connection.close()
+
+    def test_writes_are_grouped_into_fewer_commits(self):
+        self.writer.interval = 60
+        for index in range(20):
+            self.writer.submit(insert_playlist, (f'list{index}',))
+        self.assertEqual(self.playlists(), [])
+        self.db_manager.flush()
+        self.assertEqual(len(self.playlists()), 20)
+        stats = self.db_manager.write_stats()
+        self.assertEqual(stats['writes'], 20)
+        self.assertEqual(stats['commits'], 1)
+        self.assertEqual(stats['lost'], 0)
+
+    def test_failed_write_rolls_back_only_itself(self):
+        self.writer.interval = 60
+        self.writer.submit(insert_playlist, ('kept',))
+        with self.assertRaises(ValueError):
+            self.writer.submit(insert_then_fail, ('dropped',))
+        self.writer.submit(insert_playlist, ('also kept',))
+        self.db_manager.flush()
+        self.assertEqual(self.playlists(), ['kept', 'also kept'])
+
+    def test_writer_survives_a_lost_transaction(self):
+        self.writer.interval = 60
+        self.writer.submit(insert_playlist, ('lost',))
+        with self.assertRaises(ValueError):
+            self.writer.submit(abort_transaction, ('gone',))
+        self.assertEqual(self.db_manager.write_stats()['lost'], 1)
+        self.assertTrue(self.writer.is_alive())
+        self.writer.submit(insert_playlist, ('after',), durable=True)
+        self.assertEqual(self.playlists(), ['after'])
+
+    def test_submit_fails_when_the_writer_is_dead(self):
+        self.writer.queue.put(None)
+        self.writer.join()
+        with self.assertRaises(sqlite3.OperationalError):
+            self.writer.submit(insert_playlist, ('orphan',))
+
+    def test_durable_write_returns_after_commit(self):
+        self.writer.interval = 60
+        write = self.writer.submit(insert_playlist, ('durable',), durable=True)
+        self.assertTrue(write.committed.is_set())
+        self.assertEqual(write.result, 'durable')
+        self.assertEqual(self.playlists(), ['durable'])
+
+    def test_session_reads_its_own_writes_from_another_thread(self):
+        self.writer.interval = 60
+        session = WriteSession()
+        with self.db_manager.write_session(session):
+            self.db_manager.create_playlist('mine', RecordingSocket())
+        self.assertIsNotNone(session.uncommitted)
+        self.assertEqual(self.playlists(), [])
+
+        found = []
+
+        def read():
+            with self.db_manager.write_session(session):
+                found.extend(name for _, name in self.db_manager.get_playlists())
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        self.assertEqual(found, ['mine'])
+        self.assertIsNone(session.uncommitted)
+
+    def test_other_sessions_do_not_force_a_flush(self):
+        self.writer.interval = 60
+        with self.db_manager.write_session(WriteSession()):
+            self.db_manager.create_playlist('pending', RecordingSocket())
+        with self.db_manager.write_session(WriteSession()):
+            self.assertEqual(self.db_manager.get_playlists(), [])
+        self.assertEqual(self.db_manager.write_stats()['commits'], 0)
+
+    def test_commit_listeners_receive_written_keys(self):
+        keys = []
+        self.db_manager.add_commit_listener(keys.append)
+        self.db_manager.add_track_to_playlist('rock', 'song', '/music/song.mp3', RecordingSocket())
+        self.db_manager.flush()
+        self.assertIn({'rock'}, keys)
+
+    def test_shutdown_commits_pending_writes(self):
+        self.writer.interval = 60
+        self.writer.submit(insert_playlist, ('last',))
+        self.db_manager.shutdown()
+        self.assertEqual(self.playlists(), ['last'])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.writer.submit(insert_playlist, ('late',))
+
+
+if __name__ == '__main__':
+    unittest.main()
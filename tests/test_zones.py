@@ -0,0 +1,42 @@
+import unittest
+
+from MusicPlayer.server.core.prefetch import PrefetchCache
+from MusicPlayer.server.core.zones import ZoneError, ZoneManager
+
+
+class ZoneManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.prefetch = PrefetchCache()
+        self.prefetch.start()
+        self.zones = ZoneManager(self.prefetch, 'null', limit=2)
+
+    def tearDown(self):
+        self.zones.close()
+        self.prefetch.close()
+
+    def test_engine_threads_count_only_engines(self):
+        self.assertEqual(self.zones.engine_threads(), 1)
+        self.zones.create('kitchen')
+        self.assertEqual(self.zones.engine_threads(), 2)
+        self.zones.remove('kitchen')
+        self.assertEqual(self.zones.engine_threads(), 1)
+
+    def test_removed_zone_is_forgotten_by_prefetch(self):
+        self.zones.create('kitchen')
+        self.prefetch.schedule(['/music/missing.mp3'], 'kitchen')
+        self.zones.remove('kitchen')
+        self.assertNotIn('kitchen', self.prefetch.wanted)
+
+    def test_zone_limits(self):
+        self.zones.create('kitchen')
+        with self.assertRaises(ZoneError):
+            self.zones.create('kitchen')
+        with self.assertRaises(ZoneError):
+            self.zones.create('garden')
+        with self.assertRaises(ZoneError):
+            self.zones.remove('main')
+        self.assertEqual([name for name, _ in self.zones.items()], ['main', 'kitchen'])
+
+
+if __name__ == '__main__':
+    unittest.main()